@@ -0,0 +1,76 @@
+"""
+Recall and latency of the retrieval backends on a brain, for a set of questions
+whose answer is known to be in a given chunk (a citation, a sentence...).
+
+The questions file has one JSON object per line:
+    {"question": "What does 42 U.S.C. 7401 regulate?", "expected": "42 U.S.C. § 7401"}
+A question is recalled when one of the top k chunks contains the expected text.
+
+Run from backend/core, with the backend environment variables set:
+    python -m benchmarks.hybrid_retrieval --brain-id <uuid> --questions questions.jsonl
+"""
+import argparse
+import json
+import statistics
+import time
+
+from models.settings import common_dependencies
+from vectorstore.factory import RETRIEVAL_BACKENDS, get_brain_vector_store
+
+
+def load_questions(path: str):
+    with open(path) as questions_file:
+        return [json.loads(line) for line in questions_file if line.strip()]
+
+
+def run_backend(backend: str, brain_id: str, questions, embeddings, k: int):
+    commons = common_dependencies()
+    vector_store = get_brain_vector_store(
+        commons["supabase"], commons["embeddings"], brain_id=brain_id, backend=backend
+    )
+
+    recalled = 0
+    latencies = []
+    for item, embedding in zip(questions, embeddings):
+        start_time = time.perf_counter()
+        results = vector_store.similarity_search_by_vector_with_score(
+            embedding, k=k, query=item["question"]
+        )
+        latencies.append(time.perf_counter() - start_time)
+
+        expected = item["expected"].lower()
+        if any(expected in doc.page_content.lower() for doc, _ in results):
+            recalled += 1
+
+    return recalled / len(questions), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--brain-id", required=True)
+    parser.add_argument("--questions", required=True)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument(
+        "--backends", nargs="+", default=["supabase", "hybrid"], choices=list(RETRIEVAL_BACKENDS)
+    )
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    # Embedded once so that only the searches are timed
+    embeddings = common_dependencies()["embeddings"].embed_documents(
+        [item["question"] for item in questions]
+    )
+
+    print(f"{len(questions)} questions, recall@{args.k}")
+    for backend in args.backends:
+        recall, latencies = run_backend(backend, args.brain_id, questions, embeddings, args.k)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(
+            f"{backend:>10}: recall {recall:6.1%}, "
+            f"latency avg {statistics.mean(latencies) * 1000:7.1f} ms, p95 {p95 * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
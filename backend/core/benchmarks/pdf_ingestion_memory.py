@@ -0,0 +1,109 @@
+"""
+Peak RSS of turning a PDF into metadata-wrapped chunks, for growing page counts:
+loading every page with PyMuPDFLoader then splitting the whole list (the previous
+path) against streaming the chunks page by page.
+
+Each measurement runs in its own process, as the peak RSS of a process never decreases.
+Run from backend/core:
+    python -m benchmarks.pdf_ingestion_memory --pages 100 500 1000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from langchain.schema import Document
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 0
+
+
+def with_metadata(document: Document) -> Document:
+    return Document(
+        page_content=document.page_content,
+        metadata={"file_name": "benchmark.pdf", "page": document.metadata["page"] + 1},
+    )
+
+
+def loader_based(path: str) -> int:
+    """The previous path: every page, then every chunk, then every wrapped chunk in memory."""
+    from langchain.document_loaders import PyMuPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    pages = PyMuPDFLoader(path).load()
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    )
+    chunks = text_splitter.split_documents(pages)
+    documents = [with_metadata(chunk) for chunk in chunks]
+    return len(documents)
+
+
+def streaming(path: str) -> int:
+    """The current path: the chunks of one page at a time, consumed as they come."""
+    from utils.parsing import iter_pdf_documents
+
+    count = 0
+    for chunk in iter_pdf_documents(path, CHUNK_SIZE, CHUNK_OVERLAP):
+        with_metadata(chunk)
+        count += 1
+    return count
+
+
+MODES = {"loader_based": loader_based, "streaming": streaming}
+
+
+def make_pdf(path: str, pages: int) -> None:
+    import fitz
+
+    text = " ".join(f"Section {index} of the regulation applies." for index in range(120))
+    pdf = fitz.open()
+    for _ in range(pages):
+        pdf.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=5)
+    pdf.save(path)
+    pdf.close()
+
+
+def measure(mode: str, path: str) -> None:
+    start_time = time.perf_counter()
+    chunks = MODES[mode](path)
+    elapsed_time = time.perf_counter() - start_time
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{chunks} {peak:.1f} {elapsed_time:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--measure", choices=list(MODES), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.path)
+        return
+
+    for pages in args.pages:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_file:
+            path = pdf_file.name
+        try:
+            make_pdf(path, pages)
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.pdf_ingestion_memory", "--measure", mode, "--path", path],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout.split()
+                chunks, peak, elapsed_time = output[-3:]
+                print(f"{pages:>5} pages {mode:>12}: {chunks:>6} chunks, peak RSS {peak:>8} MB, {elapsed_time} s")
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Time to split documents into token-sized chunks: a splitter built with
+RecursiveCharacterTextSplitter.from_tiktoken_encoder for each file (the previous
+path) against the shared splitter of utils.splitters, on the files of tests/test_files
+and a synthetic corpus with the repeated lines of real documents (headers, footers,
+table rows). Both must produce the same chunks.
+
+Run from backend/core:
+    python -m benchmarks.splitter --documents 200
+"""
+import argparse
+import os
+import random
+import time
+from typing import Callable, List
+
+from langchain.schema import Document
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 0
+TEST_FILES = os.path.join(os.path.dirname(__file__), "..", "tests", "test_files")
+
+WORDS = "the brain answers questions about uploaded files with their sources and pages".split()
+BOILERPLATE = [
+    "Confidential - internal use only",
+    "| Name | Value | Unit |",
+    "See the appendix for the definitions.",
+    "Page footer - all rights reserved",
+]
+
+
+def test_file_documents() -> List[Document]:
+    from langchain.document_loaders import CSVLoader, PyMuPDFLoader, TextLoader
+
+    loaders = {".csv": CSVLoader, ".pdf": PyMuPDFLoader, ".txt": TextLoader}
+    documents = []
+    for name in sorted(os.listdir(TEST_FILES)):
+        loader_class = loaders.get(os.path.splitext(name)[1])
+        if loader_class is not None:
+            documents.extend(loader_class(os.path.join(TEST_FILES, name)).load())
+    return documents
+
+
+def synthetic_documents(count: int, seed: int = 0) -> List[Document]:
+    generator = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        lines = []
+        for _ in range(200):
+            if generator.random() < 0.3:
+                lines.append(generator.choice(BOILERPLATE))
+            else:
+                lines.append(" ".join(generator.choices(WORDS, k=generator.randint(5, 25))))
+        documents.append(Document(page_content="\n".join(lines), metadata={}))
+    return documents
+
+
+def per_file(documents: List[Document]) -> List[Document]:
+    """The previous path: a new splitter, and a new encoding lookup, for every file."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    chunks = []
+    for document in documents:
+        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+        )
+        chunks.extend(text_splitter.split_documents([document]))
+    return chunks
+
+
+def shared(documents: List[Document]) -> List[Document]:
+    """The current path: the shared splitter with batched and memoized token lengths."""
+    from utils.splitters import get_text_splitter
+
+    chunks = []
+    for document in documents:
+        chunks.extend(get_text_splitter(CHUNK_SIZE, CHUNK_OVERLAP).split_documents([document]))
+    return chunks
+
+
+def measure(split: Callable[[List[Document]], List[Document]], documents: List[Document]):
+    start_time = time.perf_counter()
+    chunks = split(documents)
+    return chunks, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    args = parser.parse_args()
+
+    from utils.splitters import warm_up
+
+    # Both paths start with the encoding loaded, only the splitting is measured
+    warm_up()
+
+    corpora = {
+        "tests/test_files": test_file_documents(),
+        f"synthetic x{args.documents}": synthetic_documents(args.documents),
+    }
+    for name, documents in corpora.items():
+        baseline_chunks, baseline_time = measure(per_file, documents)
+        chunks, elapsed_time = measure(shared, documents)
+        assert [chunk.page_content for chunk in chunks] == [
+            chunk.page_content for chunk in baseline_chunks
+        ], f"{name}: the shared splitter produced different chunks"
+
+        print(
+            f"{name:>20}: {len(chunks):>6} chunks, per file {baseline_time:.3f} s, "
+            f"shared {elapsed_time:.3f} s ({baseline_time / elapsed_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
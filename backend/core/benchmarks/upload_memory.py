@@ -0,0 +1,80 @@
+"""
+Peak memory of hashing an upload and handing it to a loader, before and after
+streaming the SHA1 and reading the spooled upload in place.
+
+Run from backend/core:
+    python -m benchmarks.upload_memory --size-mb 50
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+
+from utils.file import compute_sha1_from_fileobj
+
+
+def copy_based(path: str) -> str:
+    """The previous path: read the upload, copy it to a temp file, hash it, copy it again for the loader."""
+    with open(path, "rb") as upload:
+        content = upload.read()
+
+    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
+        tmp_file.write(content)
+        tmp_file.flush()
+        with open(tmp_file.name, "rb") as file:
+            file_sha1 = hashlib.sha1(file.read()).hexdigest()
+    os.remove(tmp_file.name)
+
+    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
+        tmp_file.write(content)
+        tmp_file.flush()
+        loader_path = tmp_file.name
+    os.remove(loader_path)
+
+    return file_sha1
+
+
+def streaming(path: str) -> str:
+    """The current path: hash in fixed-size blocks, the loader gets the spool path."""
+    with open(path, "rb") as upload:
+        file_sha1 = compute_sha1_from_fileobj(upload)
+        loader_path = upload.name  # noqa: F841 handed to the loader as is
+    return file_sha1
+
+
+def measure(function, path: str):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    file_sha1 = function(path)
+    elapsed_time = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return file_sha1, peak, elapsed_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".bin") as upload:
+        for _ in range(args.size_mb):
+            upload.write(os.urandom(1024 * 1024))
+
+    try:
+        results = {
+            name: measure(function, upload.name)
+            for name, function in (("copy_based", copy_based), ("streaming", streaming))
+        }
+    finally:
+        os.remove(upload.name)
+
+    assert results["copy_based"][0] == results["streaming"][0]
+    for name, (_, peak, elapsed_time) in results.items():
+        print(f"{name:>10}: peak {peak / 1024 / 1024:8.2f} MB, {elapsed_time:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
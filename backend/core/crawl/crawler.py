@@ -1,10 +1,27 @@
+import asyncio
 import os
 import re
 import tempfile
+import time
 import unicodedata
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import AsyncIterator, Dict, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
 
-import requests
+import httpx
+from logger import get_logger
+from models.crawl_state import CrawlState
+from models.settings import CrawlSettings
 from pydantic import BaseModel
+from utils.file import compute_sha1_from_content
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+DEFAULT_PORTS = {"http": 80, "https": 443}
 
 
 class CrawlWebsite(BaseModel):
@@ -14,27 +31,13 @@ class CrawlWebsite(BaseModel):
     max_pages: int = 100
     max_time: int = 60
 
-    def _crawl(self, url):
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.text
-        else:
-            return None
-
-    def process(self):
-        content = self._crawl(self.url)
-
-        # Create a file
-        file_name = slugify(self.url) + ".html"
-        temp_file_path = os.path.join(tempfile.gettempdir(), file_name)
-        with open(temp_file_path, "w") as temp_file:
-            temp_file.write(content)  # pyright: ignore reportPrivateUsage=none
-            # Process the file
-
-        if content:
-            return temp_file_path, file_name
-        else:
-            return None
+    def crawl(
+        self,
+        settings: Optional[CrawlSettings] = None,
+        previous: Optional[Dict[str, CrawlState]] = None,
+    ) -> AsyncIterator["CrawledPage"]:
+        """Pages of the website, yielded as they are fetched."""
+        return Crawler(self, settings, previous).pages()
 
     def checkGithub(self):
         if "github.com" in self.url:
@@ -43,6 +46,383 @@ class CrawlWebsite(BaseModel):
             return False
 
 
+@dataclass
+class CrawledPage:
+    url: str
+    depth: int
+    content: str
+    content_sha1: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    links: List[str] = field(default_factory=list)
+    # False when the page is the same as in the previous crawl, its content is then not fetched
+    changed: bool = True
+
+    @property
+    def file_name(self) -> str:
+        return slugify(self.url) + ".html"
+
+    def write_temporary_file(self) -> str:
+        """Write the page in a temporary directory, returns the path of the file."""
+        path = os.path.join(tempfile.mkdtemp(prefix="crawl_"), self.file_name)
+        with open(path, "w") as temp_file:
+            temp_file.write(self.content)
+        return path
+
+
+@dataclass
+class CrawlStats:
+    fetched: int = 0
+    failed: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    unchanged: int = 0
+    timed_out: bool = False
+    # Some links were not followed because of max_pages
+    truncated: bool = False
+    seconds: float = 0.0
+    urls: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "duplicates": self.duplicates,
+            "unchanged": self.unchanged,
+            "timed_out": self.timed_out,
+            "truncated": self.truncated,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class HostLimiter:
+    """
+    Politeness towards the crawled hosts: at most `concurrency` requests in flight
+    per host, started at least `delay` seconds apart.
+    """
+
+    def __init__(self, concurrency: int, delay: float):
+        self.concurrency = concurrency
+        self.delay = delay
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+        lock = self._locks.setdefault(host, asyncio.Lock())
+
+        async with semaphore:
+            async with lock:
+                loop = asyncio.get_running_loop()
+                wait = self._next_start.get(host, 0.0) - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_start[host] = loop.time() + self.delay
+            yield
+
+
+class LinkExtractor(HTMLParser):
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url
+        self.links: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == "base" and attributes.get("href"):
+            self.base_url = urljoin(self.base_url, attributes["href"])
+        elif tag == "a" and attributes.get("href"):
+            self.links.append(urljoin(self.base_url, attributes["href"]))
+
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    extractor = LinkExtractor(base_url)
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception as e:
+        logger.warning(f"Error extracting the links of {base_url}: {e}")
+    return extractor.links
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Canonical form of an http(s) URL used to deduplicate the pages: lowercase scheme
+    and host, no default port, no fragment, sorted query parameters. None for other URLs.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+class Crawler:
+    """
+    Breadth-first crawl of a website: the pages linked from the root URL on the same
+    host, up to `depth` links away (the root being at depth 0), `max_pages` pages and
+    `max_time` seconds. Each level is fetched concurrently through a bounded connection
+    pool, politely towards the host, and the pages are yielded as they arrive while
+    the next ones are fetched, at most `crawl_queue_size` pages ahead of the consumer.
+    Pages with the same content under different URLs are only yielded once.
+
+    With the state of a previous crawl, pages are requested with If-None-Match and
+    If-Modified-Since, and the pages that did not change are yielded with `changed`
+    unset: their content is not fetched again, their links come from the state.
+
+    JavaScript is not executed: with `js` set, the pages are still fetched as static HTML.
+    """
+
+    def __init__(
+        self,
+        website: CrawlWebsite,
+        settings: Optional[CrawlSettings] = None,
+        previous: Optional[Dict[str, CrawlState]] = None,
+    ):
+        self.website = website
+        self.settings = settings or CrawlSettings()
+        self.previous = previous or {}
+        self.stats = CrawlStats()
+        self._hosts = HostLimiter(
+            self.settings.crawl_per_host_concurrency, self.settings.crawl_per_host_delay
+        )
+        self._seen: Set[str] = set()
+        self._content_sha1s: Set[str] = set()
+        self._reached: Set[str] = set()
+        self._gone: Set[str] = set()
+
+    async def pages(self) -> AsyncIterator[CrawledPage]:
+        if self.website.js:
+            logger.warning(
+                f"JavaScript rendering is not supported, crawling {self.website.url} as static HTML"
+            )
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.settings.crawl_queue_size)
+        producer = asyncio.create_task(self._run(queue))
+        try:
+            while True:
+                page = await queue.get()
+                if page is None:
+                    break
+                yield page
+            # Raise the errors of the crawl itself
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                with suppress(asyncio.CancelledError):
+                    await producer
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.website.max_time
+
+        try:
+            root = normalize_url(self.website.url)
+            if root is None:
+                raise ValueError(f"Cannot crawl {self.website.url}: not an http(s) URL")
+            self._seen.add(root)
+            root_host = urlsplit(root).netloc
+
+            async with httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.settings.crawl_max_connections,
+                    max_keepalive_connections=self.settings.crawl_max_connections,
+                ),
+                timeout=self.settings.crawl_request_timeout,
+                follow_redirects=True,
+                headers={"User-Agent": self.settings.crawl_user_agent},
+            ) as client:
+                frontier = [root]
+                for depth in range(self.website.depth + 1):
+                    links = await self._crawl_level(client, frontier, depth, deadline, queue)
+                    if links is None:
+                        self.stats.timed_out = True
+                        break
+                    frontier = self._schedule(links, root_host)
+                    if not frontier:
+                        break
+        finally:
+            self.stats.seconds = time.perf_counter() - start_time
+            metrics.observe("crawl.seconds", self.stats.seconds)
+            logger.info(f"Crawl of {self.website.url}: {self.stats.to_dict()}")
+            await queue.put(None)
+
+    def _schedule(self, links: List[str], host: str) -> List[str]:
+        """New URLs of the host, in link order, within the page budget."""
+        frontier = []
+        for link in links:
+            url = normalize_url(link)
+            if url is None or url in self._seen or urlsplit(url).netloc != host:
+                continue
+            if len(self._seen) >= self.website.max_pages:
+                self.stats.truncated = True
+                break
+            self._seen.add(url)
+            frontier.append(url)
+        return frontier
+
+    async def _crawl_level(
+        self,
+        client: httpx.AsyncClient,
+        frontier: List[str],
+        depth: int,
+        deadline: float,
+        queue: asyncio.Queue,
+    ) -> Optional[List[str]]:
+        """
+        Fetch the URLs of one level, queueing the pages as they arrive. Returns the
+        links of the level in frontier order, or None when the deadline passed.
+        """
+        loop = asyncio.get_running_loop()
+        follow_links = depth < self.website.depth
+        tasks = [asyncio.create_task(self._fetch(client, url, depth)) for url in frontier]
+        links: List[List[str]] = [[] for _ in frontier]
+        positions = {task: position for position, task in enumerate(tasks)}
+        pending = set(tasks)
+
+        try:
+            while pending:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    return None
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    page = task.result()
+                    if page is None:
+                        continue
+                    if follow_links:
+                        links[positions[task]] = page.links
+                    if page.content_sha1 in self._content_sha1s:
+                        self.stats.duplicates += 1
+                        continue
+                    self._content_sha1s.add(page.content_sha1)
+                    self.stats.urls.append(page.url)
+                    await queue.put(page)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return [link for page_links in links for link in page_links]
+
+    def removed_urls(self) -> List[str]:
+        """
+        URLs of the previous crawl that disappeared: the ones answered with 404 or 410,
+        and, when the crawl went through the whole website, the ones no longer reached.
+        """
+        removed = set(self._gone)
+        complete = not (self.stats.timed_out or self.stats.truncated or self.stats.failed)
+        if complete:
+            removed.update(url for url in self.previous if url not in self._reached)
+        return sorted(url for url in removed if url in self.previous)
+
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        state = self.previous.get(url)
+        headers = {}
+        if state is not None and state.etag:
+            headers["If-None-Match"] = state.etag
+        if state is not None and state.last_modified:
+            headers["If-Modified-Since"] = state.last_modified
+        return headers
+
+    async def _fetch(
+        self, client: httpx.AsyncClient, url: str, depth: int
+    ) -> Optional[CrawledPage]:
+        try:
+            async with self._hosts.slot(urlsplit(url).netloc):
+                with metrics.timer("crawl.fetch_seconds"):
+                    response = await client.get(
+                        url, headers=self._conditional_headers(url)
+                    )
+        except httpx.HTTPError as e:
+            logger.warning(f"Error fetching {url}: {e}")
+            self.stats.failed += 1
+            metrics.increment("crawl.failed")
+            return None
+
+        previous = self.previous.get(url)
+        if response.status_code == 304 and previous is not None:
+            self._reached.add(url)
+            self.stats.unchanged += 1
+            metrics.increment("crawl.not_modified")
+            return CrawledPage(
+                url=url,
+                depth=depth,
+                content="",
+                content_sha1=previous.content_sha1 or "",
+                etag=response.headers.get("etag", previous.etag),
+                last_modified=response.headers.get("last-modified", previous.last_modified),
+                links=previous.links,
+                changed=False,
+            )
+        if response.status_code in (404, 410):
+            self._gone.add(url)
+        elif response.status_code == 429 or response.status_code >= 500:
+            # The links of the page are missing from this crawl, so are maybe other pages
+            logger.warning(f"Error fetching {url}: status {response.status_code}")
+            self.stats.failed += 1
+            metrics.increment("crawl.failed")
+            return None
+
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if (
+            response.status_code != 200
+            or content_type not in HTML_CONTENT_TYPES
+            or len(response.content) > self.settings.crawl_max_page_bytes
+        ):
+            logger.info(f"Skipping {url}: status {response.status_code}, {content_type}")
+            self.stats.skipped += 1
+            metrics.increment("crawl.skipped")
+            if previous is not None and url not in self._gone:
+                # Only a 404 or 410 removes a page of the previous crawl
+                self._reached.add(url)
+            return None
+
+        self.stats.fetched += 1
+        metrics.increment("crawl.pages")
+
+        # Redirects land on a URL that may be crawled under its own name
+        final_url = normalize_url(str(response.url)) or url
+        self._seen.add(final_url)
+        self._reached.update((url, final_url))
+
+        html = response.text
+        content_sha1 = compute_sha1_from_content(response.content)
+        # Servers without conditional requests send the same content again
+        changed = previous is None or previous.content_sha1 != content_sha1
+        if not changed:
+            self.stats.unchanged += 1
+            metrics.increment("crawl.unchanged")
+
+        return CrawledPage(
+            url=final_url,
+            depth=depth,
+            content=html,
+            content_sha1=content_sha1,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            links=extract_links(html, str(response.url)),
+            changed=changed,
+        )
+
+
 def slugify(text):
     text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("utf-8")
     text = re.sub(r"[^\w\s-]", "", text).strip().lower()
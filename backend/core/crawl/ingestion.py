@@ -0,0 +1,114 @@
+import os
+import shutil
+
+from crawl.crawler import CrawledPage, Crawler, CrawlWebsite
+from fastapi import UploadFile
+from logger import get_logger
+from models.brains import Brain
+from models.crawl_state import CrawlState
+from models.files import File
+from models.settings import CommonsDep
+from repository.crawl_state.delete_crawl_states import adelete_crawl_states
+from repository.crawl_state.get_crawl_states import aget_crawl_states
+from repository.crawl_state.upsert_crawl_state import aupsert_crawl_state
+from starlette.concurrency import run_in_threadpool
+from utils.processors import create_response, filter_file
+
+logger = get_logger(__name__)
+
+
+async def ingest_page(
+    commons: CommonsDep,
+    page: CrawledPage,
+    brain_id,
+    enable_summarization: bool,
+    openai_api_key,
+) -> dict:
+    """Send one crawled page through the upload processing, as an HTML file."""
+    file_path = page.write_temporary_file()
+    try:
+        # Pass the crawled file to UploadFile, the loaders read it in place
+        with open(file_path, "rb") as crawled_file:
+            file = File(
+                file=UploadFile(
+                    file=crawled_file,  # pyright: ignore reportPrivateUsage=none
+                    filename=page.file_name,
+                )
+            )
+            return await filter_file(
+                commons,
+                file,
+                enable_summarization,
+                brain_id,
+                openai_api_key=openai_api_key,
+            )
+    finally:
+        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+
+
+async def crawl_into_brain(
+    commons: CommonsDep,
+    crawl_website: CrawlWebsite,
+    brain_id,
+    enable_summarization: bool,
+    openai_api_key=None,
+) -> dict:
+    """
+    Crawl the website and ingest each page in the brain as soon as it is fetched.
+    Pages kept from a previous crawl of the brain are only ingested again when their
+    content changed, and the pages that disappeared are unlinked from the brain.
+    """
+    brain = Brain(id=brain_id)
+    states = await aget_crawl_states(brain_id)
+    crawler = Crawler(crawl_website, previous=states)
+    ingested = 0
+    unchanged = 0
+    errors = []
+
+    async for page in crawler.pages():
+        if page.changed:
+            message = await ingest_page(
+                commons, page, brain_id, enable_summarization, openai_api_key
+            )
+            if message["type"] == "error":
+                errors.append(page.url)
+                continue
+            ingested += 1
+            # A new version replaces the previous one of the same page in the brain
+            chunks = await run_in_threadpool(brain.get_file_chunks, page.file_name)
+            vector_ids = [chunk["vector_id"] for chunk in chunks]
+        else:
+            unchanged += 1
+            vector_ids = states[page.url].vector_ids if page.url in states else []
+
+        await aupsert_crawl_state(
+            CrawlState(
+                brain_id=str(brain_id),
+                url=page.url,
+                etag=page.etag,
+                last_modified=page.last_modified,
+                content_sha1=page.content_sha1,
+                links=page.links,
+                vector_ids=vector_ids,
+            )
+        )
+
+    removed_urls = crawler.removed_urls()
+    removed_vector_ids = [
+        vector_id for url in removed_urls for vector_id in states[url].vector_ids
+    ]
+    if removed_vector_ids:
+        await run_in_threadpool(brain.delete_brain_vectors, removed_vector_ids)
+    await adelete_crawl_states(brain_id, removed_urls)
+
+    logger.info(
+        f"Crawled {crawl_website.url} into brain {brain_id}: {ingested} pages ingested, {unchanged} unchanged, {len(removed_urls)} removed, {len(errors)} errors, {crawler.stats.to_dict()}"
+    )
+    if ingested + unchanged == 0:
+        return create_response(
+            f"❌ No page of {crawl_website.url} could be crawled.", "error"
+        )
+    return create_response(
+        f"✅ {crawl_website.url} has been crawled into brain {brain_id}: {ingested} pages updated, {unchanged} unchanged, {len(removed_urls)} removed.",
+        "success" if not errors else "warning",
+    )
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from logger import get_logger
+from models.settings import AnswerCacheSettings
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# (brain_id, files version of the brain, model, temperature, max_tokens, search filters):
+# answers only apply to the same generation parameters and documents
+CacheNamespace = Tuple[str, int, str, float, int, str]
+
+
+@dataclass
+class AnswerCacheEntry:
+    namespace: CacheNamespace
+    question: str
+    embedding: np.ndarray
+    answer: str
+    created_at: float
+
+
+class AnswerCache:
+    """
+    Semantic cache of the answers given by the brains: a question whose embedding is
+    close enough to a question already answered with the same brain and parameters
+    gets the same answer. Entries expire after `answer_cache_ttl` seconds, the least
+    recently used are evicted past `answer_cache_max_entries`. The namespace holds the
+    files version of the brain, bumped by the database whenever files are added to or
+    deleted from it, so no API process serves the answers given before the change; the
+    process making the change also drops the entries of the brain right away.
+    """
+
+    def __init__(self, settings: Optional[AnswerCacheSettings] = None):
+        self.settings = settings or AnswerCacheSettings()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, AnswerCacheEntry]" = OrderedDict()
+        self._namespaces: Dict[CacheNamespace, List[int]] = {}
+        self._next_key = 0
+
+    def get(
+        self, namespace: CacheNamespace, embedding: List[float]
+    ) -> Optional[AnswerCacheEntry]:
+        query = _normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(namespace, now)
+            keys = self._namespaces.get(namespace, [])
+            if keys:
+                matrix = np.stack([self._entries[key].embedding for key in keys])
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.settings.answer_cache_similarity:
+                    self._entries.move_to_end(keys[best])
+                    metrics.increment("answer_cache.hits")
+                    return self._entries[keys[best]]
+
+        metrics.increment("answer_cache.misses")
+        return None
+
+    def set(
+        self, namespace: CacheNamespace, question: str, embedding: List[float], answer: str
+    ) -> None:
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = AnswerCacheEntry(
+                namespace=namespace,
+                question=question,
+                embedding=_normalize(embedding),
+                answer=answer,
+                created_at=time.monotonic(),
+            )
+            self._namespaces.setdefault(namespace, []).append(key)
+
+            while len(self._entries) > self.settings.answer_cache_max_entries:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._namespaces[evicted.namespace].remove(evicted_key)
+                metrics.increment("answer_cache.evictions")
+
+    def invalidate_brain(self, brain_id: str) -> None:
+        brain_id = str(brain_id)
+        with self._lock:
+            for namespace in [ns for ns in self._namespaces if ns[0] == brain_id]:
+                for key in self._namespaces.pop(namespace):
+                    self._entries.pop(key, None)
+        metrics.increment("answer_cache.invalidations")
+
+    def _expire(self, namespace: CacheNamespace, now: float) -> None:
+        keys = self._namespaces.get(namespace, [])
+        expired = [
+            key
+            for key in keys
+            if now - self._entries[key].created_at > self.settings.answer_cache_ttl
+        ]
+        for key in expired:
+            keys.remove(key)
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        hits = metrics.get_counter("answer_cache.hits")
+        misses = metrics.get_counter("answer_cache.misses")
+
+        return {
+            "size": size,
+            "max_size": self.settings.answer_cache_max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    global _answer_cache
+
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache()
+                metrics.register_collector("answer_cache", _answer_cache.stats)
+
+    return _answer_cache
+
+
+def invalidate_brain_answers(brain_id) -> None:
+    """Drop the cached answers of a brain whose files changed."""
+    get_answer_cache().invalidate_brain(brain_id)
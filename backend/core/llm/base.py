@@ -1,13 +1,20 @@
 from abc import abstractmethod
-from typing import AsyncIterable, List
+from typing import AsyncIterable, Callable, List, Optional, Tuple
 
 from langchain.callbacks import AsyncIteratorCallbackHandler
 from langchain.callbacks.base import AsyncCallbackHandler
 from langchain.chains import ConversationalRetrievalChain, LLMChain
 from langchain.llms.base import LLM
+from llm.answer_cache import CacheNamespace, get_answer_cache
+from llm.utils.history import ChatHistoryManager, HistoryWindow
 from logger import get_logger
-from models.settings import BrainSettings  # Importing settings related to the 'brain'
+from models.chats import SearchFilters
+from models.settings import (  # Importing settings related to the 'brain'
+    AnswerCacheSettings,
+    BrainSettings,
+)
 from pydantic import BaseModel  # For data validation and settings management
+from repository.brain.get_brain_files_version import get_brain_files_version
 from utils.constants import streaming_compatible_models
 
 logger = get_logger(__name__)
@@ -21,6 +28,7 @@ class BaseBrainPicking(BaseModel):
 
     # Instantiate settings
     brain_settings = BrainSettings()  # type: ignore other parameters are optional
+    answer_cache_settings = AnswerCacheSettings()
 
     # Default class attributes
     model: str = None  # pyright: ignore reportPrivateUsage=none
@@ -30,6 +38,8 @@ class BaseBrainPicking(BaseModel):
     max_tokens: int = 256
     user_openai_api_key: str = None  # pyright: ignore reportPrivateUsage=none
     streaming: bool = False
+    # Restrict the documents of the brain the answer is based on
+    search_filters: Optional[SearchFilters] = None
 
     openai_api_key: str = None  # pyright: ignore reportPrivateUsage=none
     callbacks: List[
@@ -60,9 +70,7 @@ class BaseBrainPicking(BaseModel):
     ) -> List[AsyncIteratorCallbackHandler]:  # pyright: ignore reportPrivateUsage=none
         """If streaming is set, set the AsyncIteratorCallbackHandler as the only callback."""
         if streaming:
-            return [
-                AsyncIteratorCallbackHandler  # pyright: ignore reportPrivateUsage=none
-            ]
+            return [AsyncIteratorCallbackHandler()]
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -77,6 +85,66 @@ class BaseBrainPicking(BaseModel):
             self.streaming
         )  # pyright: ignore reportPrivateUsage=none
 
+    @property
+    def history_manager(self) -> ChatHistoryManager:
+        return ChatHistoryManager(
+            self.chat_id, self.openai_api_key, model=self.model
+        )  # pyright: ignore reportPrivateUsage=none
+
+    def _lookup_answer_cache(
+        self,
+        question: str,
+        history_window: HistoryWindow,
+        embed_question: Optional[Callable[[], List[float]]] = None,
+    ) -> Tuple[Optional[str], Optional[Tuple[CacheNamespace, List[float]]]]:
+        """
+        Return the cached answer to the question, if any, and the namespace and question embedding to store the answer with.
+        Only questions asked without history are served, as follow-ups depend on the conversation.
+        embed_question returns the embedding of the question when it is already being computed.
+        """
+        if (
+            not self.answer_cache_settings.answer_cache_enabled
+            or history_window.summary
+            or history_window.turns
+        ):
+            return None, None
+
+        try:
+            # Read on every lookup, the files of the brain may have changed in another process
+            namespace = self._answer_cache_namespace(get_brain_files_version(self.brain_id))
+        except Exception as e:
+            logger.error(f"Error reading the files version of brain {self.brain_id}: {e}")
+            return None, None
+
+        if embed_question is not None:
+            embedding = embed_question()
+        else:
+            embedding = self.embeddings.embed_query(  # pyright: ignore reportPrivateUsage=none
+                question
+            )
+        entry = get_answer_cache().get(namespace, embedding)
+        return (entry.answer if entry else None), (namespace, embedding)
+
+    def _store_answer_cache(
+        self,
+        question: str,
+        cache_key: Optional[Tuple[CacheNamespace, List[float]]],
+        answer: str,
+    ) -> None:
+        if cache_key is not None and answer:
+            namespace, embedding = cache_key
+            get_answer_cache().set(namespace, question, embedding, answer)
+
+    def _answer_cache_namespace(self, files_version: int) -> CacheNamespace:
+        return (
+            str(self.brain_id),
+            files_version,
+            self.model,
+            float(self.temperature),
+            int(self.max_tokens),
+            self.search_filters.cache_key if self.search_filters else "",
+        )
+
     class Config:
         """Configuration of the Pydantic Object"""
 
@@ -160,8 +228,8 @@ class BaseBrainPicking(BaseModel):
             :param question: The question
             :return: The generated answer.
 
-            This function should also call: _create_qa, get_chat_history and format_chat_history.
-            It should also update the chat_history in the DB.
+            This function should also call: _create_qa and history_manager.get_window.
+            It should also update the chat_history in the DB and schedule its summarization.
             """
 
         async def generate_stream(self, question: str) -> AsyncIterable:
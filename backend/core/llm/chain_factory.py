@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+from logger import get_logger
+from models.settings import ChainPoolSettings
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class ChainFactory:
+    """
+    Pool of the LLMs, chains and vector stores that only depend on configuration
+    (model, temperature, API key, brain...), built once and shared by the requests.
+    The objects are stateless: the question, the history and the streaming callbacks
+    are bound on each call, never stored on the pooled instances.
+    """
+
+    def __init__(self, settings: Optional[ChainPoolSettings] = None):
+        self.settings = settings or ChainPoolSettings()
+        self._lock = threading.Lock()
+        self._pool: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get_or_create(self, key: Hashable, create: Callable[[], T]) -> T:
+        with self._lock:
+            if key in self._pool:
+                self._pool.move_to_end(key)
+                metrics.increment("chain_pool.hits")
+                return self._pool[key]
+
+        # Built outside of the lock: two requests racing on a new key both build
+        # an instance and the last one is kept, which is harmless for stateless objects
+        metrics.increment("chain_pool.misses")
+        with metrics.timer("chain_pool.create_seconds"):
+            value = create()
+
+        with self._lock:
+            self._pool[key] = value
+            self._pool.move_to_end(key)
+            while len(self._pool) > self.settings.chain_pool_max_size:
+                self._pool.popitem(last=False)
+
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pool.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._pool)
+        hits = metrics.get_counter("chain_pool.hits")
+        misses = metrics.get_counter("chain_pool.misses")
+
+        return {
+            "size": size,
+            "max_size": self.settings.chain_pool_max_size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+_chain_factory: Optional[ChainFactory] = None
+_chain_factory_lock = threading.Lock()
+
+
+def get_chain_factory() -> ChainFactory:
+    global _chain_factory
+
+    if _chain_factory is None:
+        with _chain_factory_lock:
+            if _chain_factory is None:
+                _chain_factory = ChainFactory()
+                metrics.register_collector("chain_pool", _chain_factory.stats)
+
+    return _chain_factory
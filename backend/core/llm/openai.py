@@ -1,8 +1,12 @@
+from typing import Optional
+
 from langchain.chat_models import ChatOpenAI
-from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
 from langchain.llms.base import BaseLLM
 from llm.qa_base import QABaseBrainPicking
 from logger import get_logger
+from models.chats import SearchFilters
+from vectorstore.embedding_cache import get_embeddings
 
 logger = get_logger(__name__)
 
@@ -25,6 +29,7 @@ class OpenAIBrainPicking(QABaseBrainPicking):
         max_tokens: int,
         user_openai_api_key: str,
         streaming: bool = False,
+        search_filters: Optional[SearchFilters] = None,
     ) -> "OpenAIBrainPicking":  # pyright: ignore reportPrivateUsage=none
         """
         Initialize the BrainPicking class by setting embeddings, supabase client, vector store, language model and chains.
@@ -38,13 +43,12 @@ class OpenAIBrainPicking(QABaseBrainPicking):
             temperature=temperature,
             user_openai_api_key=user_openai_api_key,
             streaming=streaming,
+            search_filters=search_filters,
         )
 
     @property
-    def embeddings(self) -> OpenAIEmbeddings:
-        return OpenAIEmbeddings(
-            openai_api_key=self.openai_api_key
-        )  # pyright: ignore reportPrivateUsage=none
+    def embeddings(self) -> Embeddings:
+        return get_embeddings(self.openai_api_key)
 
     def _create_llm(self, model, streaming=False, callbacks=None) -> BaseLLM:
         """
@@ -59,4 +63,5 @@ class OpenAIBrainPicking(QABaseBrainPicking):
             model=model,
             streaming=streaming,
             callbacks=callbacks,
+            openai_api_key=self.openai_api_key,
         )  # pyright: ignore reportPrivateUsage=none
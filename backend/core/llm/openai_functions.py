@@ -1,20 +1,49 @@
-from typing import Any, Dict, List, Optional
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from langchain.chat_models import ChatOpenAI
-from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
 from llm.models.FunctionCall import FunctionCall
 from llm.models.OpenAiAnswer import OpenAiAnswer
+from llm.utils.context import ContextPacker
+from llm.utils.history import HistoryWindow
 from logger import get_logger
 from models.chat import ChatHistory
-from repository.chat.get_chat_history import get_chat_history
+from models.chats import SearchFilters
+from models.settings import (
+    ContextSettings,
+    QuestionPipelineSettings,
+    common_dependencies,
+)
 from repository.chat.update_chat_history import update_chat_history
-from supabase.client import Client, create_client
+from supabase.client import Client
+from utils.metrics import metrics
+from vectorstore.embedding_cache import get_embeddings
+from vectorstore.factory import get_brain_vector_store
 from vectorstore.supabase import CustomSupabaseVectorStore
 
 from .base import BaseBrainPicking
 
 logger = get_logger(__name__)
 
+# Stages of the question pipeline run next to the completions
+_pipeline_executor = ThreadPoolExecutor(
+    max_workers=QuestionPipelineSettings().question_pipeline_workers,
+    thread_name_prefix="question-pipeline",
+)
+
+
+def _submit_stage(stage: str, fn: Callable, *args) -> Future:
+    """Run a stage of the question pipeline in the background, timing it."""
+
+    def run():
+        with metrics.timer(f"question_pipeline.{stage}"):
+            return fn(*args)
+
+    return _pipeline_executor.submit(run)
+
 
 def format_answer(model_response: Dict[str, Any]) -> OpenAiAnswer:
     answer = model_response["choices"][0]["message"]
@@ -39,6 +68,9 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
     It allows to initialize a Chat model, generate questions and retrieve answers using ConversationalRetrievalChain.
     """
 
+    pipeline_settings = QuestionPipelineSettings()
+    context_settings = ContextSettings()
+
     # Default class attributes
     model: str = "gpt-3.5-turbo-0613"
 
@@ -50,6 +82,7 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
         max_tokens: int,
         brain_id: str,
         user_openai_api_key: str,
+        search_filters: Optional[SearchFilters] = None,
         # TODO: add streaming
     ) -> "OpenAIFunctionsBrainPicking":  # pyright: ignore reportPrivateUsage=none
         super().__init__(
@@ -60,6 +93,7 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
             temperature=temperature,
             brain_id=str(brain_id),
             streaming=False,
+            search_filters=search_filters,
         )
 
     @property
@@ -69,24 +103,20 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
         )  # pyright: ignore reportPrivateUsage=none
 
     @property
-    def embeddings(self) -> OpenAIEmbeddings:
-        return OpenAIEmbeddings(
-            openai_api_key=self.openai_api_key
-        )  # pyright: ignore reportPrivateUsage=none
+    def embeddings(self) -> Embeddings:
+        return get_embeddings(self.openai_api_key)
 
     @property
     def supabase_client(self) -> Client:
-        return create_client(
-            self.brain_settings.supabase_url, self.brain_settings.supabase_service_key
-        )
+        return common_dependencies()["supabase"]
 
     @property
     def vector_store(self) -> CustomSupabaseVectorStore:
-        return CustomSupabaseVectorStore(
+        return get_brain_vector_store(
             self.supabase_client,
             self.embeddings,
-            table_name="vectors",
             brain_id=self.brain_id,
+            backend=self.brain_settings.retrieval_backend,
         )
 
     def _get_model_response(
@@ -111,33 +141,46 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
 
         return self.openai_client.completion_with_retry(**kwargs)
 
-    def _get_chat_history(self) -> List[Dict[str, str]]:
+    def _get_chat_history(
+        self, history_window: Optional[HistoryWindow] = None
+    ) -> List[Dict[str, str]]:
         """
         Retrieves the chat history in a formatted list
         """
         logger.info("Getting chat history")
-        history = get_chat_history(self.chat_id)
-        return [
-            item
-            for chat in history
-            for item in [
-                {"role": "user", "content": chat.user_message},
-                {"role": "assistant", "content": chat.assistant},
-            ]
-        ]
+        if history_window is None:
+            history_window = self.history_manager.get_window()
+        return history_window.as_messages()
 
-    def _get_context(self, question: str) -> str:
+    def _get_context(
+        self, question: str, question_embedding: Optional[Future] = None
+    ) -> List[Tuple[Document, float]]:
         """
-        Retrieve documents related to the question
+        Retrieve the documents related to the question with their similarity,
+        reusing its embedding when it is being computed
         """
         logger.info("Getting context")
 
-        return self.vector_store.similarity_search(
-            query=question
+        if question_embedding is not None:
+            embedding = question_embedding.result()
+        else:
+            embedding = self.embeddings.embed_query(question)
+
+        # The text of the question feeds the lexical side of the hybrid backend
+        return self.vector_store.similarity_search_by_vector_with_score(
+            embedding,
+            k=self.context_settings.context_candidates,
+            query=question,
+            filters=self.search_filters,
         )  # pyright: ignore reportPrivateUsage=none
 
     def _construct_prompt(
-        self, question: str, useContext: bool = False, useHistory: bool = False
+        self,
+        question: str,
+        useContext: bool = False,
+        useHistory: bool = False,
+        history_window: Optional[HistoryWindow] = None,
+        context: Optional[Future] = None,
     ) -> List[Dict[str, str]]:
         """
         Constructs a prompt given a question, and optionally include context and history
@@ -174,7 +217,7 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
 
         if useHistory:
             logger.info("Adding chat history to prompt")
-            history = self._get_chat_history()
+            history = self._get_chat_history(history_window)
             system_messages.append(
                 {"role": "system", "content": "Previous messages are already in chat."}
             )
@@ -182,8 +225,16 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
 
         if useContext:
             logger.info("Adding chat context to prompt")
-            chat_context = self._get_context(question)
-            context_message = f"Here are the documents you have access to: {chat_context if chat_context else 'No document found'}"
+            if context is not None:
+                chat_context = context.result()
+                metrics.increment("question_pipeline.retrieval_used")
+            else:
+                with metrics.timer("question_pipeline.retrieval_seconds"):
+                    chat_context = self._get_context(question)
+            packed_context = ContextPacker(self.model, self.context_settings).pack_and_render(
+                chat_context
+            )
+            context_message = f"Here are the documents you have access to: {packed_context or 'No document found'}"
             system_messages.append({"role": "user", "content": context_message})
 
         system_messages.append({"role": "user", "content": question})
@@ -203,11 +254,79 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
             },
         ]
 
-        # First, try to get an answer using just the question
-        response = self._get_model_response(
-            messages=self._construct_prompt(question), functions=functions
+        start_time = time.perf_counter()
+
+        # Send the first completion right away and start everything else next to it, so
+        # that the answer cache lookup, the history and the documents are done by the
+        # time the model answers or asks for them
+        first_response = _submit_stage(
+            "first_completion_seconds",
+            self._get_model_response,
+            self._construct_prompt(question),
+            functions,
         )
-        formatted_response = format_answer(response)
+        question_embedding = _submit_stage(
+            "embed_seconds", self.embeddings.embed_query, question
+        )
+        history = _submit_stage("history_seconds", self.history_manager.get_window)
+        context = None
+        if self.pipeline_settings.speculative_retrieval:
+            metrics.increment("question_pipeline.retrieval_speculated")
+            context = _submit_stage(
+                "retrieval_seconds", self._get_context, question, question_embedding
+            )
+
+        try:
+            answer, cache_key = None, None
+            if self.answer_cache_settings.answer_cache_enabled:
+                # Only questions without history are cached, so the lookup needs the window
+                answer, cache_key = self._lookup_answer_cache(
+                    question, history.result(), question_embedding.result
+                )
+            if answer is None:
+                answer = self._generate_model_answer(
+                    question, first_response, history, functions, context
+                )
+                self._store_answer_cache(question, cache_key, answer)
+            else:
+                metrics.increment("question_pipeline.completion_discarded")
+        finally:
+            # On a cache hit the first completion is not needed, and when the model answered
+            # without the documents neither is the speculative retrieval: drop them, or
+            # discard their result if they are already running
+            first_response.cancel()
+            if context is not None and context.cancel():
+                metrics.increment("question_pipeline.retrieval_cancelled")
+
+        metrics.observe(
+            "question_pipeline.answer_seconds", time.perf_counter() - start_time
+        )
+
+        # Update chat history
+        chat_history = update_chat_history(
+            chat_id=self.chat_id,
+            user_message=question,
+            assistant=answer,
+        )
+        self.history_manager.schedule_summarization()
+
+        return chat_history
+
+    def _generate_model_answer(
+        self,
+        question: str,
+        first_response: Future,
+        history: Future,
+        functions: List[Dict[str, Any]],
+        context: Optional[Future] = None,
+    ) -> str:
+        """
+        Ask the model, giving it the history and the context when it calls for them.
+        first_response is the completion of the question alone, already submitted;
+        the history window is only waited for when the model calls for it.
+        """
+        # First, try to get an answer using just the question
+        formatted_response = format_answer(first_response.result())
 
         # If the model calls for history, try again with history included
         if (
@@ -215,10 +334,11 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
             and formatted_response.function_call.name == "get_history"
         ):
             logger.info("Model called for history")
-            response = self._get_model_response(
-                messages=self._construct_prompt(question, useHistory=True),
-                functions=[],
+            messages = self._construct_prompt(
+                question, useHistory=True, history_window=history.result()
             )
+            with metrics.timer("question_pipeline.second_completion_seconds"):
+                response = self._get_model_response(messages=messages, functions=[])
 
             formatted_response = format_answer(response)
 
@@ -227,19 +347,15 @@ class OpenAIFunctionsBrainPicking(BaseBrainPicking):
             and formatted_response.function_call.name == "get_history_and_context"
         ):
             logger.info("Model called for history and context")
-            response = self._get_model_response(
-                messages=self._construct_prompt(
-                    question, useContext=True, useHistory=True
-                ),
-                functions=[],
+            messages = self._construct_prompt(
+                question,
+                useContext=True,
+                useHistory=True,
+                history_window=history.result(),
+                context=context,
             )
+            with metrics.timer("question_pipeline.second_completion_seconds"):
+                response = self._get_model_response(messages=messages, functions=[])
             formatted_response = format_answer(response)
 
-        # Update chat history
-        chat_history = update_chat_history(
-            chat_id=self.chat_id,
-            user_message=question,
-            assistant=formatted_response.content or "",
-        )
-
-        return chat_history
+        return formatted_response.content or ""
@@ -1,10 +1,12 @@
 from typing import Optional
 
-from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
 from langchain.llms.base import BaseLLM
 from langchain.llms.gpt4all import GPT4All
 from llm.qa_base import QABaseBrainPicking
 from logger import get_logger
+from models.chats import SearchFilters
+from vectorstore.embedding_cache import get_embeddings
 
 logger = get_logger(__name__)
 
@@ -24,6 +26,7 @@ class PrivateGPT4AllBrainPicking(QABaseBrainPicking):
         user_openai_api_key: Optional[str],
         streaming: bool,
         model_path: str,
+        search_filters: Optional[SearchFilters] = None,
     ) -> None:
         """
         Initialize the PrivateBrainPicking class by calling the parent class's initializer.
@@ -31,6 +34,7 @@ class PrivateGPT4AllBrainPicking(QABaseBrainPicking):
         :param chat_id: The id of the chat in the DB.
         :param streaming: Whether to enable streaming of the model
         :param model_path: The path to the model. If not provided, a default path is used.
+        :param search_filters: Restrict the documents of the brain the answer is based on.
         """
 
         super().__init__(
@@ -39,6 +43,7 @@ class PrivateGPT4AllBrainPicking(QABaseBrainPicking):
             chat_id=chat_id,
             user_openai_api_key=user_openai_api_key,
             streaming=streaming,
+            search_filters=search_filters,
         )
 
         # Set the model path
@@ -46,10 +51,12 @@ class PrivateGPT4AllBrainPicking(QABaseBrainPicking):
 
     # TODO: Use private embeddings model. This involves some restructuring of how we store the embeddings.
     @property
-    def embeddings(self) -> OpenAIEmbeddings:
-        return OpenAIEmbeddings(
-            openai_api_key=self.openai_api_key
-        )  # pyright: ignore reportPrivateUsage=none
+    def embeddings(self) -> Embeddings:
+        return get_embeddings(self.openai_api_key)
+
+    def _pool_key(self, kind: str, *extra) -> tuple:
+        # Pool one model per file
+        return super()._pool_key(kind, self.model_path, *extra)
 
     def _create_llm(
         self,
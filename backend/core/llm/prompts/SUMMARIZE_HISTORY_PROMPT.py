@@ -0,0 +1,13 @@
+from langchain.prompts.prompt import PromptTemplate
+
+_template = """Progressively summarize the lines of conversation provided, adding onto the previous summary and returning a new summary.
+Keep the facts, names, figures, document references and decisions the assistant may need later. Write the summary in the language of the conversation.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+SUMMARIZE_HISTORY_PROMPT = PromptTemplate.from_template(_template)
@@ -1,19 +1,27 @@
 import asyncio
 import json
+import re
 from abc import abstractmethod, abstractproperty
 from typing import AsyncIterable, Awaitable
 
 from langchain.chains import ConversationalRetrievalChain, LLMChain
+from langchain.chains.combine_documents.stuff import StuffDocumentsChain
 from langchain.chains.question_answering import load_qa_chain
-from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
 from langchain.llms.base import BaseLLM
+from llm.chain_factory import get_chain_factory
 from logger import get_logger
 from models.chat import ChatHistory
-from repository.chat.format_chat_history import format_chat_history
-from repository.chat.get_chat_history import get_chat_history
-from repository.chat.update_chat_history import update_chat_history
-from repository.chat.update_message_by_id import update_message_by_id
-from supabase.client import Client, create_client
+from models.settings import common_dependencies
+from repository.chat.update_chat_history import (
+    aupdate_chat_history,
+    update_chat_history,
+)
+from repository.chat.update_message_by_id import aupdate_message_by_id
+from starlette.concurrency import run_in_threadpool
+from supabase.client import Client
+from utils.file import compute_sha1_from_content
+from vectorstore.factory import get_brain_vector_store
 from vectorstore.supabase import CustomSupabaseVectorStore
 
 from .base import BaseBrainPicking
@@ -49,51 +57,111 @@ class QABaseBrainPicking(BaseBrainPicking):
         )
 
     @abstractproperty
-    def embeddings(self) -> OpenAIEmbeddings:
+    def embeddings(self) -> Embeddings:
         raise NotImplementedError("This property should be overridden in a subclass.")
 
     @property
     def supabase_client(self) -> Client:
-        return create_client(
-            self.brain_settings.supabase_url, self.brain_settings.supabase_service_key
+        return common_dependencies()["supabase"]
+
+    def _pool_key(self, kind: str, *extra) -> tuple:
+        """
+        Key of a pooled object: everything the LLMs and chains are configured with.
+        The API key is hashed so that it is never kept in the pool keys.
+        """
+        return (
+            kind,
+            type(self).__name__,
+            self.model,
+            float(self.temperature),
+            compute_sha1_from_content((self.openai_api_key or "").encode("utf-8")),
+            *extra,
         )
 
     @property
     def vector_store(self) -> CustomSupabaseVectorStore:
-        return CustomSupabaseVectorStore(
-            self.supabase_client,
-            self.embeddings,
-            table_name="vectors",
-            brain_id=self.brain_id,
+        backend = self.brain_settings.retrieval_backend
+        return get_chain_factory().get_or_create(
+            self._pool_key("vector_store", str(self.brain_id), backend),
+            lambda: get_brain_vector_store(
+                self.supabase_client,
+                self.embeddings,
+                brain_id=self.brain_id,
+                backend=backend,
+            ),
         )
 
     @property
     def question_llm(self):
-        return self._create_llm(model=self.model, streaming=False)
+        return get_chain_factory().get_or_create(
+            self._pool_key("question_llm"),
+            lambda: self._create_llm(model=self.model, streaming=False),
+        )
 
     @property
     def doc_llm(self):
-        return self._create_llm(
-            model=self.model, streaming=self.streaming, callbacks=self.callbacks
-        )
+        llm = self._pooled_doc_llm()
+        if self.callbacks:
+            # Shallow copy sharing the client of the pooled LLM, with the callbacks of this question
+            return llm.copy(update={"callbacks": self.callbacks})
+        return llm
 
     @property
     def question_generator(self) -> LLMChain:
-        return LLMChain(llm=self.question_llm, prompt=CONDENSE_QUESTION_PROMPT)
+        return get_chain_factory().get_or_create(
+            self._pool_key("question_generator"),
+            lambda: LLMChain(llm=self.question_llm, prompt=CONDENSE_QUESTION_PROMPT),
+        )
 
     @property
-    def doc_chain(self) -> LLMChain:
-        return load_qa_chain(
-            llm=self.doc_llm, chain_type="stuff"
-        )  # pyright: ignore reportPrivateUsage=none
+    def doc_chain(self) -> StuffDocumentsChain:
+        doc_chain = self._pooled_doc_chain()
+        if self.callbacks:
+            return doc_chain.copy(
+                update={
+                    "llm_chain": doc_chain.llm_chain.copy(update={"llm": self.doc_llm})
+                }
+            )
+        return doc_chain
 
     @property
     def qa(self) -> ConversationalRetrievalChain:
-        return ConversationalRetrievalChain(
-            retriever=self.vector_store.as_retriever(),
-            question_generator=self.question_generator,
-            combine_docs_chain=self.doc_chain,  # pyright: ignore reportPrivateUsage=none
-            verbose=True,
+        qa = get_chain_factory().get_or_create(
+            self._pool_key(
+                "qa",
+                self.streaming,
+                str(self.brain_id),
+                self.brain_settings.retrieval_backend,
+            ),
+            lambda: ConversationalRetrievalChain(
+                retriever=self.vector_store.as_retriever(),
+                question_generator=self.question_generator,
+                combine_docs_chain=self._pooled_doc_chain(),  # pyright: ignore reportPrivateUsage=none
+                verbose=True,
+            ),
+        )
+        update = {}
+        if self.callbacks:
+            update["combine_docs_chain"] = self.doc_chain
+        if self.search_filters:
+            update["retriever"] = self.vector_store.as_retriever(
+                search_kwargs={"filters": self.search_filters}
+            )
+        return qa.copy(update=update) if update else qa
+
+    # The pooled objects never hold the callbacks of a question, the properties bind them
+    def _pooled_doc_llm(self):
+        return get_chain_factory().get_or_create(
+            self._pool_key("doc_llm", self.streaming),
+            lambda: self._create_llm(model=self.model, streaming=self.streaming),
+        )
+
+    def _pooled_doc_chain(self) -> StuffDocumentsChain:
+        return get_chain_factory().get_or_create(
+            self._pool_key("doc_chain", self.streaming),
+            lambda: load_qa_chain(
+                llm=self._pooled_doc_llm(), chain_type="stuff"
+            ),  # pyright: ignore reportPrivateUsage=none
         )
 
     @abstractmethod
@@ -127,18 +195,18 @@ class QABaseBrainPicking(BaseBrainPicking):
         :param question: The question
         :return: The generated answer.
         """
-        transformed_history = []
-
-        # Get the history from the database
-        history = get_chat_history(self.chat_id)
-
-        # Format the chat history into a list of tuples (human, ai)
-        transformed_history = format_chat_history(history)
-
-        # Generate the model response using the QA chain
-        model_response = self._call_chain(self.qa, question, transformed_history)
+        # Get the summary and the most recent turns of the history from the database
+        history_window = self.history_manager.get_window()
+
+        answer, cache_key = self._lookup_answer_cache(question, history_window)
+        if answer is None:
+            # Generate the model response using the QA chain
+            model_response = self._call_chain(
+                self.qa, question, history_window.as_chain_history()
+            )
 
-        answer = model_response["answer"]
+            answer = model_response["answer"]
+            self._store_answer_cache(question, cache_key, answer)
 
         # Update chat history
         chat_answer = update_chat_history(
@@ -146,6 +214,7 @@ class QABaseBrainPicking(BaseBrainPicking):
             user_message=question,
             assistant=answer,
         )
+        self.history_manager.schedule_summarization()
 
         return chat_answer
 
@@ -157,7 +226,7 @@ class QABaseBrainPicking(BaseBrainPicking):
         :param history: The chat history from DB
         :return: The answer.
         """
-        return chain.acall(
+        return await chain.acall(
             {
                 "question": question,
                 "chat_history": history,
@@ -171,13 +240,20 @@ class QABaseBrainPicking(BaseBrainPicking):
         :return: An async iterable which generates the answer.
         """
 
-        history = get_chat_history(self.chat_id)
-        callback = self.callbacks[0]
+        history_window = await self.history_manager.aget_window()
+
+        cached_answer, cache_key = await run_in_threadpool(
+            self._lookup_answer_cache, question, history_window
+        )
+        if cached_answer is not None:
+            async for event in self._stream_cached_answer(question, cached_answer):
+                yield event
+            return
 
-        transformed_history = []
+        callback = self.callbacks[0]
 
-        # Format the chat history into a list of tuples (human, ai)
-        transformed_history = format_chat_history(history)
+        # Summary of the older turns followed by the most recent turns
+        transformed_history = history_window.as_chain_history()
 
         # Initialize a list to hold the tokens
         response_tokens = []
@@ -193,14 +269,12 @@ class QABaseBrainPicking(BaseBrainPicking):
 
         task = asyncio.create_task(
             wrap_done(
-                self.qa._acall_chain(  # pyright: ignore reportPrivateUsage=none
-                    self.qa, question, transformed_history
-                ),
+                self._acall_chain(self.qa, question, transformed_history),
                 callback.done,  # pyright: ignore reportPrivateUsage=none
             )
         )
 
-        streamed_chat_history = update_chat_history(
+        streamed_chat_history = await aupdate_chat_history(
             chat_id=self.chat_id,
             user_message=question,
             assistant="",
@@ -221,8 +295,26 @@ class QABaseBrainPicking(BaseBrainPicking):
         # Join the tokens to create the assistant's response
         assistant = "".join(response_tokens)
 
-        update_message_by_id(
+        await aupdate_message_by_id(
             message_id=streamed_chat_history.message_id,
             user_message=question,
             assistant=assistant,
         )
+        self._store_answer_cache(question, cache_key, assistant)
+        self.history_manager.schedule_summarization()
+
+    async def _stream_cached_answer(self, question: str, answer: str) -> AsyncIterable:
+        """
+        Stream a cached answer with the same server-sent events as a generated one.
+        """
+        streamed_chat_history = await aupdate_chat_history(
+            chat_id=self.chat_id,
+            user_message=question,
+            assistant=answer,
+        )
+
+        for token in re.findall(r"\s*\S+", answer):
+            streamed_chat_history.assistant = token
+            yield f"data: {json.dumps(streamed_chat_history.to_dict())}"
+
+        self.history_manager.schedule_summarization()
@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from logger import get_logger
+from models.settings import ContextSettings
+from utils.metrics import metrics
+from utils.tokens import count_tokens
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ContextChunk:
+    content: str
+    file_name: Optional[str]
+    file_sha1: Optional[str]
+    page: Optional[int]
+    similarity: float
+
+    @property
+    def citation(self) -> str:
+        citation = self.file_name or "Unknown document"
+        if self.page is not None:
+            citation += f", p. {self.page}"
+        return citation
+
+    def render(self, number: int) -> str:
+        return f"[{number}] {self.citation}\n{self.content}"
+
+
+class ContextPacker:
+    """
+    Fills the token budget of the model with the retrieved chunks, most similar first.
+    The text a chunk shares with a chunk of the same file already packed (the overlap
+    of the splitter) is only sent once, and each chunk is cited with its file and page.
+    """
+
+    def __init__(self, model: str, settings: Optional[ContextSettings] = None):
+        self.model = model
+        self.settings = settings or ContextSettings()
+
+    @property
+    def budget(self) -> int:
+        return self.settings.context_token_budgets.get(
+            self.model, self.settings.context_default_token_budget
+        )
+
+    def pack(self, scored_documents: List[Tuple[Document, float]]) -> List[ContextChunk]:
+        packed: List[ContextChunk] = []
+        remaining = self.budget
+
+        for document, similarity in sorted(
+            scored_documents, key=lambda scored: scored[1], reverse=True
+        ):
+            chunk = self._chunk(document, similarity)
+            chunk.content = self._without_overlaps(chunk, packed)
+            if not chunk.content.strip():
+                metrics.increment("context.chunks_deduplicated")
+                continue
+
+            tokens = count_tokens(chunk.render(len(packed) + 1), self.model)
+            if tokens > remaining:
+                # A shorter chunk further down the list may still fit
+                metrics.increment("context.chunks_over_budget")
+                continue
+
+            packed.append(chunk)
+            remaining -= tokens
+
+        metrics.increment("context.tokens_packed", self.budget - remaining)
+        return packed
+
+    def render(self, chunks: List[ContextChunk]) -> str:
+        return "\n\n".join(
+            chunk.render(number) for number, chunk in enumerate(chunks, start=1)
+        )
+
+    def pack_and_render(self, scored_documents: List[Tuple[Document, float]]) -> str:
+        return self.render(self.pack(scored_documents))
+
+    @staticmethod
+    def _chunk(document: Document, similarity: float) -> ContextChunk:
+        metadata = document.metadata or {}
+        return ContextChunk(
+            content=document.page_content.strip(),
+            file_name=metadata.get("file_name"),
+            file_sha1=metadata.get("file_sha1"),
+            page=metadata.get("page"),
+            similarity=similarity,
+        )
+
+    def _without_overlaps(self, chunk: ContextChunk, packed: List[ContextChunk]) -> str:
+        content = chunk.content
+        if chunk.file_sha1 is None:
+            return content
+
+        for other in packed:
+            if other.file_sha1 != chunk.file_sha1:
+                continue
+            if content in other.content:
+                return ""
+            # The end of the packed chunk starts this one, or the other way around
+            overlap = _overlap(other.content, content, self.settings.context_min_overlap)
+            if overlap:
+                content = content[overlap:].lstrip()
+            overlap = _overlap(content, other.content, self.settings.context_min_overlap)
+            if overlap:
+                content = content[:-overlap].rstrip()
+
+        return content
+
+
+def _overlap(head: str, tail: str, min_overlap: int) -> int:
+    """Length of the longest suffix of head that is a prefix of tail, if at least min_overlap."""
+    if min_overlap <= 0 or len(tail) < min_overlap:
+        return 0
+
+    anchor = tail[:min_overlap]
+    start = head.find(anchor, max(0, len(head) - len(tail)))
+    while start != -1:
+        if tail.startswith(head[start:]):
+            return len(head) - start
+        start = head.find(anchor, start + 1)
+
+    return 0
@@ -0,0 +1,168 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from langchain.chains import LLMChain
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import SystemMessage
+from llm.prompts.SUMMARIZE_HISTORY_PROMPT import SUMMARIZE_HISTORY_PROMPT
+from logger import get_logger
+from models.chat import ChatHistory
+from models.settings import HistorySettings
+from repository.chat.get_chat_by_id import aget_chat_by_id, get_chat_by_id
+from repository.chat.get_chat_history import (
+    aget_recent_chat_history,
+    get_recent_chat_history,
+    get_unsummarized_chat_history,
+)
+from repository.chat.update_chat_summary import update_chat_summary
+from utils.metrics import metrics
+from utils.tokens import count_tokens
+
+logger = get_logger(__name__)
+
+# Summaries run in the background, after the answer has been sent
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+_summarizing: set = set()
+_summarizing_lock = threading.Lock()
+
+
+@dataclass
+class HistoryWindow:
+    """The condensed summary of the older turns and the most recent turns of a chat."""
+
+    summary: Optional[str]
+    turns: List[ChatHistory]
+
+    def as_chain_history(self) -> List[Union[SystemMessage, Tuple[str, str]]]:
+        """Chat history accepted by the ConversationalRetrievalChain."""
+        history: List[Union[SystemMessage, Tuple[str, str]]] = []
+        if self.summary:
+            history.append(
+                SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")
+            )
+        history.extend((turn.user_message, turn.assistant) for turn in self.turns)
+        return history
+
+    def as_messages(self) -> List[Dict[str, str]]:
+        """Chat history as OpenAI chat messages."""
+        messages = []
+        if self.summary:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {self.summary}",
+                }
+            )
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn.user_message})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        return messages
+
+
+class ChatHistoryManager:
+    """
+    Bounds the history sent with each question: the last `history_max_turns` turns
+    that fit in `history_token_budget` with the rolling summary of the older turns,
+    which is kept in the chats table and extended in the background.
+    """
+
+    def __init__(
+        self,
+        chat_id: str,
+        openai_api_key: str,
+        model: str = "gpt-3.5-turbo",
+        settings: Optional[HistorySettings] = None,
+    ):
+        self.chat_id = chat_id
+        self.openai_api_key = openai_api_key
+        self.model = model
+        self.settings = settings or HistorySettings()
+
+    def get_window(self) -> HistoryWindow:
+        chat = get_chat_by_id(self.chat_id)
+        turns = get_recent_chat_history(
+            self.chat_id, self.settings.history_max_turns, after=chat.summarized_until
+        )
+        return self._fit(chat.history_summary, turns)
+
+    async def aget_window(self) -> HistoryWindow:
+        chat = await aget_chat_by_id(self.chat_id)
+        turns = await aget_recent_chat_history(
+            self.chat_id, self.settings.history_max_turns, after=chat.summarized_until
+        )
+        return self._fit(chat.history_summary, turns)
+
+    def _fit(self, summary: Optional[str], turns: List[ChatHistory]) -> HistoryWindow:
+        """Keep the most recent turns fitting in the token budget left by the summary."""
+        budget = self.settings.history_token_budget
+        if summary:
+            budget -= count_tokens(summary, self.model)
+
+        kept: List[ChatHistory] = []
+        for turn in reversed(turns):
+            budget -= count_tokens(turn.user_message or "", self.model) + count_tokens(
+                turn.assistant or "", self.model
+            )
+            if budget < 0:
+                break
+            kept.append(turn)
+
+        metrics.increment("history.turns_dropped", len(turns) - len(kept))
+        return HistoryWindow(summary=summary, turns=list(reversed(kept)))
+
+    def schedule_summarization(self) -> None:
+        """Fold the turns that left the window into the summary, in the background."""
+        with _summarizing_lock:
+            if self.chat_id in _summarizing:
+                return
+            _summarizing.add(self.chat_id)
+
+        _summary_executor.submit(self._summarize)
+
+    def _summarize(self) -> None:
+        try:
+            chat = get_chat_by_id(self.chat_id)
+            unsummarized = get_unsummarized_chat_history(
+                self.chat_id,
+                self.settings.history_summarize_max_turns + self.settings.history_max_turns,
+                after=chat.summarized_until,
+            )
+            to_summarize = unsummarized[
+                : len(unsummarized) - self.settings.history_max_turns
+            ]
+            if len(to_summarize) < self.settings.history_summarize_every:
+                return
+
+            with metrics.timer("history.summarize_seconds"):
+                summary = self._summary_chain().predict(
+                    summary=chat.history_summary or "",
+                    new_lines=format_turns(to_summarize),
+                )
+            update_chat_summary(
+                self.chat_id, summary.strip(), to_summarize[-1].message_time
+            )
+            metrics.increment("history.turns_summarized", len(to_summarize))
+        except Exception as e:
+            logger.error(f"Error summarizing the history of chat {self.chat_id}: {e}")
+        finally:
+            with _summarizing_lock:
+                _summarizing.discard(self.chat_id)
+
+    def _summary_chain(self) -> LLMChain:
+        return LLMChain(
+            llm=ChatOpenAI(
+                model=self.settings.history_summary_model,
+                temperature=0,
+                max_tokens=self.settings.history_summary_max_tokens,
+                openai_api_key=self.openai_api_key,
+            ),  # pyright: ignore reportPrivateUsage=none
+            prompt=SUMMARIZE_HISTORY_PROMPT,
+        )
+
+
+def format_turns(turns: List[ChatHistory]) -> str:
+    return "\n".join(
+        f"Human: {turn.user_message}\nAssistant: {turn.assistant}" for turn in turns
+    )
@@ -6,15 +6,22 @@ from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from logger import get_logger
 from middlewares.cors import add_cors_middleware
+from models.settings import close_common_dependencies, init_common_dependencies
 from routes.api_key_routes import api_key_router
 from routes.brain_routes import brain_router
 from routes.chat_routes import chat_router
 from routes.crawl_routes import crawl_router
 from routes.explore_routes import explore_router
 from routes.misc_routes import misc_router
+from routes.source_routes import source_router
 from routes.subscription_routes import subscription_router
 from routes.upload_routes import upload_router
 from routes.user_routes import user_router
+from starlette.concurrency import run_in_threadpool
+from utils.parsing import get_parsing_pool
+from utils.source_scheduler import get_source_scheduler
+from utils.splitters import warm_up
+from utils.upload_jobs import get_upload_job_queue
 
 logger = get_logger(__name__)
 
@@ -35,12 +42,26 @@ async def startup_event():
     if not os.path.exists(pypandoc.get_pandoc_path()):
         pypandoc.download_pandoc()
 
+    init_common_dependencies()
+    await run_in_threadpool(warm_up)
+    await get_upload_job_queue().start()
+    await get_source_scheduler().start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await get_source_scheduler().stop()
+    await get_upload_job_queue().stop()
+    get_parsing_pool().shutdown()
+    await close_common_dependencies()
+
 
 app.include_router(brain_router)
 app.include_router(chat_router)
 app.include_router(crawl_router)
 app.include_router(explore_router)
 app.include_router(misc_router)
+app.include_router(source_router)
 app.include_router(upload_router)
 app.include_router(user_router)
 app.include_router(api_key_router)
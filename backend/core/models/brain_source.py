@@ -0,0 +1,105 @@
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, validator
+from utils.cron import CronSchedule
+
+
+class BrainSourceType(str, Enum):
+    Crawl = "crawl"
+    Github = "github"
+
+
+class BrainSourceRunStatus(str, Enum):
+    Running = "running"
+    Done = "done"
+    Failed = "failed"
+
+
+class BrainSourceRequest(BaseModel):
+    source_type: BrainSourceType
+    url: str
+    # Cron expression, in UTC
+    schedule: str = "@daily"
+    # Crawl options, see CrawlWebsite
+    depth: int = 1
+    max_pages: int = 100
+    max_time: int = 60
+
+    @validator("schedule")
+    def validate_schedule(cls, schedule):
+        CronSchedule(schedule)
+        return schedule
+
+    @property
+    def config(self) -> dict:
+        if self.source_type == BrainSourceType.Github:
+            return {}
+        return {
+            "depth": self.depth,
+            "max_pages": self.max_pages,
+            "max_time": self.max_time,
+        }
+
+
+@dataclass
+class BrainSource:
+    source_id: str
+    brain_id: str
+    user_id: Optional[str]
+    source_type: str
+    url: str
+    schedule: str
+    config: dict = field(default_factory=dict)
+    enabled: bool = True
+    next_run_time: Optional[str] = None
+    last_run_time: Optional[str] = None
+    creation_time: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, source_dict: dict) -> "BrainSource":
+        return cls(
+            source_id=source_dict["source_id"],
+            brain_id=source_dict["brain_id"],
+            user_id=source_dict.get("user_id"),
+            source_type=source_dict["source_type"],
+            url=source_dict["url"],
+            schedule=source_dict["schedule"],
+            config=source_dict.get("config") or {},
+            enabled=source_dict.get("enabled", True),
+            next_run_time=source_dict.get("next_run_time"),
+            last_run_time=source_dict.get("last_run_time"),
+            creation_time=source_dict.get("creation_time"),
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class BrainSourceRun:
+    run_id: str
+    source_id: str
+    brain_id: str
+    status: str
+    message: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    duration_seconds: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, run_dict: dict) -> "BrainSourceRun":
+        return cls(
+            run_id=run_dict["run_id"],
+            source_id=run_dict["source_id"],
+            brain_id=run_dict["brain_id"],
+            status=run_dict["status"],
+            message=run_dict.get("message"),
+            start_time=run_dict.get("start_time"),
+            end_time=run_dict.get("end_time"),
+            duration_seconds=run_dict.get("duration_seconds"),
+        )
+
+    def to_dict(self):
+        return asdict(self)
@@ -1,13 +1,19 @@
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 
+from llm.answer_cache import invalidate_brain_answers
 from logger import get_logger
 import time
-from models.settings import BrainRateLimiting, CommonsDep, common_dependencies
+from models.settings import (
+    BrainRateLimiting,
+    CommonsDep,
+    async_supabase_client,
+    common_dependencies,
+)
 from models.users import User
 from pydantic import BaseModel
-from utils.vectors import get_unique_files_from_vector_ids
-from models.settings import BrainSettings
+from utils.metrics import metrics
+from vectorstore.ann_index import get_ann_index_registry
 
 logger = get_logger(__name__)
 
@@ -34,7 +40,7 @@ class Brain(BaseModel):
     @property
     def brain_size(self):
         self.get_unique_brain_files()
-        current_brain_size = sum(float(doc["size"]) for doc in self.files)
+        current_brain_size = sum(float(doc["size"] or 0) for doc in self.files)
 
         return current_brain_size
 
@@ -117,6 +123,43 @@ class Brain(BaseModel):
         )
         return response.data
 
+    async def aget_user_brains(self, user_id):
+        response = (
+            await async_supabase_client()
+            .from_("brains_users")
+            .select("id:brain_id, rights, brains (id: brain_id, name)")
+            .filter("user_id", "eq", str(user_id))
+            .execute()
+        )
+        user_brains = []
+        for item in response.data:
+            user_brains.append(item["brains"])
+            user_brains[-1]["rights"] = item["rights"]
+        return user_brains
+
+    async def aget_brain_for_user(self, user_id):
+        response = (
+            await async_supabase_client()
+            .from_("brains_users")
+            .select("id:brain_id, rights, brains (id: brain_id, name)")
+            .filter("user_id", "eq", str(user_id))
+            .filter("brain_id", "eq", str(self.id))
+            .execute()
+        )
+        if len(response.data) == 0:
+            return None
+        return response.data[0]
+
+    async def aget_brain_details(self):
+        response = (
+            await async_supabase_client()
+            .from_("brains")
+            .select("id:brain_id, name, *")
+            .filter("brain_id", "eq", str(self.id))
+            .execute()
+        )
+        return response.data
+
     def delete_brain(self, user_id):
         results = (
             self.commons["supabase"]
@@ -135,6 +178,8 @@ class Brain(BaseModel):
                 .match({"brain_id": self.id})
                 .execute()
             )
+            get_ann_index_registry().drop(self.id)
+            invalidate_brain_answers(self.id)
 
             results = (
                 self.commons["supabase"]
@@ -192,6 +237,44 @@ class Brain(BaseModel):
 
         return response.data
 
+    async def acreate_brain(self):
+        response = (
+            await async_supabase_client()
+            .table("brains")
+            .insert(
+                {
+                    "name": self.name,
+                    "description": self.description,
+                    "temperature": self.temperature,
+                    "model": self.model,
+                    "max_tokens": self.max_tokens,
+                    "openai_api_key": self.openai_api_key,
+                    "status": self.status,
+                }
+            )
+            .execute()
+        )
+
+        self.id = response.data[0]["brain_id"]
+        return response.data
+
+    async def acreate_brain_user(self, user_id: UUID, rights, default_brain: bool):
+        response = (
+            await async_supabase_client()
+            .table("brains_users")
+            .insert(
+                {
+                    "brain_id": str(self.id),
+                    "user_id": str(user_id),
+                    "rights": rights,
+                    "default_brain": default_brain,
+                }
+            )
+            .execute()
+        )
+
+        return response.data
+
     def set_as_default_brain_for_user(self, user: User):
         old_default_brain = get_default_user_brain(user)
 
@@ -204,6 +287,20 @@ class Brain(BaseModel):
             {"default_brain": True}
         ).match({"brain_id": self.id, "user_id": user.id}).execute()
 
+    async def aset_as_default_brain_for_user(self, user: User):
+        old_default_brain = await aget_default_user_brain(user)
+
+        if old_default_brain is not None:
+            await async_supabase_client().table("brains_users").update(
+                {"default_brain": False}
+            ).match(
+                {"brain_id": str(old_default_brain["id"]), "user_id": str(user.id)}
+            ).execute()
+
+        await async_supabase_client().table("brains_users").update(
+            {"default_brain": True}
+        ).match({"brain_id": str(self.id), "user_id": str(user.id)}).execute()
+
     def create_brain_vector(self, vector_id, file_sha1):
         response = (
             self.commons["supabase"]
@@ -217,25 +314,105 @@ class Brain(BaseModel):
             )
             .execute()
         )
+        get_ann_index_registry().add_vectors(
+            self.commons["supabase"], self.id, [vector_id]
+        )
+        invalidate_brain_answers(self.id)
         return response.data
 
     def create_brain_vectors(self, vector_ids, file_sha1):
         prepared_vector_ids = self.prepare_vector_ids(vector_ids, file_sha1)
+        # Links that already exist are kept, so a retried batch can link its vectors again
         response = (
             self.commons["supabase"]
             .table("brains_vectors")
-            .insert(prepared_vector_ids)
+            .upsert(prepared_vector_ids, ignore_duplicates=True)
             .execute()
         )
+        get_ann_index_registry().add_vectors(
+            self.commons["supabase"], self.id, vector_ids
+        )
+        invalidate_brain_answers(self.id)
         return response.data
 
+    def get_file_chunks(self, file_name: str) -> List[dict]:
+        """
+        Vector id, file sha1 and chunk sha1 of the chunks of a file in the brain,
+        whatever the version of the file they come from.
+        """
+        response = self.commons["supabase"].rpc(
+            "get_brain_file_chunks",
+            {"p_brain_id": str(self.id), "p_file_name": file_name},
+        ).execute()
+        return response.data
+
+    def relink_file_vectors(
+        self, vector_ids: List[str], metadatas: List[dict], file_sha1: str
+    ) -> List[str]:
+        """
+        Link existing vectors to a new version of their file with the metadata of
+        that version, returns the ids of the linked vectors in the same order. The
+        vectors shared with other brains are copied, so the ids may change.
+        """
+        response = self.commons["supabase"].rpc(
+            "relink_file_vectors",
+            {
+                "p_brain_id": str(self.id),
+                "p_file_sha1": file_sha1,
+                "p_vector_ids": [str(vector_id) for vector_id in vector_ids],
+                "p_metadata": metadatas,
+            },
+        ).execute()
+        relinked = {row["old_vector_id"]: row["vector_id"] for row in response.data}
+        new_vector_ids = [relinked[str(vector_id)] for vector_id in vector_ids]
+
+        # The index holds the metadata of the vectors, reload them
+        get_ann_index_registry().remove_vectors(self.id, vector_ids)
+        get_ann_index_registry().add_vectors(
+            self.commons["supabase"], self.id, new_vector_ids
+        )
+        invalidate_brain_answers(self.id)
+        return new_vector_ids
+
+    def get_existing_files(self, file_sha1s: List[str]) -> Dict[str, bool]:
+        """
+        The files of the given sha1s already stored, each with whether it is linked
+        to the brain, in a single RPC whatever the number of files.
+        """
+        if not file_sha1s:
+            return {}
+        response = self.commons["supabase"].rpc(
+            "get_existing_file_sha1s",
+            {"p_brain_id": str(self.id), "p_file_sha1s": list(file_sha1s)},
+        ).execute()
+        return {row["file_sha1"]: row["in_brain"] for row in response.data}
+
+    def link_files(self, file_sha1s: List[str]) -> List[str]:
+        """
+        Link the vectors of files already stored for other brains to the brain,
+        in a single RPC, returns the ids of the linked vectors.
+        """
+        if not file_sha1s:
+            return []
+        response = self.commons["supabase"].rpc(
+            "link_files_to_brain",
+            {"p_brain_id": str(self.id), "p_file_sha1s": list(file_sha1s)},
+        ).execute()
+        vector_ids = [row["vector_id"] for row in response.data]
+        if vector_ids:
+            get_ann_index_registry().add_vectors(
+                self.commons["supabase"], self.id, vector_ids
+            )
+            invalidate_brain_answers(self.id)
+        return vector_ids
+
     def get_vector_ids_from_file_sha1(self, file_sha1: str):
         # move to vectors class
         vectorsResponse = (
             self.commons["supabase"]
             .table("vectors")
             .select("id")
-            .filter("metadata->>file_sha1", "eq", file_sha1)
+            .filter("file_sha1", "eq", file_sha1)
             .execute()
         )
         return vectorsResponse.data
@@ -253,6 +430,19 @@ class Brain(BaseModel):
             }
         ).match({"brain_id": self.id}).execute()
 
+    async def aupdate_brain_fields(self):
+        await async_supabase_client().table("brains").update(
+            {
+                "name": self.name,
+                "description": self.description,
+                "model": self.model,
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "openai_api_key": self.openai_api_key,
+                "status": self.status,
+            }
+        ).match({"brain_id": str(self.id)}).execute()
+
     def prepare_vector_ids(self, vector_ids, file_sha1):
         prepared_data = []
         for vector_id in vector_ids:
@@ -265,155 +455,89 @@ class Brain(BaseModel):
 
     def get_unique_brain_files(self):
         """
-        Retrieve unique brain data (i.e. uploaded files and crawled websites).
+        Retrieve unique brain data (i.e. uploaded files and crawled websites)
+        from the brain_files manifest.
         """
 
         response = (
             self.commons["supabase"]
-            .from_("brains_vectors")
-            .select("vector_id")
+            .from_("brain_files")
+            .select("name:file_name, size, file_sha1, chunk_count")
             .filter("brain_id", "eq", self.id)
             .execute()
         )
 
-        vector_ids = [item["vector_id"] for item in response.data]
-
-
-        if len(vector_ids) == 0:
-            return []
-
-        self.files = get_unique_files_from_vector_ids(vector_ids)
+        self.files = response.data
 
         return self.files
 
-    def delete_file_from_brain_slow(self, file_name: str):
-        start_time = time.time()  # Record start time
-        # First, get the vector_ids associated with the file_name
-        vector_response = (
-            self.commons["supabase"]
-            .table("vectors")
-            .select("id")
-            .filter("metadata->>file_name", "eq", file_name)
-            .execute()
+    def delete_brain_vectors(self, vector_ids: List[str]) -> dict:
+        """
+        Unlink the vectors from the brain and delete the ones no other brain uses,
+        in a single RPC whatever the number of vectors.
+        """
+        start_time = time.time()
+        response = self.commons["supabase"].rpc(
+            "delete_brain_vectors",
+            {
+                "p_brain_id": str(self.id),
+                "p_vector_ids": [str(vector_id) for vector_id in vector_ids],
+            },
+        ).execute()
+        result = response.data[0]
+        get_ann_index_registry().remove_vectors(self.id, vector_ids)
+        invalidate_brain_answers(self.id)
+
+        elapsed_time = time.time() - start_time
+        metrics.observe("brain.delete_vectors_seconds", elapsed_time)
+        logger.info(
+            f"Unlinked {result['unlinked_count']} vectors from brain {self.id}, deleted {result['deleted_vectors_count']} orphaned vectors in {elapsed_time:.6f} seconds."
         )
-        total_time = 0
-        elapsed_time = time.time() - start_time  # Calculate elapsed time
-        total_time += elapsed_time
-        logger.info(f"brain vector response by file name function took {elapsed_time:.6f} seconds.")
-        
-        vector_ids = [item["id"] for item in vector_response.data]
-        logger.info(f"length of vector_ids: {len(vector_ids)}")
-
-        # For each vector_id, delete the corresponding entry from the 'brains_vectors' table
-        for index, vector_id in enumerate(vector_ids):
-            logger.info(f"brain vector: {index}")
-            vector_id_start = time.time()
-            self.commons["supabase"].table("brains_vectors").delete().filter(
-                "vector_id", "eq", vector_id
-            ).filter("brain_id", "eq", self.id).execute()
-            
-            elapsed_time = time.time() - vector_id_start  # Calculate elapsed time
-            total_time += elapsed_time
-            logger.info(f"deleting single vector id from brain_vector table function took {elapsed_time:.6f} seconds.")
-
-            # Check if the vector is still associated with any other brains
-            start = time.time()
-            associated_brains_response = (
-                self.commons["supabase"]
-                .table("brains_vectors")
-                .select("brain_id")
-                .filter("vector_id", "eq", vector_id)
-                .execute()
-            )
+        return result
 
-            elapsed_time = time.time() - start  # Calculate elapsed time
-            total_time += elapsed_time
-            logger.info(f"checking single vector id from brain_vector if other brains function took {elapsed_time:.6f} seconds.")
-
-            associated_brains = [
-                item["brain_id"] for item in associated_brains_response.data
-            ]
-
-            # If the vector is not associated with any other brains, delete it from 'vectors' table
-            if not associated_brains:
-                start = time.time()
-                self.commons["supabase"].table("vectors").delete().filter(
-                    "id", "eq", vector_id
-                ).execute()
-                elapsed_time = time.time() - start  # Calculate elapsed time
-                total_time += elapsed_time
-                logger.info(f"deleting from single vector id from vectors table took {elapsed_time:.6f} seconds.")
-        logger.info(f"Total time for one vector:  {elapsed_time:.6f} seconds.")
-        return {"message": f"File {file_name} in brain {self.id} has been deleted."}
-    
-    def delete_file_from_brain(self, file_name: str):
-        start_time = time.time()  # Record start time
-        # First, get the vector_ids associated with the file_name
-        vector_response = (
-            self.commons["supabase"]
-            .table("vectors")
-            .select("id")
-            .filter("metadata->>file_name", "eq", file_name)
-            .execute()
+    def delete_file_from_brain(self, file_name: str) -> dict:
+        """
+        Remove all the vectors of a file from the brain, in a single RPC.
+        """
+        start_time = time.time()
+        response = self.commons["supabase"].rpc(
+            "delete_file_from_brain",
+            {"p_brain_id": str(self.id), "p_file_name": file_name},
+        ).execute()
+        result = response.data[0]
+        get_ann_index_registry().remove_vectors(self.id, result["vector_ids"])
+        invalidate_brain_answers(self.id)
+
+        elapsed_time = time.time() - start_time
+        metrics.observe("brain.delete_file_seconds", elapsed_time)
+        logger.info(
+            f"Deleted file {file_name} from brain {self.id}: unlinked {result['unlinked_count']} vectors, deleted {result['deleted_vectors_count']} orphaned vectors in {elapsed_time:.6f} seconds."
         )
-        total_time = 0
-        elapsed_time = time.time() - start_time  # Calculate elapsed time
-        total_time += elapsed_time
-        logger.info(f"new brain vector response by file name function took {elapsed_time:.6f} seconds.")
-        
-        vector_ids = [str(item["id"]) for item in vector_response.data]
-        tuple_vector_ids = tuple(vector_ids)
-        # stripped_vector_ids = strip_whitespace_from_list(vector_ids)
-        logger.info(f"length of vector_ids: {len(tuple_vector_ids)}")
-        tuple_vector_ids = tuple(["aed10938-65db-4678-8438-cf7684eaefd7", "94a58004-7f19-4e79-b189-0824e55d4c8a"])
-        vector_id_start = time.time()
-        self.commons['supabase'].table('brains_vectors').delete().filter('vector_id', "in", tuple(vector_ids)).filter('brain_id', 'eq', self.id).execute()
-        # self.commons['supabase'].table('brains_vectors').delete().filter('vector_id', "in", tuple_vector_ids).execute()
-        response = bulk_delete_by_uuid(self, tuple_vector_ids, "brains_vectors")
-        print(response)
-        logger.info(f"deleting all vector ids from brain_vector table function took {time.time() - vector_id_start:.6f} seconds.")
-
-        # For each vector_id, delete the corresponding entry from the 'brains_vectors' table
-        for index, vector_id in enumerate(vector_ids):
-            logger.info(f"brain vector: {index}")
-            vector_id_start = time.time()
-            self.commons["supabase"].table("brains_vectors").delete().filter(
-                "vector_id", "eq", vector_id
-            )
-            
-            elapsed_time = time.time() - vector_id_start  # Calculate elapsed time
-            total_time += elapsed_time
-            logger.info(f"deleting single vector id from brain_vector table function took {elapsed_time:.6f} seconds.")
-
-            # Check if the vector is still associated with any other brains
-            start = time.time()
-            associated_brains_response = (
-                self.commons["supabase"]
-                .table("brains_vectors")
-                .select("brain_id")
-                .filter("vector_id", "eq", vector_id)
-                .execute()
-            )
-
-            elapsed_time = time.time() - start  # Calculate elapsed time
-            total_time += elapsed_time
-            logger.info(f"checking single vector id from brain_vector if other brains function took {elapsed_time:.6f} seconds.")
-
-            associated_brains = [
-                item["brain_id"] for item in associated_brains_response.data
-            ]
+        return {
+            "message": f"File {file_name} in brain {self.id} has been deleted.",
+            "unlinked_count": result["unlinked_count"],
+            "deleted_vectors_count": result["deleted_vectors_count"],
+        }
 
-            # If the vector is not associated with any other brains, delete it from 'vectors' table
-            if not associated_brains:
-                start = time.time()
-                self.commons["supabase"].table("vectors").delete().filter(
-                    "id", "eq", vector_id
-                ).execute()
-                elapsed_time = time.time() - start  # Calculate elapsed time
-                total_time += elapsed_time
-                logger.info(f"deleting from single vector id from vectors table took {elapsed_time:.6f} seconds.")
-        logger.info(f"Total time for one vector:  {elapsed_time:.6f} seconds.")
-        return {"message": f"File {file_name} in brain {self.id} has been deleted."}
+    def delete_stale_files(self, file_name_prefix: str, file_sha1s: List[str]) -> dict:
+        """
+        Remove the vectors of the files named with the prefix whose sha1 is not one of
+        the given ones, in a single RPC. Used to drop the previous versions and the
+        deleted files of a synced repository.
+        """
+        response = self.commons["supabase"].rpc(
+            "delete_stale_brain_files",
+            {
+                "p_brain_id": str(self.id),
+                "p_file_name_prefix": file_name_prefix,
+                "p_file_sha1s": list(file_sha1s),
+            },
+        ).execute()
+        result = response.data[0]
+        if result["vector_ids"]:
+            get_ann_index_registry().remove_vectors(self.id, result["vector_ids"])
+            invalidate_brain_answers(self.id)
+        return result
 
 
 def get_default_user_brain(user: User):
@@ -455,29 +579,39 @@ def get_default_user_brain_or_create_new(user: User) -> Brain:
         return brain
 
 
-def bulk_delete_by_uuid(self, uuids_to_delete, table):
-    import requests
-    settings = BrainSettings()
+async def aget_default_user_brain(user: User):
+    response = (
+        await async_supabase_client()
+        .from_("brains_users")
+        .select("brain_id")
+        .filter("user_id", "eq", str(user.id))
+        .filter("default_brain", "eq", True)
+        .execute()
+    )
 
-    supabase_url = settings.supabase_url
-    supabase_key = settings.supabase_service_key
+    default_brain_id = response.data[0]["brain_id"] if response.data else None
 
-    table_name = table
-    # uuids_to_delete = ["3c23f0b8-c5e3-4906-bf89-230bb87d6f87", "..."]  # Replace with your actual UUIDs
+    logger.info(f"Default Collection id: {default_brain_id}")
+
+    if default_brain_id:
+        brain_response = (
+            await async_supabase_client()
+            .from_("brains")
+            .select("id:brain_id, name, *")
+            .filter("brain_id", "eq", default_brain_id)
+            .execute()
+        )
 
-    headers = {
-        "apikey": supabase_key,
-        "Authorization": f"Bearer {supabase_key}",
-        "Content-Type": "application/json",
-    }
+        return brain_response.data[0] if brain_response.data else None
 
-    # Construct the WHERE clause
-    where_clause = "id=eq." + " or id=eq.".join(uuids_to_delete)
 
-    response = requests.delete(f"{supabase_url}/rest/v1/{table_name}?{where_clause}", headers=headers)
+async def aget_default_user_brain_or_create_new(user: User) -> Brain:
+    default_brain = await aget_default_user_brain(user)
 
-    if response.status_code == 204:
-        deleted_count = len(uuids_to_delete)
-        print(f"Deleted {deleted_count} records")
+    if default_brain:
+        return Brain.create(**default_brain)
     else:
-        print("Error:", response.text)
\ No newline at end of file
+        brain = Brain.create()
+        await brain.acreate_brain()
+        await brain.acreate_brain_user(user.id, "Owner", True)
+        return brain
@@ -7,6 +7,8 @@ class Chat:
     user_id: str
     creation_time: str
     chat_name: str
+    history_summary: str
+    summarized_until: str
 
     def __init__(self, chat_dict: dict):
         self.chat_id = chat_dict.get(
@@ -21,6 +23,12 @@ class Chat:
         self.chat_name = chat_dict.get(
             "chat_name"
         )  # pyright: ignore reportPrivateUsage=none
+        self.history_summary = chat_dict.get(
+            "history_summary"
+        )  # pyright: ignore reportPrivateUsage=none
+        self.summarized_until = chat_dict.get(
+            "summarized_until"
+        )  # pyright: ignore reportPrivateUsage=none
 
 
 @dataclass
@@ -1,7 +1,10 @@
+import json
+import os
+from datetime import date
 from typing import List, Optional, Tuple
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
 
 
 class ChatMessage(BaseModel):
@@ -16,8 +19,65 @@ class ChatMessage(BaseModel):
     chat_name: Optional[str] = None
 
 
+class SearchFilters(BaseModel):
+    """
+    Restrict the documents of the brain a question is answered from.
+    The filters are evaluated by match_vectors, or by the in-process index of the brain.
+    """
+
+    file_sha1s: Optional[List[str]] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    file_name_prefix: Optional[str] = None
+    # Extensions of the file names, with or without the leading dot
+    file_extensions: Optional[List[str]] = None
+    min_similarity: Optional[float] = Field(None, ge=-1, le=1)
+
+    @validator("file_extensions", each_item=True)
+    def normalize_extension(cls, extension: str) -> str:
+        extension = extension.lower()
+        return extension if extension.startswith(".") else f".{extension}"
+
+    def to_rpc_params(self) -> dict:
+        """Parameters of match_vectors, dates compared with the YYYYMMDD dates of the metadata."""
+        params = {
+            "p_file_sha1s": self.file_sha1s,
+            "p_date_from": self.date_from.strftime("%Y%m%d") if self.date_from else None,
+            "p_date_to": self.date_to.strftime("%Y%m%d") if self.date_to else None,
+            "p_file_name_prefix": self.file_name_prefix,
+            "p_file_extensions": self.file_extensions,
+            "p_min_similarity": self.min_similarity,
+        }
+        return {name: value for name, value in params.items() if value is not None}
+
+    def matches(self, metadata: dict) -> bool:
+        """Same filters as match_vectors, except the similarity, on the metadata of a chunk."""
+        file_name = metadata.get("file_name") or ""
+        document_date = metadata.get("date") or ""
+        params = self.to_rpc_params()
+
+        if self.file_sha1s is not None and metadata.get("file_sha1") not in self.file_sha1s:
+            return False
+        if "p_date_from" in params and document_date < params["p_date_from"]:
+            return False
+        if "p_date_to" in params and (not document_date or document_date > params["p_date_to"]):
+            return False
+        if self.file_name_prefix is not None and not file_name.startswith(self.file_name_prefix):
+            return False
+        if self.file_extensions is not None and (
+            os.path.splitext(file_name)[1].lower() not in self.file_extensions
+        ):
+            return False
+        return True
+
+    @property
+    def cache_key(self) -> str:
+        return json.dumps(self.dict(exclude_none=True), sort_keys=True, default=str)
+
+
 class ChatQuestion(BaseModel):
     model: str = "gpt-3.5-turbo-0613"
     question: str
     temperature: float = 0.0
     max_tokens: int = 1000
+    filters: Optional[SearchFilters] = None
@@ -0,0 +1,32 @@
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class CrawlState:
+    """What was fetched and stored for one crawled page of a brain."""
+
+    brain_id: str
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_sha1: Optional[str] = None
+    links: List[str] = field(default_factory=list)
+    vector_ids: List[str] = field(default_factory=list)
+    crawl_time: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, state_dict: dict) -> "CrawlState":
+        return cls(
+            brain_id=state_dict["brain_id"],
+            url=state_dict["url"],
+            etag=state_dict.get("etag"),
+            last_modified=state_dict.get("last_modified"),
+            content_sha1=state_dict.get("content_sha1"),
+            links=state_dict.get("links") or [],
+            vector_ids=state_dict.get("vector_ids") or [],
+            crawl_time=state_dict.get("crawl_time"),
+        )
+
+    def to_dict(self):
+        return asdict(self)
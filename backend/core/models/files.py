@@ -1,15 +1,18 @@
 import os
+import shutil
 import tempfile
-from typing import Any, Optional
+from typing import AsyncIterator, Optional
 from uuid import UUID
 
 from fastapi import UploadFile
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
 from logger import get_logger
 from models.brains import Brain
 from models.settings import CommonsDep, common_dependencies
 from pydantic import BaseModel
-from utils.file import compute_sha1_from_file
+from starlette.concurrency import run_in_threadpool
+from utils.file import compute_sha1_from_fileobj, get_file_path, get_file_size
+from utils.parsing import get_parsing_pool
 
 logger = get_logger(__name__)
 
@@ -22,10 +25,8 @@ class File(BaseModel):
     file_sha1: Optional[str] = ""
     vectors_ids: Optional[list] = []
     file_extension: Optional[str] = ""
-    content: Optional[Any] = None
     chunk_size: int = 500
     chunk_overlap: int = 0
-    documents: Optional[Any] = None
     _commons: Optional[CommonsDep] = None
 
     def __init__(self, **kwargs):
@@ -33,59 +34,55 @@ class File(BaseModel):
 
         if self.file:
             self.file_name = self.file.filename
-            self.file_size = (
-                self.file.file._file.tell()  # pyright: ignore reportPrivateUsage=none
-            )
+            if self.file_size is None:
+                self.file_size = get_file_size(self.file)
             self.file_extension = os.path.splitext(
                 self.file.filename  # pyright: ignore reportPrivateUsage=none
             )[-1].lower()
 
     async def compute_file_sha1(self):
         """
-        Compute the sha1 of the file using a temporary file
+        Compute the sha1 of the file by streaming it in fixed-size blocks
         """
-        with tempfile.NamedTemporaryFile(
-            delete=False,
-            suffix=self.file.filename,  # pyright: ignore reportPrivateUsage=none
-        ) as tmp_file:
-            await self.file.seek(0)  # pyright: ignore reportPrivateUsage=none
-            self.content = (
-                await self.file.read()  # pyright: ignore reportPrivateUsage=none
-            )
-            tmp_file.write(self.content)
-            tmp_file.flush()
-            self.file_sha1 = compute_sha1_from_file(tmp_file.name)
-
-        os.remove(tmp_file.name)
+        self.file_sha1 = await run_in_threadpool(
+            compute_sha1_from_fileobj,
+            self.file.file,  # pyright: ignore reportPrivateUsage=none
+        )
 
-    def compute_documents(self, loader_class):
+    async def iter_documents(self, loader_class) -> AsyncIterator[Document]:
         """
-        Compute the documents from the file
+        Load and split the file in the parsing pool, yielding the chunks in order
 
         Args:
             loader_class (class): The class of the loader to use to load the file
         """
         logger.info(f"Computing documents from file {self.file_name}")
 
-        documents = []
+        tmp_path = None
+        path = get_file_path(self.file)  # pyright: ignore reportPrivateUsage=none
+        if path is None:
+            # The parsing processes need the upload on disk
+            tmp_path = path = await run_in_threadpool(self._copy_to_temporary_file)
+
+        try:
+            async for document in get_parsing_pool().iter_documents(
+                loader_class, path, self.chunk_size, self.chunk_overlap
+            ):
+                yield document
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
+
+    def _copy_to_temporary_file(self) -> str:
         with tempfile.NamedTemporaryFile(
             delete=False,
             suffix=self.file.filename,  # pyright: ignore reportPrivateUsage=none
         ) as tmp_file:
-            tmp_file.write(self.content)  # pyright: ignore reportPrivateUsage=none
-            tmp_file.flush()
-            loader = loader_class(tmp_file.name)
-            documents = loader.load()
-
-        os.remove(tmp_file.name)
-
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
-        )
-
-        self.documents = text_splitter.split_documents(documents)
-
-        print(self.documents)
+            self.file.file.seek(0)  # pyright: ignore reportPrivateUsage=none
+            shutil.copyfileobj(
+                self.file.file, tmp_file  # pyright: ignore reportPrivateUsage=none
+            )
+        return tmp_file.name
 
     def set_file_vectors_ids(self):
         """
@@ -98,7 +95,7 @@ class File(BaseModel):
             commons["supabase"]
             .table("vectors")
             .select("id")
-            .filter("metadata->>file_sha1", "eq", self.file_sha1)
+            .filter("file_sha1", "eq", self.file_sha1)
             .execute()
         )
         self.vectors_ids = response.data
@@ -148,18 +145,19 @@ class File(BaseModel):
 
     def file_is_empty(self):
         """
-        Check if file is empty by checking if the file pointer is at the beginning of the file
+        Check if file is empty from its size
         """
-        return (
-            self.file.file._file.tell() < 1  # pyright: ignore reportPrivateUsage=none
-        )
+        return self.file_size < 1  # pyright: ignore reportPrivateUsage=none
 
     def link_file_to_brain(self, brain: Brain):
-        self.set_file_vectors_ids()
-
-        if self.vectors_ids is None:
-            return
-
-        for vector_id in self.vectors_ids:  # pyright: ignore reportPrivateUsage=none
-            brain.create_brain_vector(vector_id["id"], self.file_sha1)
+        brain.link_files([self.file_sha1])
         print(f"Successfully linked file {self.file_sha1} to brain {brain.id}")
+
+        # The linked version replaces the previous versions of the file in the brain
+        previous_vector_ids = [
+            chunk["vector_id"]
+            for chunk in brain.get_file_chunks(self.file_name)
+            if chunk["file_sha1"] != self.file_sha1
+        ]
+        if previous_vector_ids:
+            brain.delete_brain_vectors(previous_vector_ids)
@@ -1,12 +1,22 @@
-from typing import Annotated
+import asyncio
+import os
+import tempfile
+import threading
+from typing import Annotated, Dict, Optional
+from weakref import WeakKeyDictionary
 
 from fastapi import Depends
-from langchain.embeddings.openai import OpenAIEmbeddings
+from logger import get_logger
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
 from pydantic import BaseSettings
 from supabase.client import Client, create_client
+from utils.metrics import metrics
 from vectorstore.supabase import SupabaseVectorStore
 # from qdrant_client import QdrantClient
 
+logger = get_logger(__name__)
+
 
 class BrainRateLimiting(BaseSettings):
     max_brain_size: int = 52428800
@@ -22,6 +32,138 @@ class BrainSettings(BaseSettings):
     resend_email_address: str = "brain@mail.quivr.app"
     qdrant_url: str
     qdrant_api_key: str
+    # "supabase" runs match_vectors, "ann" searches the in-process index of the brain,
+    # "hybrid" fuses match_vectors with the full-text search of match_vectors_lexical
+    retrieval_backend: str = "supabase"
+
+
+class AnnIndexSettings(BaseSettings):
+    ann_index_max_brains: int = 50
+    ann_index_ttl: int = 600
+    ann_nprobe: int = 8
+    ann_min_ivf_size: int = 5000
+    ann_train_iterations: int = 10
+
+
+class HybridSearchSettings(BaseSettings):
+    # Results fetched from each side before fusion
+    hybrid_candidates: int = 20
+    # Reciprocal rank fusion constant, higher values flatten the weight of the top ranks
+    hybrid_rrf_k: int = 60
+
+
+class EmbeddingCacheSettings(BaseSettings):
+    embedding_cache_enabled: bool = True
+    embedding_cache_size: int = 10000
+    # Empty string keeps the cache in memory only
+    embedding_cache_path: str = os.path.join(tempfile.gettempdir(), "embedding_cache.sqlite3")
+
+
+class IngestionSettings(BaseSettings):
+    # Upper bound of tokens sent in one embedding request
+    embedding_batch_tokens: int = 8000
+    embedding_concurrency: int = 4
+    embedding_max_retries: int = 3
+    embedding_retry_delay: float = 1.0
+    # Re-uploads of a file only embed the chunks missing from its previous version
+    incremental_reingestion: bool = True
+
+
+class ParsingSettings(BaseSettings):
+    # Processes loading and splitting the uploaded files, 0 parses them in a thread
+    parsing_workers: int = 2
+    # Pages of a PDF loaded and split by one task
+    parsing_pdf_pages_per_task: int = 10
+
+
+class UploadJobSettings(BaseSettings):
+    upload_workers: int = 2
+    # Uploaded files wait in a subdirectory per API process until a worker picks their job
+    upload_spool_dir: str = os.path.join(tempfile.gettempdir(), "upload_jobs")
+    # Seconds between two refreshes of the update time of the jobs a process holds
+    upload_job_heartbeat_interval: int = 60
+    # Unfinished jobs not updated for this many seconds are failed on startup,
+    # the process that had them queued is gone
+    upload_job_stale_after: int = 3600
+
+
+class CrawlSettings(BaseSettings):
+    # Connections opened by one crawl, all hosts together
+    crawl_max_connections: int = 10
+    # Politeness towards each host: requests in flight and seconds between two requests
+    crawl_per_host_concurrency: int = 2
+    crawl_per_host_delay: float = 0.5
+    crawl_request_timeout: float = 10.0
+    # Larger pages are skipped
+    crawl_max_page_bytes: int = 5242880
+    # Pages fetched ahead of the ingestion
+    crawl_queue_size: int = 8
+    crawl_user_agent: str = "QuivrCrawler/1.0"
+
+
+class GithubSettings(BaseSettings):
+    # Larger files of a repository are not ingested
+    github_max_file_bytes: int = 1048576
+    github_clone_timeout: int = 300
+
+
+class SourceSyncSettings(BaseSettings):
+    source_sync_enabled: bool = True
+    # Sources synced at the same time by one API process
+    source_sync_workers: int = 2
+    # Seconds between two looks for due sources
+    source_sync_poll_interval: int = 60
+    # Each run is delayed by up to this many seconds so that sources on the same schedule spread out
+    source_sync_jitter: int = 300
+    # Seconds before a claimed source whose sync never finished is due again
+    source_sync_lease: int = 3600
+
+
+class HistorySettings(BaseSettings):
+    # Most recent turns sent verbatim with each question
+    history_max_turns: int = 10
+    # Tokens allowed for the summary and the recent turns together
+    history_token_budget: int = 2000
+    # Older turns are folded into the summary once this many have left the window
+    history_summarize_every: int = 4
+    history_summarize_max_turns: int = 50
+    history_summary_model: str = "gpt-3.5-turbo"
+    history_summary_max_tokens: int = 400
+
+
+class AnswerCacheSettings(BaseSettings):
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 1000
+    answer_cache_ttl: int = 3600
+    # Minimum cosine similarity between two questions sharing an answer
+    answer_cache_similarity: float = 0.97
+
+
+class ChainPoolSettings(BaseSettings):
+    # LLMs and chains kept for reuse across requests, least recently used evicted first
+    chain_pool_max_size: int = 200
+
+
+class QuestionPipelineSettings(BaseSettings):
+    # Embed the question and search the brain while the first completion is in flight
+    speculative_retrieval: bool = True
+    question_pipeline_workers: int = 16
+
+
+class ContextSettings(BaseSettings):
+    # Chunks fetched from the brain before packing, most similar first
+    context_candidates: int = 20
+    # Tokens of documents sent with a question, per model (JSON in the environment)
+    context_token_budgets: Dict[str, int] = {
+        "gpt-3.5-turbo": 2000,
+        "gpt-3.5-turbo-0613": 2000,
+        "gpt-3.5-turbo-16k": 8000,
+        "gpt-4": 3000,
+        "gpt-4-0613": 3000,
+    }
+    context_default_token_budget: int = 2000
+    # Overlaps shorter than this between chunks of a file are not deduplicated
+    context_min_overlap: int = 40
 
 
 class LLMSettings(BaseSettings):
@@ -29,33 +171,182 @@ class LLMSettings(BaseSettings):
     model_path: str = "./local_models/ggml-gpt4all-j-v1.3-groovy.bin"
 
 
+class CommonDependencies:
+    """
+    Process-wide container for the clients shared by every request.
+    It is created once on application startup and lives as long as the process,
+    so the Supabase HTTP session (and its keep-alive connection pool) is reused
+    instead of being rebuilt on every call to common_dependencies(). Services,
+    pooled chains and vector stores keep references to its clients.
+    """
+
+    def __init__(self, settings: BrainSettings):
+        # Imported here as the embedding cache reads its own settings from this module
+        from vectorstore.embedding_cache import get_embeddings
+
+        self.settings = settings
+        self._lock = threading.Lock()
+        # httpx async pools are bound to the event loop that opened them
+        self._async_clients: WeakKeyDictionary = WeakKeyDictionary()
+        self.embeddings = get_embeddings(settings.openai_api_key)
+        self.supabase_client: Client = create_client(
+            settings.supabase_url, settings.supabase_service_key
+        )
+
+        # qdrant_client: QdrantClient(
+        #     url=settings.qdrant_url,
+        #     api_key=settings.qdrant_api_key
+        # )
+        self.documents_vector_store = SupabaseVectorStore(
+            self.supabase_client, self.embeddings, table_name="vectors"
+        )
+        self.summaries_vector_store = SupabaseVectorStore(
+            self.supabase_client, self.embeddings, table_name="summaries"
+        )
+
+        # httpx clients are thread-safe, count every request going through the pool
+        self.session.event_hooks["request"].append(self._count_request)
+
+    @property
+    def session(self):
+        return self.supabase_client.postgrest.session
+
+    def _count_request(self, request) -> None:
+        metrics.increment("supabase.requests")
+
+    async def _acount_request(self, request) -> None:
+        metrics.increment("supabase.async_requests")
+
+    def async_supabase_client(self) -> AsyncPostgrestClient:
+        """
+        The PostgREST async client of the running event loop, created on first use.
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = AsyncPostgrestClient(
+                    self.supabase_client.rest_url,
+                    headers={
+                        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+                        "apiKey": self.settings.supabase_service_key,
+                        "Authorization": f"Bearer {self.settings.supabase_service_key}",
+                    },
+                )
+                client.session.event_hooks["request"].append(self._acount_request)
+                self._async_clients[loop] = client
+
+        return client
+
+    def as_dict(self) -> dict:
+        # A fresh dict on each call so callers can't swap shared entries for everyone
+        return {
+            "supabase": self.supabase_client,
+            # "qdrant": qdrant_client,
+            "embeddings": self.embeddings,
+            "documents_vector_store": self.documents_vector_store,
+            "summaries_vector_store": self.summaries_vector_store,
+        }
+
+    def stats(self) -> dict:
+        """
+        Connection pool statistics of the shared Supabase session
+        """
+        pool = getattr(
+            self.session._transport, "_pool", None  # pyright: ignore reportPrivateUsage=none
+        )
+        connections = list(getattr(pool, "connections", []))
+        idle_connections = [c for c in connections if c.is_idle()]
+
+        with self._lock:
+            async_clients = list(self._async_clients.values())
+        async_connections = [
+            connection
+            for client in async_clients
+            for connection in getattr(
+                getattr(
+                    client.session._transport,  # pyright: ignore reportPrivateUsage=none
+                    "_pool",
+                    None,
+                ),
+                "connections",
+                [],
+            )
+        ]
+
+        return {
+            "pool_max_connections": getattr(pool, "_max_connections", None),
+            "pool_connections": len(connections),
+            "pool_idle_connections": len(idle_connections),
+            "async_clients": len(async_clients),
+            "async_pool_connections": len(async_connections),
+            "requests_sent": metrics.get_counter("supabase.requests"),
+            "async_requests_sent": metrics.get_counter("supabase.async_requests"),
+            "dependency_calls": metrics.get_counter("dependencies.calls"),
+            "containers_created": metrics.get_counter("dependencies.created"),
+        }
+
+    async def aclose_async_clients(self) -> None:
+        with self._lock:
+            async_clients = list(self._async_clients.values())
+            self._async_clients.clear()
+        for client in async_clients:
+            try:
+                await client.aclose()
+            except RuntimeError as e:
+                # The client belongs to an event loop that is already closed
+                logger.warning(f"Could not close async Supabase client: {e}")
+
+
+_dependencies: Optional[CommonDependencies] = None
+_dependencies_lock = threading.Lock()
+
+
+def init_common_dependencies() -> CommonDependencies:
+    """
+    Create the shared dependency container if it does not exist yet.
+    Safe to call from several threads, only one container is ever created.
+    """
+    global _dependencies
+
+    if _dependencies is None:
+        with _dependencies_lock:
+            if _dependencies is None:
+                _dependencies = CommonDependencies(
+                    BrainSettings()  # pyright: ignore reportPrivateUsage=none
+                )
+                metrics.increment("dependencies.created")
+                metrics.register_collector("supabase_pool", _dependencies.stats)
+                logger.info("Shared dependencies created")
+
+    return _dependencies
+
+
+async def close_common_dependencies() -> None:
+    """
+    Close the async clients, bound to the event loop that is shutting down. The
+    Supabase session is left open: long-lived objects still hold it, and the
+    application may start again in the same process (one lifespan per test module).
+    """
+    dependencies = _dependencies
+
+    if dependencies is not None:
+        await dependencies.aclose_async_clients()
+        logger.info("Shared async clients closed")
+
+
 def common_dependencies() -> dict:
-    settings = BrainSettings()  # pyright: ignore reportPrivateUsage=none
-    embeddings = OpenAIEmbeddings(
-        openai_api_key=settings.openai_api_key
-    )  # pyright: ignore reportPrivateUsage=none
-    supabase_client: Client = create_client(
-        settings.supabase_url, settings.supabase_service_key
-    )
-
-    # qdrant_client: QdrantClient(
-    #     url=settings.qdrant_url,
-    #     api_key=settings.qdrant_api_key
-    # )
-    documents_vector_store = SupabaseVectorStore(
-        supabase_client, embeddings, table_name="vectors"
-    )
-    summaries_vector_store = SupabaseVectorStore(
-        supabase_client, embeddings, table_name="summaries"
-    )
-
-    return {
-        "supabase": supabase_client,
-        # "qdrant": qdrant_client,
-        "embeddings": embeddings,
-        "documents_vector_store": documents_vector_store,
-        "summaries_vector_store": summaries_vector_store,
-    }
+    metrics.increment("dependencies.calls")
+    return init_common_dependencies().as_dict()
+
+
+def async_supabase_client() -> AsyncPostgrestClient:
+    """
+    Async PostgREST client sharing the settings of the pooled Supabase client.
+    Must be called from a coroutine.
+    """
+    return init_common_dependencies().async_supabase_client()
 
 
 CommonsDep = Annotated[dict, Depends(common_dependencies)]
@@ -0,0 +1,50 @@
+from dataclasses import asdict, dataclass
+from enum import Enum
+
+
+class UploadJobStatus(str, Enum):
+    Pending = "pending"
+    Running = "running"
+    Done = "done"
+    Failed = "failed"
+
+
+@dataclass
+class UploadJob:
+    job_id: str
+    user_id: str
+    brain_id: str
+    file_name: str
+    status: str
+    chunks_parsed: int
+    chunks_embedded: int
+    chunks_stored: int
+    message: str
+    type: str
+    creation_time: str
+    update_time: str
+
+    def __init__(self, job_dict: dict):
+        self.job_id = job_dict.get("job_id")  # pyright: ignore reportPrivateUsage=none
+        self.user_id = job_dict.get("user_id")  # pyright: ignore reportPrivateUsage=none
+        self.brain_id = job_dict.get(
+            "brain_id"
+        )  # pyright: ignore reportPrivateUsage=none
+        self.file_name = job_dict.get(
+            "file_name"
+        )  # pyright: ignore reportPrivateUsage=none
+        self.status = job_dict.get("status")  # pyright: ignore reportPrivateUsage=none
+        self.chunks_parsed = job_dict.get("chunks_parsed", 0)
+        self.chunks_embedded = job_dict.get("chunks_embedded", 0)
+        self.chunks_stored = job_dict.get("chunks_stored", 0)
+        self.message = job_dict.get("message")  # pyright: ignore reportPrivateUsage=none
+        self.type = job_dict.get("type")  # pyright: ignore reportPrivateUsage=none
+        self.creation_time = job_dict.get(
+            "creation_time"
+        )  # pyright: ignore reportPrivateUsage=none
+        self.update_time = job_dict.get(
+            "update_time"
+        )  # pyright: ignore reportPrivateUsage=none
+
+    def to_dict(self):
+        return asdict(self)
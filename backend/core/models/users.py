@@ -2,7 +2,7 @@ from typing import Optional
 from uuid import UUID
 
 from logger import get_logger
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 from pydantic import BaseModel
 
 logger = get_logger(__name__)
@@ -81,3 +81,30 @@ class User(BaseModel):
             {"requests_count": requests_count}
         ).match({"user_id": self.id, "date": date}).execute()
         self.requests_count = requests_count
+
+    async def afetch_user_requests_count(self, date):
+        """
+        Awaitable version of fetch_user_requests_count
+        """
+        response = (
+            await async_supabase_client()
+            .from_("users")
+            .select("*")
+            .filter("user_id", "eq", str(self.id))
+            .filter("date", "eq", date)
+            .execute()
+        )
+        userItem = next(iter(response.data or []), {"requests_count": 0})
+
+        return userItem["requests_count"]
+
+    async def aincrement_user_request_count(self, date):
+        """
+        Awaitable version of increment_user_request_count
+        """
+        requests_count = await self.afetch_user_requests_count(date) + 1
+        logger.info(f"User {self.email} request count updated to {requests_count}")
+        await async_supabase_client().table("users").update(
+            {"requests_count": requests_count}
+        ).match({"user_id": str(self.id), "date": date}).execute()
+        self.requests_count = requests_count
@@ -1,20 +1,23 @@
 import os
+import shutil
 import tempfile
 import time
 
 import openai
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from models.files import File
 from models.settings import CommonsDep
-from utils.file import compute_sha1_from_content
+from starlette.concurrency import run_in_threadpool
+from utils.file import compute_sha1_from_content, get_file_path
+from utils.ingestion import EmbeddingPipeline
+from utils.splitters import get_text_splitter
 
 
 async def process_audio(
     commons: CommonsDep,  # pyright: ignore reportPrivateUsage=none
     file: File,
     enable_summarization: bool,
-    user,
+    brain_id,
     user_openai_api_key,
 ):
     temp_filename = None
@@ -29,22 +32,22 @@ async def process_audio(
 
     try:
         upload_file = file.file
-        with tempfile.NamedTemporaryFile(
-            delete=False,
-            suffix=upload_file.filename,  # pyright: ignore reportPrivateUsage=none
-        ) as tmp_file:
-            await upload_file.seek(0)  # pyright: ignore reportPrivateUsage=none
-            content = (
-                await upload_file.read()  # pyright: ignore reportPrivateUsage=none
-            )
-            tmp_file.write(content)
-            tmp_file.flush()
-            tmp_file.close()
-
-            temp_filename = tmp_file.name
+        path = get_file_path(upload_file)  # pyright: ignore reportPrivateUsage=none
+        if path is None:
+            with tempfile.NamedTemporaryFile(
+                delete=False,
+                suffix=upload_file.filename,  # pyright: ignore reportPrivateUsage=none
+            ) as tmp_file:
+                upload_file.file.seek(0)  # pyright: ignore reportPrivateUsage=none
+                shutil.copyfileobj(
+                    upload_file.file, tmp_file  # pyright: ignore reportPrivateUsage=none
+                )
+            temp_filename = path = tmp_file.name
 
-            with open(tmp_file.name, "rb") as audio_file:
-                transcript = openai.Audio.transcribe("whisper-1", audio_file)
+        with open(path, "rb") as audio_file:
+            transcript = await run_in_threadpool(
+                openai.Audio.transcribe, "whisper-1", audio_file
+            )
 
         file_sha = compute_sha1_from_content(
             transcript.text.encode("utf-8")  # pyright: ignore reportPrivateUsage=none
@@ -56,11 +59,9 @@ async def process_audio(
         chunk_size = 500
         chunk_overlap = 0
 
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=chunk_size, chunk_overlap=chunk_overlap
-        )
+        text_splitter = get_text_splitter(chunk_size, chunk_overlap)
         texts = text_splitter.split_text(
-            transcript.text.encode("utf-8")  # pyright: ignore reportPrivateUsage=none
+            transcript.text  # pyright: ignore reportPrivateUsage=none
         )
 
         docs_with_metadata = [
@@ -78,9 +79,12 @@ async def process_audio(
             for text in texts
         ]
 
-        commons.documents_vector_store.add_documents(  # pyright: ignore reportPrivateUsage=none
-            docs_with_metadata
+        pipeline = EmbeddingPipeline(
+            commons, brain_id, file_sha, user_openai_api_key
         )
+        stats = await pipeline.run(docs_with_metadata)
+
+        return stats.vector_ids
 
     finally:
         if temp_filename and os.path.exists(temp_filename):
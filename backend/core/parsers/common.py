@@ -1,11 +1,11 @@
 import time
 
 from langchain.schema import Document
-from models.brains import Brain
+from logger import get_logger
 from models.files import File
 from models.settings import CommonsDep
-from utils.vectors import Neurons
-from logger import get_logger
+from utils.file import compute_sha1_from_content
+from utils.ingestion import EmbeddingPipeline
 
 logger = get_logger(__name__)
 
@@ -18,52 +18,37 @@ async def process_file(
     brain_id,
     user_openai_api_key,
 ):
+    """
+    Split the file with the given loader and send the chunks through the
+    embedding pipeline. Returns the ids of the vectors of the file.
+    """
     dateshort = time.strftime("%Y%m%d")
 
-    file.compute_documents(loader_class)
-
-    logger.info(f"Length of vectors: {len(file.documents)}")
-
-    all_docs_with_metadata = []
-    for doc in file.documents:  # pyright: ignore reportPrivateUsage=none
-        logger.info(f"Document page : {doc.metadata['page']}")
-        start_time = time.time()
-        metadata = {
-            "file_sha1": file.file_sha1,
-            "file_size": file.file_size,
-            "file_name": file.file_name,
-            "chunk_size": file.chunk_size,
-            "chunk_overlap": file.chunk_overlap,
-            "date": dateshort,
-            "summarization": "true" if enable_summarization else "false",
-        }
-
-        doc_with_metadata = Document(page_content=doc.page_content, metadata=metadata)
-        all_docs_with_metadata.append(doc_with_metadata)
-        logger.info(f"Time to create one document: {time.time() - start_time} seconds")
-
-        # start_time = time.time()
-        
-        # logger.info(f"Time to create one neuron: {time.time() - start_time} seconds")
-
-        start_time = time.time()
-        
-        logger.info(f"Time to create one neuron vector: {time.time() - start_time} seconds")
-        
-        # add_usage(stats_db, "embedding", "audio", metadata={"file_name": file_meta_name,"file_type": ".txt", "chunk_size": chunk_size, "chunk_overlap": chunk_overlap})
-
-        # created_vector_id = created_vector[0]  # pyright: ignore reportPrivateUsage=none
-
-       
-        
-        # start_time = time.time()
-        # brain.create_brain_vector(created_vector_id, file.file_sha1)
-        # logger.info(f"Time to create one brain vector: {time.time() - start_time} seconds")
-
-    neurons = Neurons(commons=commons)
-    created_vectors = neurons.create_vectors(all_docs_with_metadata, user_openai_api_key)
-    brain = Brain(id=brain_id)
-
-    brain.create_brain_vectors(created_vectors, file.file_sha1)
-    print(created_vectors[0])
-    return
+    # Chunks are embedded as the parsing pool yields them
+    async def documents_with_metadata():
+        async for doc in file.iter_documents(loader_class):
+            metadata = {
+                "file_sha1": file.file_sha1,
+                "file_size": file.file_size,
+                "file_name": file.file_name,
+                # Matches the unchanged chunks when a new version of the file is uploaded
+                "chunk_sha1": compute_sha1_from_content(doc.page_content.encode("utf-8")),
+                "chunk_size": file.chunk_size,
+                "chunk_overlap": file.chunk_overlap,
+                "date": dateshort,
+                "summarization": "true" if enable_summarization else "false",
+            }
+            # PyMuPDFLoader numbers the pages from 0, cite them from 1
+            if isinstance(doc.metadata.get("page"), int):
+                metadata["page"] = doc.metadata["page"] + 1
+            yield Document(page_content=doc.page_content, metadata=metadata)
+
+    pipeline = EmbeddingPipeline(
+        commons, brain_id, file.file_sha1, user_openai_api_key, file.file_name
+    )
+    stats = await pipeline.run(documents_with_metadata())
+    logger.info(
+        f"Computed {stats.chunks} documents from {file.file_name} in {stats.seconds:.3f} seconds"
+    )
+
+    return stats.vector_ids
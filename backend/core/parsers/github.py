@@ -1,14 +1,322 @@
 import os
+import shutil
+import subprocess
+import tempfile
 import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
 
-from langchain.document_loaders import GitLoader
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from logger import get_logger
 from models.brains import Brain
-from models.files import File
-from models.settings import CommonsDep
+from models.settings import CommonsDep, GithubSettings
+from starlette.concurrency import run_in_threadpool
 from utils.file import compute_sha1_from_content
-from utils.vectors import Neurons
+from utils.ingestion import EmbeddingPipeline
+from utils.metrics import metrics
+from utils.splitters import get_text_splitter
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 0
+
+EXCLUDED_EXTENSIONS = {
+    ".pyc",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".ico",
+    ".svg",
+    ".pdf",
+    ".zip",
+    ".gz",
+    ".jar",
+    ".woff",
+    ".woff2",
+    ".ttf",
+    ".env",
+    ".lock",
+    ".gitignore",
+    ".gitmodules",
+    ".gitattributes",
+    ".gitkeep",
+    ".git",
+    ".json",
+}
+# Dependencies, build outputs and minified bundles are not the code of the repository
+EXCLUDED_DIRECTORIES = {".git", "node_modules", "vendor", "dist", "build", "__pycache__"}
+EXCLUDED_SUFFIXES = (".min.js", ".min.css")
+
+# Modes of the tree entries that are neither regular nor executable files
+SYMLINK_MODE = "120000"
+SUBMODULE_MODE = "160000"
+
+
+@dataclass
+class RepositoryFile:
+    path: str
+    # None when the blob was left out of the clone, as larger than the size limit
+    size: Optional[int]
+
+    @property
+    def extension(self) -> str:
+        name = os.path.basename(self.path)
+        # Dotfiles such as .gitignore are their own extension
+        return os.path.splitext(name)[1].lower() or (name.lower() if name.startswith(".") else "")
+
+
+@dataclass
+class RepositoryStats:
+    files: int = 0
+    selected: int = 0
+    ingested: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    # Chunks of the previous versions of modified files and of deleted files
+    removed: int = 0
+    bytes: int = 0
+    clone_seconds: float = 0.0
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "files": self.files,
+            "selected": self.selected,
+            "ingested": self.ingested,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+            "removed": self.removed,
+            "clone_seconds": round(self.clone_seconds, 3),
+            "seconds": round(self.seconds, 3),
+            "files_per_second": round(self.ingested / self.seconds, 2) if self.seconds else 0.0,
+            "chunks_per_second": round(self.chunks / self.seconds, 2) if self.seconds else 0.0,
+            "megabytes_per_second": round(self.bytes / 1048576 / self.seconds, 3) if self.seconds else 0.0,
+        }
+
+
+def _git(*args: str, timeout: Optional[int] = None, input: Optional[str] = None) -> str:
+    return subprocess.run(
+        ["git", *args],
+        input=input,
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        # Never wait for credentials on private repositories
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    ).stdout
+
+
+def clone_repository(
+    url: str,
+    path: str,
+    timeout: Optional[int] = None,
+    max_file_bytes: Optional[int] = None,
+) -> None:
+    """
+    Shallow clone of the last commit of the default branch, without checking out any
+    file. With a size limit, larger blobs are not downloaded at all (partial clone,
+    servers that do not support it send every blob).
+    """
+    size_filter = [f"--filter=blob:limit={max_file_bytes}"] if max_file_bytes else []
+    _git(
+        "clone",
+        "--depth",
+        "1",
+        "--single-branch",
+        "--no-checkout",
+        *size_filter,
+        "--quiet",
+        url,
+        path,
+        timeout=timeout,
+    )
+
+
+def list_repository_files(path: str) -> List[RepositoryFile]:
+    """
+    Regular files of the cloned commit with their size, read from the tree without
+    fetching the blobs left out of a partial clone.
+    """
+    entries = []
+    output = _git("-C", path, "ls-tree", "-r", "-z", "HEAD")
+    for entry in output.split("\0"):
+        if not entry:
+            continue
+        info, file_path = entry.split("\t", 1)
+        mode, object_type, object_name = info.split()
+        if object_type != "blob" or mode in (SYMLINK_MODE, SUBMODULE_MODE):
+            continue
+        entries.append((file_path, object_name))
+
+    # Missing objects are listed with a "?" instead of being fetched
+    missing = {
+        line[1:]
+        for line in _git(
+            "-C", path, "rev-list", "--objects", "--missing=print", "HEAD"
+        ).splitlines()
+        if line.startswith("?")
+    }
+    present = sorted({object_name for _, object_name in entries} - missing)
+    sizes = {}
+    if present:
+        output = _git(
+            "-C",
+            path,
+            "cat-file",
+            "--batch-check=%(objectname) %(objectsize)",
+            input="\n".join(present) + "\n",
+        )
+        for line in output.splitlines():
+            object_name, size = line.split()
+            sizes[object_name] = int(size)
+
+    return [
+        RepositoryFile(path=file_path, size=sizes.get(object_name))
+        for file_path, object_name in entries
+    ]
+
+
+def is_ingested(file: RepositoryFile, max_file_bytes: int) -> bool:
+    directories = file.path.split("/")[:-1]
+    return (
+        file.size is not None
+        and 0 < file.size <= max_file_bytes
+        and file.extension not in EXCLUDED_EXTENSIONS
+        and not file.path.lower().endswith(EXCLUDED_SUFFIXES)
+        and not EXCLUDED_DIRECTORIES.intersection(directories)
+    )
+
+
+def _sparse_checkout_pattern(path: str) -> str:
+    # Anchored literal paths: escape the wildcards and the characters git gives a meaning
+    escaped = "".join(f"\\{char}" if char in "*?[]\\!#" else char for char in path)
+    return "/" + escaped
+
+
+def sparse_checkout(
+    path: str, files: List[RepositoryFile], timeout: Optional[int] = None
+) -> None:
+    """Write only the given files of the cloned commit to the working tree."""
+    patterns = "\n".join(_sparse_checkout_pattern(file.path) for file in files) + "\n"
+    _git(
+        "-C",
+        path,
+        "sparse-checkout",
+        "set",
+        "--no-cone",
+        "--stdin",
+        input=patterns,
+        timeout=timeout,
+    )
+    _git("-C", path, "checkout", "--quiet", "HEAD", timeout=timeout)
+
+
+def read_text(path: str) -> Optional[str]:
+    """Content of a text file, None for binary files."""
+    with open(path, "rb") as repository_file:
+        content = repository_file.read()
+    if b"\0" in content:
+        return None
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def hash_files(path: str, files: List[RepositoryFile]) -> Dict[str, str]:
+    """Sha1 of the text files by path, binary and blank files are left out."""
+    sha1s = {}
+    for file in files:
+        content = read_text(os.path.join(path, file.path))
+        if content and content.strip():
+            sha1s[file.path] = compute_sha1_from_content(content.encode("utf-8"))
+    return sha1s
+
+
+def iter_repository_documents(
+    path: str,
+    repo_name: str,
+    files: List[RepositoryFile],
+    file_sha1s: Dict[str, str],
+    enable_summarization: bool,
+    stats: RepositoryStats,
+) -> Iterator[Document]:
+    """
+    Chunks of the files of the repository with a sha1, one file read and split
+    at a time. Each file keeps its own sha1 so it is deduplicated like an uploaded file.
+    """
+    text_splitter = get_text_splitter(CHUNK_SIZE, CHUNK_OVERLAP)
+    dateshort = time.strftime("%Y%m%d")
+
+    for file in files:
+        file_sha1 = file_sha1s.get(file.path)
+        if file_sha1 is None:
+            stats.skipped += 1
+            continue
+        content = read_text(os.path.join(path, file.path)) or ""
+
+        stats.ingested += 1
+        stats.bytes += file.size
+        for chunk in text_splitter.split_text(content):
+            stats.chunks += 1
+            yield Document(
+                page_content=chunk,
+                metadata={
+                    "file_sha1": file_sha1,
+                    "file_size": file.size,
+                    "file_name": f"{repo_name}/{file.path}",
+                    "chunk_sha1": compute_sha1_from_content(chunk.encode("utf-8")),
+                    "chunk_size": CHUNK_SIZE,
+                    "chunk_overlap": CHUNK_OVERLAP,
+                    "date": dateshort,
+                    "summarization": "true" if enable_summarization else "false",
+                },
+            )
+
+
+async def _iterate_in_threadpool(iterator: Iterator[Document]) -> AsyncIterator[Document]:
+    """Read and split the files off the event loop, one chunk at a time."""
+    done = object()
+    while True:
+        document = await run_in_threadpool(next, iterator, done)
+        if document is done:
+            return
+        yield document  # pyright: ignore reportPrivateUsage=none
+
+
+def repository_name(repo: str) -> str:
+    """Owner and name of the repository ("owner/name"), the prefix of its file names in the brain."""
+    # URLs, or scp-like addresses such as git@github.com:owner/name.git
+    path = urlsplit(repo).path if "://" in repo else repo.rsplit(":", 1)[-1]
+    path = path.strip("/")
+    if path.endswith(".git"):
+        path = path[: -len(".git")]
+    return "/".join(path.split("/")[-2:])
+
+
+def _link_existing_files(file_sha1s: Dict[str, str], brain_id) -> Dict[str, str]:
+    """
+    Link the files already stored for other brains to the brain, returns the
+    files that still have to be embedded.
+    """
+    brain = Brain(id=brain_id)
+    existing = brain.get_existing_files(list(set(file_sha1s.values())))
+    brain.link_files(
+        [file_sha1 for file_sha1, in_brain in existing.items() if not in_brain]
+    )
+
+    # Files with the same content are embedded once
+    missing: Dict[str, str] = {}
+    seen = set(existing)
+    for path, file_sha1 in file_sha1s.items():
+        if file_sha1 not in seen:
+            seen.add(file_sha1)
+            missing[path] = file_sha1
+    return missing
 
 
 async def process_github(
@@ -17,72 +325,81 @@ async def process_github(
     enable_summarization,
     brain_id,
     user_openai_api_key,
+    settings: Optional[GithubSettings] = None,
 ):
-    random_dir_name = os.urandom(16).hex()
-    dateshort = time.strftime("%Y%m%d")
-    loader = GitLoader(
-        clone_url=repo,
-        repo_path="/tmp/" + random_dir_name,
-    )
-    documents = loader.load()
-    os.system("rm -rf /tmp/" + random_dir_name)
+    """
+    Ingest the files of a repository: shallow clone of the last commit, files
+    filtered by path, extension and size from the tree before any is checked out,
+    sparse checkout of the selected files, then each file is read and split in
+    turn and its chunks go through the embedding pipeline in token-bounded batches.
+    """
+    settings = settings or GithubSettings()
+    stats = RepositoryStats()
+    start_time = time.perf_counter()
+    path = tempfile.mkdtemp(prefix="github_")
+    repo_name = repository_name(repo)
 
-    chunk_size = 500
-    chunk_overlap = 0
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=chunk_size, chunk_overlap=chunk_overlap
-    )
+    try:
+        clone_start_time = time.perf_counter()
+        await run_in_threadpool(
+            clone_repository,
+            repo,
+            path,
+            settings.github_clone_timeout,
+            settings.github_max_file_bytes,
+        )
+        stats.clone_seconds = time.perf_counter() - clone_start_time
 
-    documents = text_splitter.split_documents(documents)
-    print(documents[:1])
-
-    for doc in documents:
-        if doc.metadata["file_type"] in [
-            ".pyc",
-            ".png",
-            ".svg",
-            ".env",
-            ".lock",
-            ".gitignore",
-            ".gitmodules",
-            ".gitattributes",
-            ".gitkeep",
-            ".git",
-            ".json",
-        ]:
-            continue
-        metadata = {
-            "file_sha1": compute_sha1_from_content(doc.page_content.encode("utf-8")),
-            "file_size": len(doc.page_content) * 8,
-            "file_name": doc.metadata["file_name"],
-            "chunk_size": chunk_size,
-            "chunk_overlap": chunk_overlap,
-            "date": dateshort,
-            "summarization": "true" if enable_summarization else "false",
-        }
-        doc_with_metadata = Document(page_content=doc.page_content, metadata=metadata)
+        files = await run_in_threadpool(list_repository_files, path)
+        selected = [
+            file for file in files if is_ingested(file, settings.github_max_file_bytes)
+        ]
+        stats.files, stats.selected = len(files), len(selected)
+        await run_in_threadpool(
+            sparse_checkout, path, selected, settings.github_clone_timeout
+        )
 
-        file = File(
-            file_sha1=compute_sha1_from_content(doc.page_content.encode("utf-8"))
+        file_sha1s = await run_in_threadpool(hash_files, path, selected)
+        new_file_sha1s = await run_in_threadpool(
+            _link_existing_files, file_sha1s, brain_id
         )
 
-        file_exists = file.file_already_exists()
+        # Each chunk is linked under the sha1 of its file, the repository only names the logs
+        pipeline = EmbeddingPipeline(
+            commons, brain_id, repo_name, user_openai_api_key
+        )
+        documents = iter_repository_documents(
+            path, repo_name, selected, new_file_sha1s, enable_summarization, stats
+        )
+        ingestion_stats = await pipeline.run(_iterate_in_threadpool(documents))
 
-        if not file_exists:
-            print(f"Creating entry for file {file.file_sha1} in vectors...")
-            neurons = Neurons(commons=commons)
-            created_vector = neurons.create_vector(
-                doc_with_metadata, user_openai_api_key
-            )
-            print("Created vector sids ", created_vector)
-            print("Created vector for ", doc.metadata["file_name"])
+        # Files of the repository in the brain that are no longer in the tree with this content
+        removed = await run_in_threadpool(
+            Brain(id=brain_id).delete_stale_files,
+            f"{repo_name}/",
+            list(set(file_sha1s.values())),
+        )
+        stats.removed = removed["unlinked_count"]
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        stderr = getattr(e, "stderr", "") or ""
+        logger.error(f"Error cloning {repo}: {stderr.strip() or e}")
+        return {
+            "message": f"❌ {repo} could not be cloned.",
+            "type": "error",
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
 
-        file_exists_in_brain = file.file_already_exists_in_brain(brain_id)
+    stats.seconds = time.perf_counter() - start_time
+    metrics.observe("github.seconds", stats.seconds)
+    metrics.increment("github.files", stats.ingested)
+    metrics.increment("github.chunks", stats.chunks)
+    logger.info(
+        f"Ingested {repo} into brain {brain_id}: {stats.to_dict()}, embedding {ingestion_stats.to_dict()}"
+    )
 
-        if not file_exists_in_brain:
-            brain = Brain(id=brain_id)
-            file.link_file_to_brain(brain)
     return {
-        "message": f"✅ Github with {len(documents)} files has been uploaded.",
+        "message": f"✅ Github with {stats.ingested} files has been uploaded.",
         "type": "success",
+        "stats": stats.to_dict(),
     }
@@ -0,0 +1,17 @@
+from uuid import UUID
+
+from models.settings import common_dependencies
+
+
+def get_brain_files_version(brain_id: UUID) -> int:
+    """Counter bumped by the database each time files are added to or removed from the brain."""
+    commons = common_dependencies()
+
+    response = (
+        commons["supabase"]
+        .table("brains")
+        .select("files_version")
+        .filter("brain_id", "eq", str(brain_id))
+        .execute()
+    )
+    return response.data[0]["files_version"] if response.data else 0
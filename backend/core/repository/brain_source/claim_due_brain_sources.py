@@ -0,0 +1,16 @@
+from typing import List
+
+from models.brain_source import BrainSource
+from models.settings import async_supabase_client
+
+
+async def aclaim_due_brain_sources(limit: int, lease_seconds: int) -> List[BrainSource]:
+    """
+    Sources due for a sync, at most `limit`. They are not due again for
+    `lease_seconds`, unless their next run is set before.
+    """
+    response = await async_supabase_client().rpc(
+        "claim_due_brain_sources",
+        {"p_limit": limit, "p_lease_seconds": lease_seconds},
+    ).execute()
+    return [BrainSource.from_dict(row) for row in response.data]
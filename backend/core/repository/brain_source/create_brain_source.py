@@ -0,0 +1,35 @@
+from datetime import datetime
+from uuid import UUID
+
+from logger import get_logger
+from models.brain_source import BrainSource, BrainSourceRequest
+from models.settings import async_supabase_client
+
+logger = get_logger(__name__)
+
+
+async def acreate_brain_source(
+    brain_id: UUID, user_id: UUID, source: BrainSourceRequest, next_run_time: datetime
+) -> BrainSource:
+    """Record a source of the brain, or update its schedule if it is already recorded."""
+    response = (
+        await async_supabase_client()
+        .table("brain_sources")
+        .upsert(
+            {
+                "brain_id": str(brain_id),
+                "user_id": str(user_id),
+                "source_type": source.source_type.value,
+                "url": source.url,
+                "config": source.config,
+                "schedule": source.schedule,
+                "enabled": True,
+                "next_run_time": next_run_time.isoformat(),
+            },
+            on_conflict="brain_id,source_type,url",
+        )
+        .execute()
+    )
+    logger.info(f"Source {source.url} of brain {brain_id} scheduled at {source.schedule}")
+
+    return BrainSource.from_dict(response.data[0])
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from models.brain_source import BrainSource, BrainSourceRun, BrainSourceRunStatus
+from models.settings import async_supabase_client
+
+
+async def acreate_source_run(source: BrainSource) -> BrainSourceRun:
+    response = (
+        await async_supabase_client()
+        .table("brain_source_runs")
+        .insert(
+            {
+                "source_id": str(source.source_id),
+                "brain_id": str(source.brain_id),
+                "status": BrainSourceRunStatus.Running.value,
+                "start_time": datetime.utcnow().isoformat(),
+            }
+        )
+        .execute()
+    )
+    return BrainSourceRun.from_dict(response.data[0])
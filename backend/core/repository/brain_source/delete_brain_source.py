@@ -0,0 +1,14 @@
+from uuid import UUID
+
+from models.settings import async_supabase_client
+
+
+async def adelete_brain_source(brain_id: UUID, source_id: UUID) -> bool:
+    response = (
+        await async_supabase_client()
+        .table("brain_sources")
+        .delete()
+        .match({"brain_id": str(brain_id), "source_id": str(source_id)})
+        .execute()
+    )
+    return len(response.data) > 0
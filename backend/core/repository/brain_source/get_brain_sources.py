@@ -0,0 +1,18 @@
+from typing import List
+from uuid import UUID
+
+from models.brain_source import BrainSource
+from models.settings import async_supabase_client
+
+
+async def aget_brain_sources(brain_id: UUID) -> List[BrainSource]:
+    """Sources of a brain, the next to run first."""
+    response = (
+        await async_supabase_client()
+        .from_("brain_sources")
+        .select("*")
+        .filter("brain_id", "eq", str(brain_id))
+        .order("next_run_time")
+        .execute()
+    )
+    return [BrainSource.from_dict(row) for row in response.data]
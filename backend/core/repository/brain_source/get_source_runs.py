@@ -0,0 +1,19 @@
+from typing import List
+from uuid import UUID
+
+from models.brain_source import BrainSourceRun
+from models.settings import async_supabase_client
+
+
+async def aget_source_runs(brain_id: UUID, limit: int = 50) -> List[BrainSourceRun]:
+    """Most recent source runs of a brain."""
+    response = (
+        await async_supabase_client()
+        .from_("brain_source_runs")
+        .select("*")
+        .filter("brain_id", "eq", str(brain_id))
+        .order("start_time", desc=True)
+        .limit(limit)
+        .execute()
+    )
+    return [BrainSourceRun.from_dict(row) for row in response.data]
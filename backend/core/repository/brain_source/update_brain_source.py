@@ -0,0 +1,13 @@
+from uuid import UUID
+
+from models.settings import async_supabase_client
+
+
+async def aupdate_brain_source(source_id: UUID, updates: dict) -> None:
+    await (
+        async_supabase_client()
+        .table("brain_sources")
+        .update(updates)
+        .match({"source_id": str(source_id)})
+        .execute()
+    )
@@ -0,0 +1,13 @@
+from uuid import UUID
+
+from models.settings import async_supabase_client
+
+
+async def aupdate_source_run(run_id: UUID, updates: dict) -> None:
+    await (
+        async_supabase_client()
+        .table("brain_source_runs")
+        .update(updates)
+        .match({"run_id": str(run_id)})
+        .execute()
+    )
@@ -9,7 +9,12 @@ logger = get_logger(__name__)
 
 class SubscriptionInvitationService:
     def __init__(self, commons: Optional[CommonsDep] = None):
-        self.commons = common_dependencies()
+        self._commons = commons
+
+    @property
+    def commons(self) -> CommonsDep:
+        # Resolved on each call, the service is created when the routes are imported
+        return self._commons or common_dependencies()
 
     def create_subscription_invitation(self, brain_subscription: BrainSubscription):
         logger.info("Creating subscription invitation")
@@ -3,7 +3,7 @@ from uuid import UUID
 
 from logger import get_logger
 from models.chat import Chat
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 logger = get_logger(__name__)
 
@@ -31,3 +31,20 @@ def create_chat(user_id: UUID, chat_data: CreateChatProperties) -> Chat:
     logger.info(f"Insert response {insert_response.data}")
 
     return insert_response.data[0]
+
+
+async def acreate_chat(user_id: UUID, chat_data: CreateChatProperties) -> Chat:
+    # Chat is created upon the user's first question asked
+    logger.info(f"New chat entry in chats table for user {user_id}")
+
+    # Insert a new row into the chats table
+    new_chat = {
+        "user_id": str(user_id),
+        "chat_name": chat_data.name,
+    }
+    insert_response = (
+        await async_supabase_client().table("chats").insert(new_chat).execute()
+    )
+    logger.info(f"Insert response {insert_response.data}")
+
+    return insert_response.data[0]
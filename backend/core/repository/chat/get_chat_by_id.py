@@ -1,5 +1,5 @@
 from models.chat import Chat
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 
 def get_chat_by_id(chat_id: str) -> Chat:
@@ -13,3 +13,14 @@ def get_chat_by_id(chat_id: str) -> Chat:
         .execute()
     )
     return Chat(response.data[0])
+
+
+async def aget_chat_by_id(chat_id: str) -> Chat:
+    response = (
+        await async_supabase_client()
+        .from_("chats")
+        .select("*")
+        .filter("chat_id", "eq", str(chat_id))
+        .execute()
+    )
+    return Chat(response.data[0])
@@ -1,7 +1,7 @@
-from typing import List  # For type hinting
+from typing import List, Optional  # For type hinting
 
 from models.chat import ChatHistory
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 
 def get_chat_history(chat_id: str) -> List[ChatHistory]:
@@ -21,3 +21,87 @@ def get_chat_history(chat_id: str) -> List[ChatHistory]:
             ChatHistory(message)  # pyright: ignore reportPrivateUsage=none
             for message in history
         ]
+
+
+async def aget_chat_history(chat_id: str) -> List[ChatHistory]:
+    history: List[ChatHistory] = (
+        await async_supabase_client()
+        .from_("chat_history")
+        .select("*")
+        .filter("chat_id", "eq", str(chat_id))
+        .order("message_time", desc=False)  # Add the ORDER BY clause
+        .execute()
+    ).data
+    if history is None:
+        return []
+    else:
+        return [
+            ChatHistory(message)  # pyright: ignore reportPrivateUsage=none
+            for message in history
+        ]
+
+
+def get_recent_chat_history(
+    chat_id: str, limit: int, after: Optional[str] = None
+) -> List[ChatHistory]:
+    """
+    The `limit` most recent messages of the chat, sent after `after` if given,
+    in chronological order.
+    """
+    commons = common_dependencies()
+    query = (
+        commons["supabase"]
+        .from_("chat_history")
+        .select("*")
+        .filter("chat_id", "eq", str(chat_id))
+    )
+    if after:
+        query = query.filter("message_time", "gt", after)
+    history = query.order("message_time", desc=True).limit(limit).execute().data
+
+    return [
+        ChatHistory(message)  # pyright: ignore reportPrivateUsage=none
+        for message in reversed(history or [])
+    ]
+
+
+async def aget_recent_chat_history(
+    chat_id: str, limit: int, after: Optional[str] = None
+) -> List[ChatHistory]:
+    query = (
+        async_supabase_client()
+        .from_("chat_history")
+        .select("*")
+        .filter("chat_id", "eq", str(chat_id))
+    )
+    if after:
+        query = query.filter("message_time", "gt", after)
+    history = (await query.order("message_time", desc=True).limit(limit).execute()).data
+
+    return [
+        ChatHistory(message)  # pyright: ignore reportPrivateUsage=none
+        for message in reversed(history or [])
+    ]
+
+
+def get_unsummarized_chat_history(
+    chat_id: str, limit: int, after: Optional[str] = None
+) -> List[ChatHistory]:
+    """
+    The `limit` oldest messages of the chat sent after `after`, in chronological order.
+    """
+    commons = common_dependencies()
+    query = (
+        commons["supabase"]
+        .from_("chat_history")
+        .select("*")
+        .filter("chat_id", "eq", str(chat_id))
+    )
+    if after:
+        query = query.filter("message_time", "gt", after)
+    history = query.order("message_time", desc=False).limit(limit).execute().data
+
+    return [
+        ChatHistory(message)  # pyright: ignore reportPrivateUsage=none
+        for message in history or []
+    ]
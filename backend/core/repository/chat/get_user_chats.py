@@ -1,7 +1,7 @@
 from typing import List
 
 from models.chat import Chat
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 
 def get_user_chats(user_id: str) -> List[Chat]:
@@ -15,3 +15,15 @@ def get_user_chats(user_id: str) -> List[Chat]:
     )
     chats = [Chat(chat_dict) for chat_dict in response.data]
     return chats
+
+
+async def aget_user_chats(user_id: str) -> List[Chat]:
+    response = (
+        await async_supabase_client()
+        .from_("chats")
+        .select("chat_id,user_id,creation_time,chat_name")
+        .filter("user_id", "eq", str(user_id))
+        .execute()
+    )
+    chats = [Chat(chat_dict) for chat_dict in response.data]
+    return chats
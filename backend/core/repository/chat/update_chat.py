@@ -3,7 +3,7 @@ from typing import Optional
 
 from logger import get_logger
 from models.chat import Chat
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 logger = get_logger(__name__)
 
@@ -42,3 +42,29 @@ def update_chat(chat_id, chat_data: ChatUpdatableProperties) -> Chat:
     else:
         logger.info(f"No updates to apply for chat {chat_id}")
     return updated_chat  # pyright: ignore reportPrivateUsage=none
+
+
+async def aupdate_chat(chat_id, chat_data: ChatUpdatableProperties) -> Chat:
+    if not chat_id:
+        logger.error("No chat_id provided")
+        return  # pyright: ignore reportPrivateUsage=none
+
+    updates = {}
+
+    if chat_data.chat_name is not None:
+        updates["chat_name"] = chat_data.chat_name
+
+    updated_chat = None
+
+    if updates:
+        updated_chat = (
+            await async_supabase_client()
+            .table("chats")
+            .update(updates)
+            .match({"chat_id": str(chat_id)})
+            .execute()
+        ).data[0]
+        logger.info(f"Chat {chat_id} updated")
+    else:
+        logger.info(f"No updates to apply for chat {chat_id}")
+    return updated_chat  # pyright: ignore reportPrivateUsage=none
@@ -2,7 +2,7 @@ from typing import List  # For type hinting
 
 from fastapi import HTTPException
 from models.chat import ChatHistory
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 
 def update_chat_history(chat_id: str, user_message: str, assistant: str) -> ChatHistory:
@@ -24,3 +24,25 @@ def update_chat_history(chat_id: str, user_message: str, assistant: str) -> Chat
             status_code=500, detail="An exception occurred while updating chat history."
         )
     return ChatHistory(response[0])  # pyright: ignore reportPrivateUsage=none
+
+
+async def aupdate_chat_history(
+    chat_id: str, user_message: str, assistant: str
+) -> ChatHistory:
+    response: List[ChatHistory] = (
+        await async_supabase_client()
+        .table("chat_history")
+        .insert(
+            {
+                "chat_id": str(chat_id),
+                "user_message": user_message,
+                "assistant": assistant,
+            }
+        )
+        .execute()
+    ).data
+    if len(response) == 0:
+        raise HTTPException(
+            status_code=500, detail="An exception occurred while updating chat history."
+        )
+    return ChatHistory(response[0])  # pyright: ignore reportPrivateUsage=none
@@ -0,0 +1,15 @@
+from logger import get_logger
+from models.settings import common_dependencies
+
+logger = get_logger(__name__)
+
+
+def update_chat_summary(chat_id: str, history_summary: str, summarized_until: str):
+    """
+    Store the rolling summary of the messages of the chat up to `summarized_until`.
+    """
+    commons = common_dependencies()
+    commons["supabase"].table("chats").update(
+        {"history_summary": history_summary, "summarized_until": summarized_until}
+    ).match({"chat_id": str(chat_id)}).execute()
+    logger.info(f"History of chat {chat_id} summarized until {summarized_until}")
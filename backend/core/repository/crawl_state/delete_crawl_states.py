@@ -0,0 +1,17 @@
+from typing import List
+from uuid import UUID
+
+from models.settings import async_supabase_client
+
+
+async def adelete_crawl_states(brain_id: UUID, urls: List[str]) -> None:
+    if not urls:
+        return
+    await (
+        async_supabase_client()
+        .table("crawl_state")
+        .delete()
+        .filter("brain_id", "eq", str(brain_id))
+        .in_("url", urls)
+        .execute()
+    )
@@ -0,0 +1,17 @@
+from typing import Dict
+from uuid import UUID
+
+from models.crawl_state import CrawlState
+from models.settings import async_supabase_client
+
+
+async def aget_crawl_states(brain_id: UUID) -> Dict[str, CrawlState]:
+    """Crawl state of the pages of a brain, by URL."""
+    response = (
+        await async_supabase_client()
+        .from_("crawl_state")
+        .select("*")
+        .filter("brain_id", "eq", str(brain_id))
+        .execute()
+    )
+    return {row["url"]: CrawlState.from_dict(row) for row in response.data}
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from models.crawl_state import CrawlState
+from models.settings import async_supabase_client
+
+
+async def aupsert_crawl_state(state: CrawlState) -> None:
+    await (
+        async_supabase_client()
+        .table("crawl_state")
+        .upsert(
+            {
+                **state.to_dict(),
+                "brain_id": str(state.brain_id),
+                "vector_ids": [str(vector_id) for vector_id in state.vector_ids],
+                "crawl_time": datetime.utcnow().isoformat(),
+            }
+        )
+        .execute()
+    )
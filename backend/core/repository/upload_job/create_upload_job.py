@@ -0,0 +1,22 @@
+from uuid import UUID
+
+from logger import get_logger
+from models.settings import async_supabase_client
+from models.upload_job import UploadJob, UploadJobStatus
+
+logger = get_logger(__name__)
+
+
+async def acreate_upload_job(user_id: UUID, brain_id: UUID, file_name: str) -> UploadJob:
+    new_job = {
+        "user_id": str(user_id),
+        "brain_id": str(brain_id),
+        "file_name": file_name,
+        "status": UploadJobStatus.Pending.value,
+    }
+    insert_response = (
+        await async_supabase_client().table("upload_jobs").insert(new_job).execute()
+    )
+    logger.info(f"Upload job {insert_response.data[0]['job_id']} created for {file_name}")
+
+    return UploadJob(insert_response.data[0])
@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import List, Optional
+
+from models.settings import async_supabase_client
+from models.upload_job import UploadJobStatus
+
+
+async def afail_unfinished_upload_jobs(
+    message: str,
+    job_ids: Optional[List[str]] = None,
+    updated_before: Optional[datetime] = None,
+) -> List[str]:
+    """
+    Mark the pending and running jobs among the given ids, or the ones not updated
+    since the given time, as failed. Returns the ids of the failed jobs.
+    """
+    query = (
+        async_supabase_client()
+        .table("upload_jobs")
+        .update(
+            {
+                "status": UploadJobStatus.Failed.value,
+                "message": message,
+                "type": "error",
+                "update_time": datetime.utcnow().isoformat(),
+            }
+        )
+        .in_("status", [UploadJobStatus.Pending.value, UploadJobStatus.Running.value])
+    )
+    if job_ids is not None:
+        query = query.in_("job_id", [str(job_id) for job_id in job_ids])
+    if updated_before is not None:
+        query = query.lt("update_time", updated_before.isoformat())
+
+    response = await query.execute()
+    return [row["job_id"] for row in response.data]
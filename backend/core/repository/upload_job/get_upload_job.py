@@ -0,0 +1,19 @@
+from typing import Optional
+from uuid import UUID
+
+from models.settings import async_supabase_client
+from models.upload_job import UploadJob
+
+
+async def aget_upload_job(job_id: UUID) -> Optional[UploadJob]:
+    response = (
+        await async_supabase_client()
+        .from_("upload_jobs")
+        .select("*")
+        .filter("job_id", "eq", str(job_id))
+        .execute()
+    )
+    if len(response.data) == 0:
+        return None
+
+    return UploadJob(response.data[0])
@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import List
+
+from models.settings import async_supabase_client
+from models.upload_job import UploadJobStatus
+
+
+async def atouch_upload_jobs(job_ids: List[str]) -> None:
+    """
+    Refresh the update time of the pending and running jobs among the given ids,
+    so that the queue holding them is not taken for a process that is gone.
+    """
+    await (
+        async_supabase_client()
+        .table("upload_jobs")
+        .update({"update_time": datetime.utcnow().isoformat()})
+        .in_("status", [UploadJobStatus.Pending.value, UploadJobStatus.Running.value])
+        .in_("job_id", [str(job_id) for job_id in job_ids])
+        .execute()
+    )
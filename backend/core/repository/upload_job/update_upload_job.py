@@ -0,0 +1,17 @@
+from datetime import datetime
+from uuid import UUID
+
+from logger import get_logger
+from models.settings import async_supabase_client
+
+logger = get_logger(__name__)
+
+
+async def aupdate_upload_job(job_id: UUID, updates: dict) -> None:
+    await (
+        async_supabase_client()
+        .table("upload_jobs")
+        .update({**updates, "update_time": datetime.utcnow().isoformat()})
+        .match({"job_id": str(job_id)})
+        .execute()
+    )
@@ -1,6 +1,6 @@
 from uuid import UUID
 
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 
 def get_user_email_by_user_id(user_id: UUID) -> str:
@@ -11,3 +11,11 @@ def get_user_email_by_user_id(user_id: UUID) -> str:
         .execute()
     )
     return response.data[0]["email"]
+
+
+async def aget_user_email_by_user_id(user_id: UUID) -> str:
+    request = await async_supabase_client().rpc(
+        "get_user_email_by_user_id", {"user_id": str(user_id)}
+    )
+    response = await request.execute()
+    return response.data[0]["email"]
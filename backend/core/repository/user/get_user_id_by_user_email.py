@@ -1,6 +1,6 @@
 from uuid import UUID
 
-from models.settings import common_dependencies
+from models.settings import async_supabase_client, common_dependencies
 
 
 def get_user_id_by_user_email(email: str) -> UUID:
@@ -11,3 +11,11 @@ def get_user_id_by_user_email(email: str) -> UUID:
         .execute()
     )
     return response.data[0]["user_id"]
+
+
+async def aget_user_id_by_user_email(email: str) -> UUID:
+    request = await async_supabase_client().rpc(
+        "get_user_id_by_user_email", {"user_email": email}
+    )
+    response = await request.execute()
+    return response.data[0]["user_id"]
@@ -27,7 +27,7 @@ def has_brain_authorization(
         nonlocal required_roles
         if isinstance(required_roles, str):
             required_roles = [required_roles]  # Convert single role to a list
-        validate_brain_authorization(
+        await avalidate_brain_authorization(
             brain_id=brain_id, user_id=current_user.id, required_roles=required_roles
         )
 
@@ -55,6 +55,36 @@ def validate_brain_authorization(
 
     brain = Brain(id=brain_id)
     user_brain = brain.get_brain_for_user(user_id)
+    check_brain_rights(user_brain, required_roles)
+
+
+async def avalidate_brain_authorization(
+    brain_id: UUID,
+    user_id: UUID,
+    required_roles: Optional[Union[RoleEnum, List[RoleEnum]]] = RoleEnum.Owner,
+):
+    """
+    Awaitable version of validate_brain_authorization
+    """
+
+    if required_roles is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Missing required role",
+        )
+
+    brain = Brain(id=brain_id)
+    user_brain = await brain.aget_brain_for_user(user_id)
+    check_brain_rights(user_brain, required_roles)
+
+
+def check_brain_rights(
+    user_brain: Optional[dict],
+    required_roles: Union[RoleEnum, List[RoleEnum]],
+):
+    """
+    Raise if the brains_users entry is missing or doesn't hold one of the required role(s)
+    """
     if user_brain is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -5,8 +5,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from logger import get_logger
 from models.brains import (
     Brain,
-    get_default_user_brain,
-    get_default_user_brain_or_create_new,
+    aget_default_user_brain,
+    aget_default_user_brain_or_create_new,
 )
 from models.settings import BrainRateLimiting
 from models.users import User
@@ -30,7 +30,7 @@ async def brain_endpoint(current_user: User = Depends(get_current_user)):
     containing the brain ID and brain name for each brain.
     """
     brain = Brain()
-    brains = brain.get_user_brains(current_user.id)
+    brains = await brain.aget_user_brains(current_user.id)
     return {"brains": brains}
 
 
@@ -49,7 +49,7 @@ async def get_default_brain_endpoint(current_user: User = Depends(get_current_us
     The default brain is defined as the brain marked as default in the brains_users table.
     """
 
-    brain = get_default_user_brain_or_create_new(current_user)
+    brain = await aget_default_user_brain_or_create_new(current_user)
     return {"id": brain.id, "name": brain.name, "rights": "Owner"}
 
 
@@ -72,7 +72,7 @@ async def get_brain_endpoint(
     history, which includes the brain messages exchanged in the brain.
     """
     brain = Brain(id=brain_id)
-    brains = brain.get_brain_details()
+    brains = await brain.aget_brain_details()
     if len(brains) > 0:
         return {
             "id": brain_id,
@@ -101,7 +101,7 @@ async def create_brain_endpoint(
     In the brains table & in the brains_users table and put the creator user as 'Owner'
     """
 
-    user_brains = brain.get_user_brains(current_user.id)
+    user_brains = await brain.aget_user_brains(current_user.id)
     max_brain_per_user = BrainRateLimiting().max_brain_per_user
 
     if len(user_brains) >= max_brain_per_user:
@@ -110,18 +110,18 @@ async def create_brain_endpoint(
             detail=f"Maximum number of brains reached ({max_brain_per_user}).",
         )
 
-    brain.create_brain()  # pyright: ignore reportPrivateUsage=none
-    default_brain = get_default_user_brain(current_user)
+    await brain.acreate_brain()  # pyright: ignore reportPrivateUsage=none
+    default_brain = await aget_default_user_brain(current_user)
     if default_brain:
         logger.info(f"Default Collection already exists for user {current_user.id}")
-        brain.create_brain_user(  # pyright: ignore reportPrivateUsage=none
+        await brain.acreate_brain_user(  # pyright: ignore reportPrivateUsage=none
             user_id=current_user.id, rights="Owner", default_brain=False
         )
     else:
         logger.info(
             f"Default brain does not exist for user {current_user.id}. It will be created."
         )
-        brain.create_brain_user(  # pyright: ignore reportPrivateUsage=none
+        await brain.acreate_brain_user(  # pyright: ignore reportPrivateUsage=none
             user_id=current_user.id, rights="Owner", default_brain=True
         )
 
@@ -153,7 +153,7 @@ async def update_brain_endpoint(
     input_brain.id = brain_id
     print("brain", input_brain)
 
-    input_brain.update_brain_fields()
+    await input_brain.aupdate_brain_fields()
     return {"message": f"Brain {brain_id} has been updated."}
 
 
@@ -177,6 +177,6 @@ async def set_as_default_brain_endpoint(
     """
     brain = Brain(id=brain_id)
 
-    brain.set_as_default_brain_for_user(user)
+    await brain.aset_as_default_brain_for_user(user)
 
     return {"message": f"Collection {brain_id} has been set as default Collection."}
@@ -6,20 +6,21 @@ from uuid import UUID
 
 from auth import AuthBearer, get_current_user
 from fastapi import APIRouter, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from llm.openai import OpenAIBrainPicking
 from llm.openai_functions import OpenAIFunctionsBrainPicking
 from llm.private_gpt4all import PrivateGPT4AllBrainPicking
-from models.brains import get_default_user_brain_or_create_new
+from models.brains import aget_default_user_brain_or_create_new
 from models.chat import Chat, ChatHistory
 from models.chats import ChatQuestion
-from models.settings import LLMSettings, common_dependencies
+from models.settings import LLMSettings, async_supabase_client
 from models.users import User
-from repository.chat.create_chat import CreateChatProperties, create_chat
-from repository.chat.get_chat_by_id import get_chat_by_id
-from repository.chat.get_chat_history import get_chat_history
-from repository.chat.get_user_chats import get_user_chats
-from repository.chat.update_chat import ChatUpdatableProperties, update_chat
+from repository.chat.create_chat import CreateChatProperties, acreate_chat
+from repository.chat.get_chat_by_id import aget_chat_by_id
+from repository.chat.get_chat_history import aget_chat_history
+from repository.chat.get_user_chats import aget_user_chats
+from repository.chat.update_chat import ChatUpdatableProperties, aupdate_chat
 from utils.constants import (
     openai_function_compatible_models,
     streaming_compatible_models,
@@ -55,17 +56,17 @@ def get_chat_details(commons, chat_id):
     return response.data
 
 
-def delete_chat_from_db(commons, chat_id):
+async def delete_chat_from_db(chat_id):
     try:
-        commons["supabase"].table("chat_history").delete().match(
-            {"chat_id": chat_id}
+        await async_supabase_client().table("chat_history").delete().match(
+            {"chat_id": str(chat_id)}
         ).execute()
     except Exception as e:
         print(e)
         pass
     try:
-        commons["supabase"].table("chats").delete().match(
-            {"chat_id": chat_id}
+        await async_supabase_client().table("chats").delete().match(
+            {"chat_id": str(chat_id)}
         ).execute()
     except Exception as e:
         print(e)
@@ -85,14 +86,14 @@ def fetch_user_stats(commons, user, date):
     return userItem
 
 
-def check_user_limit(
+async def check_user_limit(
     user: User,
 ):
     if user.user_openai_api_key is None:
         date = time.strftime("%Y%m%d")
         max_requests_number = int(os.getenv("MAX_REQUESTS_NUMBER", 1000))
 
-        user.increment_user_request_count(date)
+        await user.aincrement_user_request_count(date)
         if int(user.requests_count) >= int(max_requests_number):
             raise HTTPException(
                 status_code=429,  # pyright: ignore reportPrivateUsage=none
@@ -114,7 +115,9 @@ async def get_chats(current_user: User = Depends(get_current_user)):
     This endpoint retrieves all the chats associated with the current authenticated user. It returns a list of chat objects
     containing the chat ID and chat name for each chat.
     """
-    chats = get_user_chats(current_user.id)  # pyright: ignore reportPrivateUsage=none
+    chats = await aget_user_chats(
+        current_user.id  # pyright: ignore reportPrivateUsage=none
+    )
     return {"chats": chats}
 
 
@@ -126,8 +129,7 @@ async def delete_chat(chat_id: UUID):
     """
     Delete a specific chat by chat ID.
     """
-    commons = common_dependencies()
-    delete_chat_from_db(commons, chat_id)
+    await delete_chat_from_db(chat_id)
     return {"message": f"{chat_id}  has been deleted."}
 
 
@@ -144,13 +146,13 @@ async def update_chat_metadata_handler(
     Update chat attributes
     """
 
-    chat = get_chat_by_id(chat_id)  # pyright: ignore reportPrivateUsage=none
+    chat = await aget_chat_by_id(chat_id)  # pyright: ignore reportPrivateUsage=none
     if current_user.id != chat.user_id:
         raise HTTPException(
             status_code=403,  # pyright: ignore reportPrivateUsage=none
             detail="You should be the owner of the chat to update it.",  # pyright: ignore reportPrivateUsage=none
         )
-    return update_chat(chat_id=chat_id, chat_data=chat_data)
+    return await aupdate_chat(chat_id=chat_id, chat_data=chat_data)
 
 
 # create new chat
@@ -163,7 +165,7 @@ async def create_chat_handler(
     Create a new chat with initial chat messages.
     """
 
-    return create_chat(user_id=current_user.id, chat_data=chat_data)
+    return await acreate_chat(user_id=current_user.id, chat_data=chat_data)
 
 
 # add new question to chat
@@ -187,11 +189,11 @@ async def create_question_handler(
 ) -> ChatHistory:
     current_user.user_openai_api_key = request.headers.get("Openai-Api-Key")
     try:
-        check_user_limit(current_user)
+        await check_user_limit(current_user)
         llm_settings = LLMSettings()
 
         if not brain_id:
-            brain_id = get_default_user_brain_or_create_new(current_user).id
+            brain_id = (await aget_default_user_brain_or_create_new(current_user)).id
 
         if llm_settings.private:
             gpt_answer_generator = PrivateGPT4AllBrainPicking(
@@ -200,6 +202,7 @@ async def create_question_handler(
                 user_openai_api_key=current_user.user_openai_api_key,
                 streaming=False,
                 model_path=llm_settings.model_path,
+                search_filters=chat_question.filters,
             )
 
         elif chat_question.model in openai_function_compatible_models:
@@ -210,6 +213,7 @@ async def create_question_handler(
                 max_tokens=chat_question.max_tokens,
                 brain_id=str(brain_id),
                 user_openai_api_key=current_user.user_openai_api_key,  # pyright: ignore reportPrivateUsage=none
+                search_filters=chat_question.filters,
             )
 
         else:
@@ -220,10 +224,13 @@ async def create_question_handler(
                 temperature=chat_question.temperature,
                 brain_id=str(brain_id),
                 user_openai_api_key=current_user.user_openai_api_key,  # pyright: ignore reportPrivateUsage=none
+                search_filters=chat_question.filters,
             )
 
-        chat_answer = gpt_answer_generator.generate_answer(  # pyright: ignore reportPrivateUsage=none
-            chat_question.question
+        # The LLM chains are blocking, keep them off the event loop
+        chat_answer = await run_in_threadpool(
+            gpt_answer_generator.generate_answer,  # pyright: ignore reportPrivateUsage=none
+            chat_question.question,
         )
 
         return chat_answer
@@ -252,7 +259,7 @@ async def create_stream_question_handler(
 ) -> StreamingResponse:
     # TODO: check if the user has access to the brain
     if not brain_id:
-        brain_id = get_default_user_brain_or_create_new(current_user).id
+        brain_id = (await aget_default_user_brain_or_create_new(current_user)).id
 
     if chat_question.model not in streaming_compatible_models:
         # Forward the request to the none streaming endpoint
@@ -260,13 +267,14 @@ async def create_stream_question_handler(
             request,
             chat_question,
             chat_id,
+            brain_id,
             current_user,  # pyright: ignore reportPrivateUsage=none
         )
 
     try:
         user_openai_api_key = request.headers.get("Openai-Api-Key")
         streaming = True
-        check_user_limit(current_user)
+        await check_user_limit(current_user)
         llm_settings = LLMSettings()
 
         if llm_settings.private:
@@ -276,6 +284,7 @@ async def create_stream_question_handler(
                 user_openai_api_key=user_openai_api_key,
                 streaming=streaming,
                 model_path=llm_settings.model_path,
+                search_filters=chat_question.filters,
             )
         else:
             gpt_answer_generator = OpenAIBrainPicking(
@@ -286,6 +295,7 @@ async def create_stream_question_handler(
                 brain_id=str(brain_id),
                 user_openai_api_key=user_openai_api_key,  # pyright: ignore reportPrivateUsage=none
                 streaming=streaming,
+                search_filters=chat_question.filters,
             )
 
         return StreamingResponse(
@@ -307,4 +317,4 @@ async def get_chat_history_handler(
     chat_id: UUID,
 ) -> List[ChatHistory]:
     # TODO: RBAC with current_user
-    return get_chat_history(chat_id)  # pyright: ignore reportPrivateUsage=none
+    return await aget_chat_history(chat_id)  # pyright: ignore reportPrivateUsage=none
@@ -1,18 +1,15 @@
 import os
-import shutil
-from tempfile import SpooledTemporaryFile
 from uuid import UUID
 
 from auth import AuthBearer, get_current_user
 from crawl.crawler import CrawlWebsite
-from fastapi import APIRouter, Depends, Query, Request, UploadFile
+from crawl.ingestion import crawl_into_brain
+from fastapi import APIRouter, Depends, Query, Request
 from models.brains import Brain
-from models.files import File
 from models.settings import common_dependencies
 from models.users import User
 from parsers.github import process_github
 from utils.file import convert_bytes
-from utils.processors import filter_file
 
 crawl_router = APIRouter()
 
@@ -49,27 +46,12 @@ async def crawl_endpoint(
         }
     else:
         if not crawl_website.checkGithub():
-            (
-                file_path,
-                file_name,
-            ) = crawl_website.process()  # pyright: ignore reportPrivateUsage=none
-            # Create a SpooledTemporaryFile from the file_path
-            spooled_file = SpooledTemporaryFile()
-            with open(file_path, "rb") as f:
-                shutil.copyfileobj(f, spooled_file)
-
-            # Pass the SpooledTemporaryFile to UploadFile
-            uploadFile = UploadFile(
-                file=spooled_file,  # pyright: ignore reportPrivateUsage=none
-                filename=file_name,
-            )
-            file = File(file=uploadFile)
             #  check remaining free space here !!
-            message = await filter_file(
+            message = await crawl_into_brain(
                 commons,
-                file,
-                enable_summarization,
+                crawl_website,
                 brain.id,
+                enable_summarization,
                 openai_api_key=request.headers.get("Openai-Api-Key", None),
             )
             return message
@@ -28,7 +28,7 @@ async def explore_endpoint(
     brain = Brain(id=brain_id)
     unique_data = brain.get_unique_brain_files()
 
-    unique_data.sort(key=lambda x: int(x["size"]), reverse=True)
+    unique_data.sort(key=lambda x: int(x["size"] or 0), reverse=True)
     return {"documents": unique_data}
 
 
@@ -55,12 +55,14 @@ async def delete_endpoint(
     # Log the authorization information
     logger.info(f"brain retrieval function took {elapsed_time:.6f} seconds.")
 
-    brain.delete_file_from_brain(file_name)
+    deletion = brain.delete_file_from_brain(file_name)
     elapsed_time = time.time() - start_time  # Calculate elapsed time
     logger.info(f"brain delete function took {elapsed_time:.6f} seconds.")
 
     return {
-        "message": f"{file_name} of brain {brain_id} has been deleted by user {current_user.email}."
+        "message": f"{file_name} of brain {brain_id} has been deleted by user {current_user.email}.",
+        "unlinked_count": deletion["unlinked_count"],
+        "deleted_vectors_count": deletion["deleted_vectors_count"],
     }
 
 
@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from auth import AuthBearer
+from fastapi import APIRouter, Depends
+from utils.metrics import metrics
 
 misc_router = APIRouter()
 
@@ -9,3 +11,11 @@ async def root():
     Root endpoint to check the status of the API.
     """
     return {"status": "OK"}
+
+
+@misc_router.get("/metrics", dependencies=[Depends(AuthBearer())], tags=["Misc"])
+async def metrics_endpoint():
+    """
+    Process metrics: counters, latency summaries, connection pool and cache statistics.
+    """
+    return metrics.snapshot()
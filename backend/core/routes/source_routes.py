@@ -0,0 +1,83 @@
+from uuid import UUID
+
+from auth import AuthBearer, get_current_user
+from fastapi import APIRouter, Depends, HTTPException
+from models.brain_source import BrainSourceRequest
+from models.settings import SourceSyncSettings
+from models.users import User
+from repository.brain_source.create_brain_source import acreate_brain_source
+from repository.brain_source.delete_brain_source import adelete_brain_source
+from repository.brain_source.get_brain_sources import aget_brain_sources
+from repository.brain_source.get_source_runs import aget_source_runs
+from routes.authorizations.brain_authorization import RoleEnum, has_brain_authorization
+from utils.source_scheduler import next_run_time
+
+source_router = APIRouter()
+
+
+@source_router.post(
+    "/brains/{brain_id}/sources",
+    dependencies=[
+        Depends(AuthBearer()),
+        Depends(has_brain_authorization([RoleEnum.Editor, RoleEnum.Owner])),
+    ],
+    tags=["Sources"],
+)
+async def create_source_endpoint(
+    brain_id: UUID,
+    source: BrainSourceRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Re-sync a website or a GitHub repository into the brain on a schedule.
+
+    - `source_type`: `crawl` or `github`.
+    - `schedule`: cron expression in UTC (`0 3 * * *`) or `@hourly`, `@daily`, `@weekly`, `@monthly`.
+    - `depth`, `max_pages`, `max_time`: crawl options of the websites.
+
+    Recording the same URL again updates its schedule.
+    """
+    brain_source = await acreate_brain_source(
+        brain_id,
+        current_user.id,
+        source,
+        next_run_time(source.schedule, SourceSyncSettings().source_sync_jitter),
+    )
+    return brain_source.to_dict()
+
+
+@source_router.get(
+    "/brains/{brain_id}/sources",
+    dependencies=[Depends(AuthBearer()), Depends(has_brain_authorization())],
+    tags=["Sources"],
+)
+async def get_sources_endpoint(brain_id: UUID):
+    """
+    Retrieve the scheduled sources of the brain and their latest runs.
+
+    - Returns the `sources`, the next to run first with their `next_run_time`, and the 50 most
+      recent `runs` with their status, message and duration.
+    """
+    sources = await aget_brain_sources(brain_id)
+    runs = await aget_source_runs(brain_id)
+    return {
+        "sources": [source.to_dict() for source in sources],
+        "runs": [run.to_dict() for run in runs],
+    }
+
+
+@source_router.delete(
+    "/brains/{brain_id}/sources/{source_id}",
+    dependencies=[
+        Depends(AuthBearer()),
+        Depends(has_brain_authorization([RoleEnum.Editor, RoleEnum.Owner])),
+    ],
+    tags=["Sources"],
+)
+async def delete_source_endpoint(brain_id: UUID, source_id: UUID):
+    """
+    Stop re-syncing a source. What it brought in the brain stays there.
+    """
+    if not await adelete_brain_source(brain_id, source_id):
+        raise HTTPException(status_code=404, detail="Source not found")
+    return {"message": f"Source {source_id} of brain {brain_id} has been deleted."}
@@ -2,13 +2,13 @@ import os
 from uuid import UUID
 
 from auth import AuthBearer, get_current_user
-from fastapi import APIRouter, Depends, Query, Request, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile
 from models.brains import Brain
-from models.files import File
-from models.settings import common_dependencies
 from models.users import User
+from repository.upload_job.create_upload_job import acreate_upload_job
+from repository.upload_job.get_upload_job import aget_upload_job
 from utils.file import convert_bytes, get_file_size
-from utils.processors import filter_file
+from utils.upload_jobs import get_upload_job_queue
 
 from logger import get_logger
 import time
@@ -43,11 +43,12 @@ async def upload_file(
     - `file`: The file to be uploaded.
     - `enable_summarization`: Flag to enable summarization of the file's content.
     - `current_user`: The current authenticated user.
-    - Returns the response message indicating the success or failure of the upload.
+    - Returns the response message indicating whether the upload was accepted, with the `job_id` processing it.
 
     This endpoint allows users to upload files to their storage (brain). It checks the remaining free space in the user's storage (brain)
     and ensures that the file size does not exceed the maximum capacity. If the file is within the allowed size limit,
-    it can optionally apply summarization to the file's content. The response message will indicate the status of the upload.
+    it is queued for processing and can optionally apply summarization to the file's content.
+    The progress of the processing is available at `/upload/jobs/{job_id}`.
     """
 
     start_time = time.time()  # Record start time
@@ -67,8 +68,6 @@ async def upload_file(
     # Log the authorization information
     logger.info(f"brain retrieval function took {elapsed_time:.6f} seconds.")
 
-    commons = common_dependencies()
-
     if request.headers.get("Openai-Api-Key"):
         brain.max_brain_size = int(os.getenv("MAX_BRAIN_SIZE_WITH_KEY", 209715200))
 
@@ -76,23 +75,56 @@ async def upload_file(
 
     file_size = get_file_size(uploadFile)
 
-    file = File(file=uploadFile)
     if remaining_free_space - file_size < 0:
         message = {
             "message": f"❌ User's brain will exceed maximum capacity with this upload. Maximum file allowed is : {convert_bytes(remaining_free_space)}",
             "type": "error",
         }
+    elif file_size < 1:
+        message = {
+            "message": f"❌ {uploadFile.filename} is empty.",
+            "type": "error",
+        }
     else:
-        message = await filter_file(
-            commons,
-            file,
+        job = await acreate_upload_job(
+            current_user.id, brain_id, uploadFile.filename  # pyright: ignore reportPrivateUsage=none
+        )
+        await get_upload_job_queue().submit(
+            job,
+            uploadFile,
             enable_summarization,
-            brain_id=brain_id,
             openai_api_key=request.headers.get("Openai-Api-Key", None),
         )
+        message = {
+            "message": f"⏳ {uploadFile.filename} is being processed in brain {brain_id}.",
+            "type": "success",
+            "job_id": job.job_id,
+        }
     end_time = time.time()  # Record end time
     elapsed_time = end_time - start_time  # Calculate elapsed time
     # Log the authorization information
     logger.info(f"file upload function took {elapsed_time:.6f} seconds.")
 
     return message
+
+
+@upload_router.get(
+    "/upload/jobs/{job_id}", dependencies=[Depends(AuthBearer())], tags=["Upload"]
+)
+async def get_upload_job_endpoint(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Retrieve the status and progress of an upload job.
+
+    - `job_id`: The ID of the job returned by the upload.
+    - Returns the job status (pending, running, done or failed), the number of chunks parsed, embedded
+      and stored so far, and the final message once the job is over.
+    """
+    job = await aget_upload_job(job_id)
+
+    if job is None or str(job.user_id) != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Upload job not found")
+
+    return job.to_dict()
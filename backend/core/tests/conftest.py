@@ -1,13 +1,23 @@
 import os
+from functools import lru_cache
 
 import pytest
+import tiktoken
 from fastapi.testclient import TestClient
 from main import app
 
+# Pre-tokenization pattern of the gpt2 encoding
+GPT2_PATTERN = r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+
+# A few merges on top of the bytes, so that words and bytes count differently
+MERGES = [b"th", b"he", b"the", b" t", b" th", b" the", b"in", b"ing", b"an", b"and", b" and", b"  "]
+
 
 @pytest.fixture(scope="module")
 def client():
-    return TestClient(app)
+    # Run the startup events so that the upload workers are running
+    with TestClient(app) as client:
+        yield client
 
 
 @pytest.fixture(scope="module")
@@ -18,3 +28,40 @@ def api_key():
             "CI_TEST_API_KEY environment variable not set. Cannot run tests."
         )
     return API_KEY
+
+
+@lru_cache(maxsize=None)
+def offline_encoding() -> tiktoken.Encoding:
+    """A small byte-level BPE encoding, built locally as the real ones are downloaded."""
+    ranks = {bytes([byte]): byte for byte in range(256)}
+    for merge in MERGES:
+        ranks[merge] = len(ranks)
+    return tiktoken.Encoding(
+        "offline",
+        pat_str=GPT2_PATTERN,
+        mergeable_ranks=ranks,
+        # tiktoken expects at least one special token
+        special_tokens={"<|endoftext|>": len(ranks)},
+    )
+
+
+def _clear_caches() -> None:
+    from utils import splitters, tokens
+
+    for cached in (tokens.get_encoding, splitters.get_token_length_function, splitters.get_text_splitter):
+        cached.cache_clear()
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    """Serve every encoding and model from the offline encoding, with fresh caches."""
+    from utils import splitters
+
+    encoding = offline_encoding()
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: encoding)
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: encoding)
+    # Batch every split, so that the batched and the single measures both run
+    monkeypatch.setattr(splitters, "MIN_BATCH_SIZE", 1)
+    _clear_caches()
+    yield encoding
+    _clear_caches()
@@ -0,0 +1,65 @@
+import numpy as np
+from langchain.docstore.document import Document
+from models.chats import SearchFilters
+from models.settings import AnnIndexSettings
+from vectorstore.ann_index import BrainVectorIndex
+
+
+def row(vector_id, vector, **metadata):
+    return (vector_id, np.asarray(vector, dtype=np.float32), Document(page_content=vector_id, metadata=metadata))
+
+
+def search(index, query, k=10, filters=None):
+    return [
+        document.page_content
+        for document, _ in index.search(np.asarray(query, dtype=np.float32), k, filters)
+    ]
+
+
+def test_search_orders_by_cosine_similarity():
+    index = BrainVectorIndex(AnnIndexSettings())
+    index.add([row("a", [1, 0]), row("b", [1, 1]), row("c", [0, 1])])
+
+    assert search(index, [1, 0.1]) == ["a", "b", "c"]
+    assert search(index, [1, 0.1], k=1) == ["a"]
+
+
+def test_remove_then_add_revives_the_rows():
+    index = BrainVectorIndex(AnnIndexSettings())
+    index.add([row("a", [1, 0]), row("b", [0, 1]), row("c", [1, 1])])
+    # Enough rows for the removed one to stay as a tombstone rather than be compacted away
+    index.add([row(f"d{position}", [-1, -position]) for position in range(3)])
+
+    index.remove(["a"])
+    assert index._positions["a"] == 0
+    assert search(index, [1, 0], k=2) == ["c", "b"]
+
+    # Relinked with new metadata, as when an unchanged chunk moves to a new version
+    index.add([row("a", [1, 0], file_sha1="new")])
+    assert len(index) == 6
+    assert search(index, [1, 0], k=3) == ["a", "c", "b"]
+    assert search(index, [1, 0], filters=SearchFilters(file_sha1s=["new"])) == ["a"]
+
+
+def test_add_is_idempotent():
+    index = BrainVectorIndex(AnnIndexSettings())
+    index.add([row("a", [1, 0]), row("a", [1, 0])])
+    index.add([row("a", [1, 0])])
+
+    assert len(index) == 1
+    assert search(index, [1, 0]) == ["a"]
+
+
+def test_ivf_index_finds_the_nearest_rows():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(400, 16)).astype(np.float32)
+    index = BrainVectorIndex(AnnIndexSettings(ann_min_ivf_size=100, ann_nprobe=20))
+    index.add([row(str(position), vector) for position, vector in enumerate(vectors)])
+
+    assert index._centroids is not None
+    assert search(index, vectors[42], k=1) == ["42"]
+
+    index.remove(["42"])
+    assert "42" not in search(index, vectors[42], k=5)
+    index.add([row("42", vectors[42])])
+    assert search(index, vectors[42], k=1) == ["42"]
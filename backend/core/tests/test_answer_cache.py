@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import pytest
+from llm import answer_cache
+from llm.answer_cache import AnswerCache
+from models.settings import AnswerCacheSettings
+
+NAMESPACE = ("brain", 0, "gpt-3.5-turbo", 0.0, 256, "")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(answer_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def cache(**settings):
+    return AnswerCache(AnswerCacheSettings(**{"answer_cache_similarity": 0.95, **settings}))
+
+
+def answer(entry):
+    return entry.answer if entry else None
+
+
+def test_similar_questions_share_the_answer(clock):
+    answers = cache()
+    answers.set(NAMESPACE, "What is it?", [1.0, 0.0, 0.1], "It is")
+
+    assert answer(answers.get(NAMESPACE, [2.0, 0.0, 0.21])) == "It is"
+    assert answer(answers.get(NAMESPACE, [0.0, 1.0, 0.0])) is None
+    # Same question for another brain or other generation parameters
+    assert answer(answers.get(("other",) + NAMESPACE[1:], [1.0, 0.0, 0.1])) is None
+    assert answer(answers.get(NAMESPACE[:4] + (512, ""), [1.0, 0.0, 0.1])) is None
+    # Same question once files were added to or deleted from the brain
+    assert answer(answers.get(("brain", 1) + NAMESPACE[2:], [1.0, 0.0, 0.1])) is None
+
+
+def test_entries_expire(clock):
+    answers = cache(answer_cache_ttl=60)
+    answers.set(NAMESPACE, "q", [1.0, 0.0], "a")
+
+    clock.now += 60
+    assert answer(answers.get(NAMESPACE, [1.0, 0.0])) == "a"
+    clock.now += 1
+    assert answer(answers.get(NAMESPACE, [1.0, 0.0])) is None
+    assert answers.stats()["size"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    answers = cache(answer_cache_max_entries=2)
+    answers.set(NAMESPACE, "a", [1.0, 0.0, 0.0], "a")
+    answers.set(NAMESPACE, "b", [0.0, 1.0, 0.0], "b")
+    answers.get(NAMESPACE, [1.0, 0.0, 0.0])
+    answers.set(NAMESPACE, "c", [0.0, 0.0, 1.0], "c")
+
+    assert answer(answers.get(NAMESPACE, [1.0, 0.0, 0.0])) == "a"
+    assert answer(answers.get(NAMESPACE, [0.0, 1.0, 0.0])) is None
+    assert answer(answers.get(NAMESPACE, [0.0, 0.0, 1.0])) == "c"
+
+
+def test_invalidate_brain(clock):
+    answers = cache()
+    other = ("other",) + NAMESPACE[1:]
+    answers.set(NAMESPACE, "q", [1.0, 0.0], "a")
+    answers.set(NAMESPACE[:4] + (512, ""), "q", [1.0, 0.0], "a")
+    answers.set(other, "q", [1.0, 0.0], "kept")
+
+    answers.invalidate_brain("brain")
+
+    assert answer(answers.get(NAMESPACE, [1.0, 0.0])) is None
+    assert answer(answers.get(NAMESPACE[:4] + (512, ""), [1.0, 0.0])) is None
+    assert answer(answers.get(other, [1.0, 0.0])) == "kept"
@@ -0,0 +1,28 @@
+from llm.chain_factory import ChainFactory
+from models.settings import ChainPoolSettings
+
+
+def test_instances_are_built_once_per_key():
+    factory = ChainFactory()
+    built = []
+
+    def create():
+        built.append(object())
+        return built[-1]
+
+    first = factory.get_or_create(("gpt-3.5-turbo", 0.0), create)
+    assert factory.get_or_create(("gpt-3.5-turbo", 0.0), create) is first
+    assert factory.get_or_create(("gpt-4", 0.0), create) is not first
+    assert len(built) == 2
+
+
+def test_least_recently_used_instances_are_evicted():
+    factory = ChainFactory(ChainPoolSettings(chain_pool_max_size=2))
+    factory.get_or_create("a", lambda: "a")
+    factory.get_or_create("b", lambda: "b")
+    factory.get_or_create("a", lambda: "rebuilt")
+    factory.get_or_create("c", lambda: "c")
+
+    assert factory.get_or_create("a", lambda: "rebuilt") == "a"
+    assert factory.get_or_create("b", lambda: "rebuilt") == "rebuilt"
+    assert factory.stats()["size"] == 2
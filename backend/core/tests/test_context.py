@@ -0,0 +1,65 @@
+from langchain.docstore.document import Document
+from llm.utils.context import ContextPacker, _overlap
+from models.settings import ContextSettings
+
+MIN_OVERLAP = 10
+SHARED = "the text shared by both chunks of the file"
+
+
+def packer(budget=2000):
+    return ContextPacker(
+        "gpt-3.5-turbo",
+        ContextSettings(
+            context_token_budgets={}, context_default_token_budget=budget, context_min_overlap=MIN_OVERLAP
+        ),
+    )
+
+
+def document(content, file_sha1="file", **metadata):
+    return Document(page_content=content, metadata={"file_sha1": file_sha1, "file_name": "file.pdf", **metadata})
+
+
+def test_overlap():
+    assert _overlap("first part " + SHARED, SHARED + " second part", MIN_OVERLAP) == len(SHARED)
+    # Shorter than the minimum overlap
+    assert _overlap("first part", "part two", MIN_OVERLAP) == 0
+    assert _overlap("abc", "xyz", MIN_OVERLAP) == 0
+    assert _overlap("first part " + SHARED, SHARED, 0) == 0
+
+
+def test_overlaps_are_sent_once(offline_tiktoken):
+    chunks = packer().pack(
+        [
+            (document("first part " + SHARED), 0.9),
+            (document(SHARED + " second part"), 0.8),
+            # Before the first chunk: its end is trimmed
+            (document("zeroth part " + "first part"), 0.7),
+            # Contained in a packed chunk
+            (document(SHARED), 0.6),
+            # Same text in another file
+            (document(SHARED + " second part", file_sha1="other"), 0.5),
+        ]
+    )
+
+    assert [chunk.content for chunk in chunks] == [
+        "first part " + SHARED,
+        "second part",
+        "zeroth part",
+        SHARED + " second part",
+    ]
+
+
+def test_chunks_fill_the_budget_by_similarity(offline_tiktoken):
+    long_chunk = document("many words " * 50, file_sha1="a")
+    short_chunk = document("a few words", file_sha1="b")
+    best_chunk = document("the best chunk", file_sha1="c", page=3)
+
+    budget = len(offline_tiktoken.encode_ordinary("[1] file.pdf, p. 3\nthe best chunk")) + len(
+        offline_tiktoken.encode_ordinary("[2] file.pdf\na few words")
+    )
+
+    chunks = packer(budget).pack([(long_chunk, 0.8), (short_chunk, 0.5), (best_chunk, 0.9)])
+
+    # The long chunk does not fit, the short one after it still does
+    assert [chunk.content for chunk in chunks] == ["the best chunk", "a few words"]
+    assert packer().render(chunks).startswith("[1] file.pdf, p. 3\nthe best chunk\n\n[2] file.pdf\n")
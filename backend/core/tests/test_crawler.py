@@ -0,0 +1,177 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager, suppress
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from crawl.crawler import Crawler, CrawlWebsite, normalize_url
+from models.crawl_state import CrawlState
+from models.settings import CrawlSettings
+
+SITE = {
+    "index.html": '<a href="a.html">A</a> <a href="b.html#top">B</a> <a href="http://example.com/">out</a>',
+    # Same content as the index under another URL
+    "home.html": '<a href="a.html">A</a> <a href="b.html#top">B</a> <a href="http://example.com/">out</a>',
+    "a.html": '<a href="c.html">C</a> <a href="./b.html">B</a> <a href="home.html">Home</a>',
+    "b.html": '<a href="/a.html?">A</a> <p>B</p>',
+    "c.html": "<p>C</p>",
+    "notes.txt": "Not a page",
+}
+
+
+# Status codes answered instead of the files, by path
+STATUSES = {}
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in STATUSES:
+            self.send_error(STATUSES[self.path])
+            return
+        if self.path.startswith("/slow"):
+            time.sleep(2)
+        super().do_GET()
+
+    def copyfile(self, source, outputfile):
+        # The crawler hangs up on the pages it no longer waits for
+        with suppress(ConnectionError):
+            super().copyfile(source, outputfile)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve(root):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SlowHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+
+
+def write_site(root):
+    for name, content in SITE.items():
+        (root / name).write_text(f"<html><body>{content}</body></html>")
+
+
+@pytest.fixture(scope="module")
+def site_url(tmp_path_factory):
+    root = tmp_path_factory.mktemp("site")
+    write_site(root)
+    for index in range(5):
+        (root / f"slow{index}.html").write_text(f"<html><body>Slow {index}</body></html>")
+    (root / "delays.html").write_text(
+        "<html><body>" + "".join(f'<a href="slow{index}.html">{index}</a>' for index in range(5)) + "</body></html>"
+    )
+
+    with serve(root) as url:
+        yield url
+
+
+def crawl(url, previous=None, **kwargs):
+    settings = CrawlSettings(crawl_per_host_delay=0)
+    crawler = Crawler(CrawlWebsite(url=url, **kwargs), settings, previous)
+
+    async def collect():
+        return [page async for page in crawler.pages()]
+
+    return asyncio.run(collect()), crawler
+
+
+def paths(pages):
+    return [page.url.rsplit("/", 1)[1] for page in pages]
+
+
+def test_normalize_url():
+    assert normalize_url("HTTP://Example.com:80/a?b=2&a=1#part") == "http://example.com/a?a=1&b=2"
+    assert normalize_url("https://example.com") == "https://example.com/"
+    assert normalize_url("mailto:someone@example.com") is None
+
+
+def test_crawl_breadth_first_up_to_depth(site_url):
+    pages, _ = crawl(f"{site_url}/index.html", depth=0)
+    assert paths(pages) == ["index.html"]
+
+    pages, _ = crawl(f"{site_url}/index.html", depth=1)
+    assert paths(pages)[0] == "index.html"
+    assert sorted(paths(pages)) == ["a.html", "b.html", "index.html"]
+
+    pages, crawler = crawl(f"{site_url}/index.html", depth=2)
+    assert sorted(paths(pages)) == ["a.html", "b.html", "c.html", "index.html"]
+    assert [page.depth for page in pages] == [0, 1, 1, 2]
+    # home.html has the content of index.html
+    assert crawler.stats.duplicates == 1
+
+
+def test_crawl_stops_at_max_pages(site_url):
+    pages, _ = crawl(f"{site_url}/index.html", depth=2, max_pages=2)
+    assert len(pages) == 2
+
+
+def test_crawl_stops_at_max_time(site_url):
+    start_time = time.perf_counter()
+    pages, crawler = crawl(f"{site_url}/delays.html", depth=1, max_time=1)
+    assert time.perf_counter() - start_time < 2
+    assert paths(pages) == ["delays.html"]
+    assert crawler.stats.timed_out
+
+
+def test_recrawl_skips_unchanged_pages(tmp_path):
+    write_site(tmp_path)
+    with serve(tmp_path) as url:
+        pages, _ = crawl(f"{url}/index.html", depth=2)
+        states = {
+            page.url: CrawlState(
+                brain_id="brain",
+                url=page.url,
+                last_modified=page.last_modified,
+                content_sha1=page.content_sha1,
+                links=page.links,
+            )
+            for page in pages
+        }
+
+        # Answered with 304 Not Modified, the links of a.html come from its state
+        pages, crawler = crawl(f"{url}/index.html", states, depth=2)
+        assert sorted(paths(pages)) == ["a.html", "b.html", "c.html", "index.html"]
+        assert not any(page.changed for page in pages)
+        assert crawler.removed_urls() == []
+
+        (tmp_path / "b.html").write_text("<html><body>B changed</body></html>")
+        os.utime(tmp_path / "b.html", (time.time() + 10, time.time() + 10))
+        (tmp_path / "c.html").unlink()
+
+        pages, crawler = crawl(f"{url}/index.html", states, depth=2)
+        assert [path for path, page in zip(paths(pages), pages) if page.changed] == ["b.html"]
+        assert crawler.removed_urls() == [f"{url}/c.html"]
+
+
+def test_recrawl_keeps_pages_on_server_errors(tmp_path):
+    write_site(tmp_path)
+    with serve(tmp_path) as url:
+        pages, _ = crawl(f"{url}/index.html", depth=2)
+        states = {page.url: CrawlState(brain_id="brain", url=page.url, links=page.links) for page in pages}
+
+        try:
+            # a.html is the only page linking to c.html
+            STATUSES["/a.html"] = 503
+            pages, crawler = crawl(f"{url}/index.html", states, depth=2)
+            assert sorted(paths(pages)) == ["b.html", "index.html"]
+            assert crawler.stats.failed == 1
+            assert crawler.removed_urls() == []
+
+            STATUSES["/a.html"] = 403
+            pages, crawler = crawl(f"{url}/index.html", states, depth=2)
+            assert crawler.removed_urls() == [f"{url}/c.html"]
+
+            STATUSES["/a.html"] = 410
+            pages, crawler = crawl(f"{url}/index.html", states, depth=2)
+            assert crawler.removed_urls() == [f"{url}/a.html", f"{url}/c.html"]
+        finally:
+            STATUSES.clear()
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytest
+from utils.cron import CronSchedule
+
+
+@pytest.mark.parametrize(
+    "expression, after, expected",
+    [
+        ("*/15 * * * *", datetime(2023, 8, 1, 10, 7, 30), datetime(2023, 8, 1, 10, 15)),
+        ("0 3 * * *", datetime(2023, 8, 1, 3, 0), datetime(2023, 8, 2, 3, 0)),
+        ("@hourly", datetime(2023, 8, 1, 23, 59), datetime(2023, 8, 2, 0, 0)),
+        ("30 6 * * 1-5", datetime(2023, 8, 4, 7, 0), datetime(2023, 8, 7, 6, 30)),
+        ("0 0 * * 7", datetime(2023, 8, 1), datetime(2023, 8, 6)),
+        ("0 0 31 * *", datetime(2023, 8, 31, 12), datetime(2023, 10, 31)),
+        ("0 12 1,15 2 *", datetime(2023, 2, 20), datetime(2024, 2, 1, 12)),
+        # Day of month or day of week when both are restricted
+        ("0 0 13 * 5", datetime(2023, 8, 1), datetime(2023, 8, 4)),
+    ],
+)
+def test_next_after(expression, after, expected):
+    assert CronSchedule(expression).next_after(after) == expected
+
+
+@pytest.mark.parametrize(
+    "expression", ["* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *", "a * * * *", "0 0 31 2 *"]
+)
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression).next_after(datetime(2023, 8, 1))
@@ -0,0 +1,19 @@
+from vectorstore.embedding_cache import EmbeddingCache
+
+
+def test_embeddings_are_read_back_from_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path=path).set_many({("model", "sha1"): [0.5, 1.0]})
+
+    assert EmbeddingCache(path=path).get_many([("model", "sha1"), ("model", "other")]) == {
+        ("model", "sha1"): [0.5, 1.0]
+    }
+
+
+def test_unreadable_cache_is_a_miss(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"))
+    cache._connection.execute("DROP TABLE embeddings")
+
+    assert cache.get_many([("model", "sha1")]) == {}
+    cache.set_many({("model", "sha1"): [0.5]})
+    assert cache.get_many([("model", "sha1")]) == {("model", "sha1"): [0.5]}
@@ -0,0 +1,115 @@
+import os
+import subprocess
+
+import pytest
+from parsers.github import (
+    RepositoryFile,
+    clone_repository,
+    hash_files,
+    is_ingested,
+    list_repository_files,
+    repository_name,
+    sparse_checkout,
+)
+
+MAX_FILE_BYTES = 1000
+
+REPOSITORY = {
+    "README.md": b"# Repository\n",
+    "src/main.py": b"print('main')\n",
+    "src/[weird] name.py": b"print('weird')\n",
+    "src/app.min.js": b"var a=1;\n",
+    "docs/logo.png": b"\x89PNG\r\n",
+    "poetry.lock": b"[metadata]\n",
+    "node_modules/package/index.js": b"module.exports = {};\n",
+    "large.txt": b"x" * (MAX_FILE_BYTES + 1),
+    "data.bin": b"\x00\x01\x02",
+    "empty.py": b"",
+}
+
+
+def git(*args):
+    subprocess.run(["git", *args], check=True, capture_output=True)
+
+
+@pytest.fixture(scope="module")
+def repository_url(tmp_path_factory):
+    source = tmp_path_factory.mktemp("source")
+    for path, content in REPOSITORY.items():
+        os.makedirs(source / os.path.dirname(path), exist_ok=True)
+        (source / path).write_bytes(content)
+    git("-C", str(source), "init", "--quiet")
+    git("-C", str(source), "add", "-A")
+    git("-C", str(source), "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "--quiet", "-m", "First")
+    (source / "README.md").write_bytes(b"# Repository, second version\n")
+    git("-C", str(source), "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "--quiet", "-am", "Second")
+
+    bare = tmp_path_factory.mktemp("bare") / "repository.git"
+    git("clone", "--quiet", "--bare", str(source), str(bare))
+    # Partial clones need a server that accepts the blob filters
+    git("-C", str(bare), "config", "uploadpack.allowFilter", "true")
+    # Shallow clones of local paths only honor --depth with the file:// scheme
+    return f"file://{bare}"
+
+
+@pytest.fixture
+def clone(repository_url, tmp_path):
+    path = str(tmp_path / "clone")
+    clone_repository(repository_url, path, max_file_bytes=MAX_FILE_BYTES)
+    return path
+
+
+def test_clone_is_shallow_without_checkout(clone):
+    assert os.listdir(clone) == [".git"]
+    commits = subprocess.run(
+        ["git", "-C", clone, "rev-list", "--count", "HEAD"], check=True, capture_output=True, text=True
+    ).stdout
+    assert commits.strip() == "1"
+
+
+def test_list_repository_files(clone):
+    files = {file.path: file.size for file in list_repository_files(clone)}
+    assert files == {
+        **{path: len(content) for path, content in REPOSITORY.items()},
+        "README.md": len(b"# Repository, second version\n"),
+        # Larger than the limit, never downloaded
+        "large.txt": None,
+    }
+
+
+def test_repository_name():
+    assert repository_name("https://github.com/QuivrHQ/quivr") == "QuivrHQ/quivr"
+    assert repository_name("https://github.com/QuivrHQ/quivr.git/") == "QuivrHQ/quivr"
+    assert repository_name("git@github.com:QuivrHQ/quivr.git") == "QuivrHQ/quivr"
+
+
+def test_is_ingested():
+    def ingested(path, size=10):
+        return is_ingested(RepositoryFile(path=path, size=size), MAX_FILE_BYTES)
+
+    assert ingested("src/main.py")
+    assert ingested("Dockerfile")
+    assert not ingested("docs/logo.PNG")
+    assert not ingested(".gitignore")
+    assert not ingested("src/app.min.js")
+    assert not ingested("web/node_modules/package/index.js")
+    assert not ingested("large.txt", MAX_FILE_BYTES + 1)
+    assert not ingested("large.txt", None)
+    assert not ingested("empty.py", 0)
+
+
+def test_sparse_checkout_of_selected_files(clone):
+    selected = [file for file in list_repository_files(clone) if is_ingested(file, MAX_FILE_BYTES)]
+    assert sorted(file.path for file in selected) == ["README.md", "data.bin", "src/[weird] name.py", "src/main.py"]
+
+    sparse_checkout(clone, selected)
+    checked_out = sorted(
+        os.path.relpath(os.path.join(root, name), clone)
+        for root, directories, names in os.walk(clone)
+        if ".git" not in root.split(os.sep)
+        for name in names
+    )
+    assert checked_out == ["README.md", "data.bin", "src/[weird] name.py", "src/main.py"]
+
+    # The binary file is left out of the ingestion
+    assert sorted(hash_files(clone, selected)) == ["README.md", "src/[weird] name.py", "src/main.py"]
@@ -0,0 +1,46 @@
+from llm.utils.history import ChatHistoryManager
+from models.chat import ChatHistory
+from models.settings import HistorySettings
+
+
+def turns(count):
+    return [
+        ChatHistory({"user_message": f"question {index}", "assistant": f"answer {index}"})
+        for index in range(count)
+    ]
+
+
+def fit(budget, summary, history):
+    manager = ChatHistoryManager("chat", "key", settings=HistorySettings(history_token_budget=budget))
+    return manager._fit(summary, history)
+
+
+def test_most_recent_turns_within_the_budget(offline_tiktoken):
+    history = turns(5)
+    turn_tokens = len(offline_tiktoken.encode_ordinary("question 0")) + len(
+        offline_tiktoken.encode_ordinary("answer 0")
+    )
+
+    window = fit(turn_tokens * 2, None, history)
+    assert [turn.user_message for turn in window.turns] == ["question 3", "question 4"]
+
+    window = fit(turn_tokens * 2 - 1, None, history)
+    assert [turn.user_message for turn in window.turns] == ["question 4"]
+
+    assert fit(turn_tokens * 10, None, history).turns == history
+
+
+def test_summary_takes_its_share_of_the_budget(offline_tiktoken):
+    history = turns(5)
+    summary = "question 0 answer 0"
+    budget = len(offline_tiktoken.encode_ordinary(summary)) * 3
+
+    window = fit(budget, summary, history)
+    assert window.summary == summary
+    assert [turn.user_message for turn in window.turns] == ["question 3", "question 4"]
+    assert window.as_messages()[0]["role"] == "system"
+    assert [message["content"] for message in window.as_messages()[1:3]] == ["question 3", "answer 3"]
+
+
+def test_no_turn_fits(offline_tiktoken):
+    assert fit(1, None, turns(3)).turns == []
@@ -0,0 +1,32 @@
+from langchain.docstore.document import Document
+from vectorstore.hybrid import reciprocal_rank_fusion
+
+
+def ranking(*ids):
+    return [(document_id, Document(page_content=document_id)) for document_id in ids]
+
+
+def contents(fused):
+    return [document.page_content for document, _ in fused]
+
+
+def test_documents_in_both_rankings_come_first():
+    fused = reciprocal_rank_fusion([ranking("a", "b", "c"), ranking("c", "d", "b")], k=60)
+
+    assert contents(fused) == ["c", "b", "a", "d"]
+    scores = dict(zip(contents(fused), (score for _, score in fused)))
+    assert scores["c"] == 1 / 63 + 1 / 61
+    assert scores["a"] == 1 / 61
+
+
+def test_lower_k_favors_the_top_ranks():
+    rankings = [ranking("a", "b", "c"), ranking("x", "y", "b")]
+
+    # b is in both rankings, a and x are first in one of them
+    assert contents(reciprocal_rank_fusion(rankings, k=60))[0] == "b"
+    assert contents(reciprocal_rank_fusion(rankings, k=0))[:2] == ["a", "x"]
+
+
+def test_single_and_empty_rankings():
+    assert contents(reciprocal_rank_fusion([ranking("a", "b")])) == ["a", "b"]
+    assert reciprocal_rank_fusion([[], []]) == []
@@ -0,0 +1,41 @@
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from utils.splitters import MAX_MEMOIZED_LENGTH, get_text_splitter, get_token_length_function
+
+PARAGRAPH = (
+    "The thing about the splitter is that it measures the same separators and the same "
+    "lines again and again, and the token lengths of these segments are remembered.\n"
+)
+TEXT = (
+    "# Title\n\n"
+    + PARAGRAPH * 6
+    + "\n\n## Section\n\n"
+    + "anotherwordwithoutanyspace" * 40
+    + "\n\n"
+    + "\n".join(f"Line {index}: and then the next one" for index in range(60))
+)
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(500, 0), (50, 0), (40, 10), (8, 2)])
+def test_chunks_equal_from_tiktoken_encoder(offline_tiktoken, chunk_size, chunk_overlap):
+    expected = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    ).split_text(TEXT)
+
+    assert get_text_splitter(chunk_size, chunk_overlap).split_text(TEXT) == expected
+
+
+def test_splitters_are_shared(offline_tiktoken):
+    assert get_text_splitter(500, 0) is get_text_splitter(500, 0)
+    assert get_text_splitter(500, 0) is not get_text_splitter(500, 100)
+
+
+def test_token_length_function(offline_tiktoken):
+    token_length = get_token_length_function()
+    long_text = "the " * MAX_MEMOIZED_LENGTH
+
+    token_length.prime(["the thing", "and then", long_text])
+    for text in ["the thing", "and then", long_text, "", "the thing"]:
+        assert token_length(text) == len(offline_tiktoken.encode_ordinary(text))
+    # Long segments are measured but not remembered
+    assert long_text not in token_length._lengths
@@ -1,3 +1,21 @@
+import time
+
+
+def wait_for_upload_job(client, api_key, upload_response_data, timeout=60):
+    job_id = upload_response_data["job_id"]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job_response = client.get(
+            f"/upload/jobs/{job_id}", headers={"Authorization": "Bearer " + api_key}
+        )
+        assert job_response.status_code == 200
+        job = job_response.json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(1)
+    raise TimeoutError(f"Upload job {job_id} did not finish in {timeout} seconds")
+
+
 def test_upload_and_delete_file(client, api_key):
     # Retrieve the default brain
     brain_response = client.get(
@@ -28,6 +46,9 @@ def test_upload_and_delete_file(client, api_key):
     upload_response_data = upload_response.json()
     assert "message" in upload_response_data
 
+    # Wait for the file to be processed
+    wait_for_upload_job(client, api_key, upload_response_data)
+
     # Delete the file
     delete_response = client.delete(
         f"/explore/{file_name}",
@@ -73,6 +94,9 @@ def test_upload_explore_and_delete_file_txt(client, api_key):
     upload_response_data = upload_response.json()
     assert "message" in upload_response_data
 
+    # Wait for the file to be processed
+    wait_for_upload_job(client, api_key, upload_response_data)
+
     # Explore (Download) the file
     explore_response = client.get(
         f"/explore/{file_name}",
@@ -130,6 +154,11 @@ def test_upload_explore_and_delete_file_pdf(client, api_key):
     assert "type" in upload_response_data
     assert upload_response_data["type"] == "success"
 
+    # Wait for the file to be processed
+    job = wait_for_upload_job(client, api_key, upload_response_data)
+    assert job["status"] == "done"
+    assert job["chunks_stored"] == job["chunks_parsed"]
+
     # Explore (Download) the file
     explore_response = client.get(
         f"/explore/{file_name}",
@@ -184,6 +213,9 @@ def test_upload_explore_and_delete_file_csv(client, api_key):
     upload_response_data = upload_response.json()
     assert "message" in upload_response_data
 
+    # Wait for the file to be processed
+    wait_for_upload_job(client, api_key, upload_response_data)
+
     # Explore (Download) the file
     explore_response = client.get(
         f"/explore/{file_name}",
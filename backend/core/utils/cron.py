@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from typing import List, Set
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# (name, lowest value, highest value) of the five fields of an expression
+FIELDS = [
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 6),
+]
+
+# Schedules with no matching minute within this many days (e.g. 31 2 *) are rejected
+MAX_SEARCH_DAYS = 366 * 5
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression (minute, hour, day of month, month, day of
+    week with Sunday as 0 or 7) supporting `*`, lists, ranges and steps, plus the
+    @hourly, @daily, @weekly and @monthly aliases. Like cron, when both the day of
+    month and the day of week are restricted, a day matching either one matches.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(
+                f"Invalid cron expression '{expression}': expected 5 fields, got {len(fields)}"
+            )
+
+        values = [
+            _parse_field(field, name, low, high + (1 if name == "day of week" else 0))
+            for field, (name, low, high) in zip(fields, FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        # 7 is Sunday too
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day: datetime) -> bool:
+        # Python numbers the days of the week from Monday, cron from Sunday
+        weekday_matches = (day.weekday() + 1) % 7 in self.weekdays
+        day_matches = day.day in self.days
+        if self._any_day or self._any_weekday:
+            return day_matches and weekday_matches
+        return day_matches or weekday_matches
+
+    def next_after(self, after: datetime) -> datetime:
+        """First time matching the schedule strictly after the given time."""
+        current = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = current + timedelta(days=MAX_SEARCH_DAYS)
+
+        while current < limit:
+            if current.month not in self.months or not self._day_matches(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if current.hour not in self.hours:
+                current = current.replace(minute=0) + timedelta(hours=1)
+                continue
+            if current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+                continue
+            return current
+
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+    def __repr__(self) -> str:
+        return f"CronSchedule({self.expression!r})"
+
+
+def _parse_field(field: str, name: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        values.update(_parse_part(part, name, low, high))
+    return values
+
+
+def _parse_part(part: str, name: str, low: int, high: int) -> List[int]:
+    try:
+        range_part, _, step_part = part.partition("/")
+        step = int(step_part) if step_part else 1
+
+        if range_part == "*":
+            start, end = low, high
+        elif "-" in range_part:
+            start, end = (int(value) for value in range_part.split("-", 1))
+        else:
+            start = int(range_part)
+            # "5/15" runs from 5 to the end of the range
+            end = high if step_part else start
+    except ValueError:
+        raise ValueError(f"Invalid {name} field '{part}'")
+
+    if step < 1 or start < low or end > high or start > end:
+        raise ValueError(f"Invalid {name} field '{part}': values go from {low} to {high}")
+    return list(range(start, end + 1, step))
@@ -1,7 +1,12 @@
 import hashlib
+import os
+from typing import BinaryIO, Optional
 
 from fastapi import UploadFile
 
+# Size of the blocks read when hashing files
+SHA1_CHUNK_SIZE = 1024 * 1024
+
 
 def convert_bytes(bytes, precision=2):
     """Converts bytes into a human-friendly format."""
@@ -18,10 +23,8 @@ def convert_bytes(bytes, precision=2):
 
 def get_file_size(file: UploadFile):
     # move the cursor to the end of the file
-    file.file._file.seek(0, 2)  # pyright: ignore reportPrivateUsage=none
-    file_size = (
-        file.file._file.tell()  # pyright: ignore reportPrivateUsage=none
-    )  # Getting the size of the file
+    file.file.seek(0, 2)
+    file_size = file.file.tell()  # Getting the size of the file
     # move the cursor back to the beginning of the file
     file.file.seek(0)
 
@@ -30,9 +33,31 @@ def get_file_size(file: UploadFile):
 
 def compute_sha1_from_file(file_path):
     with open(file_path, "rb") as file:
-        bytes = file.read()
-        readable_hash = compute_sha1_from_content(bytes)
-    return readable_hash
+        return compute_sha1_from_fileobj(file)
+
+
+def compute_sha1_from_fileobj(file: BinaryIO, chunk_size: int = SHA1_CHUNK_SIZE):
+    """
+    Hash a file object from its beginning in fixed-size blocks,
+    so that only one block is held in memory at a time.
+    """
+    sha1 = hashlib.sha1()
+    file.seek(0)
+    for block in iter(lambda: file.read(chunk_size), b""):
+        sha1.update(block)
+    file.seek(0)
+    return sha1.hexdigest()
+
+
+def get_file_path(file: UploadFile) -> Optional[str]:
+    """
+    Path of the file backing the upload, when it lives on disk under a name
+    (spooled upload jobs, crawled pages), None for in-memory or anonymous files.
+    """
+    name = getattr(file.file, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
 
 
 def compute_sha1_from_content(content):
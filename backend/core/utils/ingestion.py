@@ -0,0 +1,320 @@
+import asyncio
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import (
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from langchain.schema import Document
+from logger import get_logger
+from models.brains import Brain
+from models.settings import CommonsDep, IngestionSettings
+from utils.metrics import metrics
+from utils.tokens import count_tokens
+from vectorstore.embedding_cache import get_embeddings
+from vectorstore.supabase import SupabaseVectorStore
+
+logger = get_logger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Vectors moved to the new version of a file in one RPC
+RELINK_BATCH_SIZE = 500
+
+
+@dataclass
+class IngestionStats:
+    chunks: int = 0
+    embedded: int = 0
+    stored: int = 0
+    reused: int = 0
+    removed: int = 0
+    tokens: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    batch_seconds: List[float] = field(default_factory=list)
+    vector_ids: List[str] = field(default_factory=list)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "stored": self.stored,
+            "reused": self.reused,
+            "removed": self.removed,
+            "tokens": self.tokens,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "chunks_per_second": round(self.chunks_per_second, 2),
+            "max_batch_seconds": round(max(self.batch_seconds, default=0.0), 3),
+        }
+
+
+ProgressCallback = Callable[[IngestionStats], Awaitable[None]]
+
+# Set by the upload job workers to follow the pipelines started by a job
+ingestion_progress: ContextVar[Optional[ProgressCallback]] = ContextVar(
+    "ingestion_progress", default=None
+)
+
+
+class EmbeddingPipeline:
+    """
+    Streaming ingestion stage: chunks are grouped in token-bounded batches, a
+    bounded number of batches is embedded concurrently, and each batch is
+    stored in vectors and linked in brains_vectors as soon as it is embedded.
+    Only `embedding_concurrency` batches are held in memory at any time.
+
+    When the file replaces a previous version with the same `file_name` in the
+    brain, the chunks whose `chunk_sha1` is already in the brain are not embedded
+    again: their vectors are moved to the new version, and the vectors of the
+    chunks that disappeared are unlinked.
+    """
+
+    def __init__(
+        self,
+        commons: CommonsDep,
+        brain_id,
+        file_sha1: str,
+        user_openai_api_key: Optional[str] = None,
+        file_name: Optional[str] = None,
+        settings: Optional[IngestionSettings] = None,
+        on_progress: Optional[ProgressCallback] = None,
+    ):
+        self.commons = commons
+        self.brain = Brain(id=brain_id)
+        self.file_sha1 = file_sha1
+        self.file_name = file_name
+        self.settings = settings or IngestionSettings()
+        self.embeddings = (
+            get_embeddings(user_openai_api_key)
+            if user_openai_api_key
+            else commons["embeddings"]
+        )
+        self.vector_store = SupabaseVectorStore(
+            commons["supabase"], self.embeddings, table_name="vectors"
+        )
+        self.stats = IngestionStats()
+        self.on_progress = on_progress or ingestion_progress.get()
+        # Vectors of the previous versions of the file, by chunk sha1
+        self._previous_vector_ids: List[str] = []
+        self._reusable: Dict[str, List[str]] = {}
+        self._reused: List[Tuple[str, dict]] = []
+
+    def _load_previous_version(self) -> None:
+        for chunk in self.brain.get_file_chunks(self.file_name):
+            if chunk["file_sha1"] == self.file_sha1:
+                continue
+            self._previous_vector_ids.append(chunk["vector_id"])
+            # Vectors stored before chunks were hashed are replaced
+            if chunk["chunk_sha1"]:
+                self._reusable.setdefault(chunk["chunk_sha1"], []).append(chunk["vector_id"])
+
+    def _take_reusable(self, document: Document) -> Optional[str]:
+        vector_ids = self._reusable.get(document.metadata.get("chunk_sha1"))
+        return vector_ids.pop() if vector_ids else None
+
+    async def _iterate(
+        self, documents: Union[Iterable[Document], AsyncIterable[Document]]
+    ):
+        if hasattr(documents, "__aiter__"):
+            async for document in documents:  # pyright: ignore reportPrivateUsage=none
+                yield document
+        else:
+            for document in documents:  # pyright: ignore reportPrivateUsage=none
+                yield document
+
+    async def _batches(
+        self, documents: Union[Iterable[Document], AsyncIterable[Document]]
+    ):
+        batch: List[Document] = []
+        batch_tokens = 0
+
+        async for document in self._iterate(documents):
+            vector_id = self._take_reusable(document)
+            if vector_id is not None:
+                self._reused.append((vector_id, document.metadata))
+                self.stats.chunks += 1
+                self.stats.reused += 1
+                continue
+
+            tokens = count_tokens(document.page_content, EMBEDDING_MODEL)
+            if batch and batch_tokens + tokens > self.settings.embedding_batch_tokens:
+                yield batch, batch_tokens
+                batch, batch_tokens = [], 0
+            batch.append(document)
+            batch_tokens += tokens
+
+        if batch:
+            yield batch, batch_tokens
+
+    def _embed(self, batch: List[Document]) -> List[List[float]]:
+        with metrics.timer("ingestion.embed_seconds"):
+            return self.embeddings.embed_documents(
+                [document.page_content for document in batch]
+            )
+
+    def _store(
+        self, batch: List[Document], vectors: List[List[float]], ids: List[str]
+    ) -> List[str]:
+        # Both writes are upserts so that a retry after a partial failure stores each chunk once
+        with metrics.timer("ingestion.store_seconds"):
+            vector_ids = self.vector_store.add_vectors(vectors, batch, ids)
+
+            # Documents of several files (a repository) are linked under their own sha1
+            vector_ids_by_file: Dict[str, List[str]] = {}
+            for vector_id, document in zip(vector_ids, batch):
+                file_sha1 = document.metadata.get("file_sha1") or self.file_sha1
+                vector_ids_by_file.setdefault(file_sha1, []).append(vector_id)
+            for file_sha1, file_vector_ids in vector_ids_by_file.items():
+                self.brain.create_brain_vectors(file_vector_ids, file_sha1)
+            return vector_ids
+
+    def _relink(self, reused: List[Tuple[str, dict]]) -> List[str]:
+        with metrics.timer("ingestion.relink_seconds"):
+            return self.brain.relink_file_vectors(
+                [vector_id for vector_id, _ in reused],
+                [metadata for _, metadata in reused],
+                self.file_sha1,
+            )
+
+    async def _replace_previous_version(self) -> List[str]:
+        """Move the reused vectors to the new version, unlink the others."""
+        vector_ids: List[str] = []
+        for start in range(0, len(self._reused), RELINK_BATCH_SIZE):
+            vector_ids.extend(
+                await self._with_retries(
+                    start // RELINK_BATCH_SIZE,
+                    self._relink,
+                    self._reused[start:start + RELINK_BATCH_SIZE],
+                )
+            )
+
+        reused_ids = {vector_id for vector_id, _ in self._reused}
+        removed_ids = [
+            vector_id
+            for vector_id in self._previous_vector_ids
+            if vector_id not in reused_ids
+        ]
+        if removed_ids:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.brain.delete_brain_vectors, removed_ids
+            )
+        self.stats.removed = len(removed_ids)
+
+        metrics.increment("ingestion.chunks_reused", len(self._reused))
+        metrics.increment("ingestion.chunks_removed", len(removed_ids))
+        return vector_ids
+
+    async def _with_retries(self, index: int, function, *args):
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.settings.embedding_max_retries + 1):
+            try:
+                return await loop.run_in_executor(None, function, *args)
+            except Exception as e:
+                if attempt == self.settings.embedding_max_retries:
+                    raise
+                delay = self.settings.embedding_retry_delay * 2**attempt
+                logger.warning(
+                    f"Batch {index} of {self.file_sha1} failed ({e}), retrying in {delay:.1f} seconds"
+                )
+                metrics.increment("ingestion.batch_retries")
+                await asyncio.sleep(delay)
+
+    async def _report_progress(self) -> None:
+        if self.on_progress is None:
+            return
+        try:
+            await self.on_progress(self.stats)
+        except Exception as e:
+            logger.error(f"Error reporting ingestion progress of {self.file_sha1}: {e}")
+
+    async def _process_batch(
+        self, index: int, batch: List[Document], tokens: int, semaphore: asyncio.Semaphore
+    ) -> List[str]:
+        try:
+            start_time = time.perf_counter()
+
+            vectors = await self._with_retries(index, self._embed, batch)
+            self.stats.embedded += len(batch)
+            await self._report_progress()
+
+            # The ids are drawn once, the retries of the batch write the same rows
+            ids = [str(uuid.uuid4()) for _ in batch]
+            vector_ids = await self._with_retries(
+                index, self._store, batch, vectors, ids
+            )
+            self.stats.stored += len(batch)
+            await self._report_progress()
+
+            elapsed_time = time.perf_counter() - start_time
+            self.stats.batch_seconds.append(elapsed_time)
+            metrics.observe("ingestion.batch_seconds", elapsed_time)
+            metrics.increment("ingestion.chunks", len(batch))
+            logger.info(
+                f"Batch {index} of {self.file_sha1}: {len(batch)} chunks, {tokens} tokens stored in {elapsed_time:.3f} seconds"
+            )
+            return vector_ids
+        finally:
+            semaphore.release()
+
+    async def run(
+        self, documents: Union[Iterable[Document], AsyncIterable[Document]]
+    ) -> IngestionStats:
+        """
+        Embed and store the documents, returns the ingestion statistics
+        including the ids of the vectors of the file: the created ones in
+        document order, then the ones reused from the previous version.
+        """
+        start_time = time.perf_counter()
+        if self.file_name and self.settings.incremental_reingestion:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._load_previous_version
+            )
+
+        semaphore = asyncio.Semaphore(self.settings.embedding_concurrency)
+        tasks = []
+
+        try:
+            async for batch, tokens in self._batches(documents):
+                # Backpressure: wait for a free slot before reading further
+                await semaphore.acquire()
+                tasks.append(
+                    asyncio.create_task(
+                        self._process_batch(len(tasks), batch, tokens, semaphore)
+                    )
+                )
+                self.stats.chunks += len(batch)
+                self.stats.tokens += tokens
+                await self._report_progress()
+
+            results = await asyncio.gather(*tasks)
+            reused_ids = await self._replace_previous_version()
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        self.stats.batches = len(tasks)
+        self.stats.vector_ids = [
+            vector_id for ids in results for vector_id in ids
+        ] + reused_ids
+        self.stats.seconds = time.perf_counter() - start_time
+        logger.info(f"Ingestion of {self.file_sha1}: {self.stats.to_dict()}")
+
+        return self.stats
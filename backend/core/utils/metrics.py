@@ -0,0 +1,80 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, latency summaries and collectors.
+    Everything registered here is exported by the GET /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get_counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record one latency sample (in seconds) for the given name."""
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+            )
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["last"] = seconds
+
+    @contextmanager
+    def timer(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time)
+
+    def register_collector(self, name: str, collector: Callable[[], dict]) -> None:
+        """
+        Register a callable returning a dict of live values (pool sizes, cache sizes...)
+        that is evaluated each time a snapshot is taken.
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {
+                name: {
+                    **timing,
+                    "avg": timing["total"] / timing["count"] if timing["count"] else 0.0,
+                }
+                for name, timing in self._timings.items()
+            }
+            collectors = dict(self._collectors)
+
+        collected = {}
+        for name, collector in collectors.items():
+            try:
+                collected[name] = collector()
+            except Exception as e:
+                logger.error(f"Error collecting metrics for {name}: {e}")
+
+        return {"counters": counters, "timings": timings, **collected}
+
+
+metrics = MetricsRegistry()
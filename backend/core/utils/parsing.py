@@ -0,0 +1,225 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Iterator, List, Optional
+
+from langchain.document_loaders import PyMuPDFLoader
+from langchain.schema import Document
+from logger import get_logger
+from models.settings import ParsingSettings
+from starlette.concurrency import run_in_threadpool
+from utils.metrics import metrics
+from utils.splitters import get_text_splitter, warm_up
+
+logger = get_logger(__name__)
+
+
+# Tasks run in the parsing processes: module-level functions with picklable arguments
+
+
+def load_and_split(loader_class, path: str, chunk_size: int, chunk_overlap: int) -> List[Document]:
+    return get_text_splitter(chunk_size, chunk_overlap).split_documents(loader_class(path).load())
+
+
+def count_pdf_pages(path: str) -> int:
+    import fitz
+
+    with fitz.open(path) as pdf:
+        return pdf.page_count
+
+
+def iter_pdf_documents(
+    path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    start: int = 0,
+    stop: Optional[int] = None,
+) -> Iterator[Document]:
+    """
+    Chunks of the pages [start, stop) of a PDF, with the metadata PyMuPDFLoader gives them.
+    The file is opened once and MuPDF reads the pages from it on demand, each page is
+    split as soon as its text is extracted, so only one page is held in memory at a time.
+    """
+    import fitz
+
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+    with fitz.open(path) as pdf:
+        stop = pdf.page_count if stop is None else min(stop, pdf.page_count)
+        for page_number in range(start, stop):
+            page = Document(
+                page_content=pdf[page_number].get_text(),
+                metadata={
+                    "source": path,
+                    "file_path": path,
+                    "page": page_number,
+                    "total_pages": pdf.page_count,
+                },
+            )
+            yield from text_splitter.split_documents([page])
+
+
+def load_and_split_pdf_pages(
+    path: str, start: int, stop: int, chunk_size: int, chunk_overlap: int
+) -> List[Document]:
+    return list(iter_pdf_documents(path, chunk_size, chunk_overlap, start, stop))
+
+
+class ParsingPool:
+    """
+    Bounded pool of processes loading and splitting the uploaded files, so that
+    the CPU-heavy loaders never run on the event loop nor hold the GIL of the API.
+    PDFs are split in page ranges parsed in parallel, and their chunks are
+    yielded in page order. With `parsing_workers` set to 0 the files are parsed
+    in a thread of the API process instead, PDFs one page at a time.
+    """
+
+    def __init__(self, settings: Optional[ParsingSettings] = None):
+        self.settings = settings or ParsingSettings()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._max_pending = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a process running the API threads is not safe, start fresh interpreters
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.settings.parsing_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    # Load the encoding once per process, before the first file
+                    initializer=warm_up,
+                )
+            return self._executor
+
+    async def run(self, function, *args):
+        """Run a task in the pool, tracking the number of tasks queued or running."""
+        executor = self._get_executor()
+        with self._lock:
+            self._pending += 1
+            self._max_pending = max(self._max_pending, self._pending)
+        metrics.increment("parsing.tasks")
+
+        start_time = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        except BrokenProcessPool:
+            # A worker died (out of memory, segfault in a loader): start a new pool for the next tasks
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+            metrics.observe("parsing.task_seconds", time.perf_counter() - start_time)
+
+    async def iter_documents(
+        self, loader_class, path: str, chunk_size: int, chunk_overlap: int
+    ) -> AsyncIterator[Document]:
+        if self.settings.parsing_workers == 0:
+            async for document in self._iter_in_process(
+                loader_class, path, chunk_size, chunk_overlap
+            ):
+                yield document
+            return
+
+        if loader_class is not PyMuPDFLoader:
+            for document in await self.run(
+                load_and_split, loader_class, path, chunk_size, chunk_overlap
+            ):
+                yield document
+            return
+
+        page_count = await self.run(count_pdf_pages, path)
+        pages_per_task = self.settings.parsing_pdf_pages_per_task
+        ranges = deque(
+            (start, min(start + pages_per_task, page_count))
+            for start in range(0, page_count, pages_per_task)
+        )
+
+        # Keep every worker busy with at most two ranges per worker in flight,
+        # the results are consumed in page order
+        in_flight: deque = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < 2 * self.settings.parsing_workers:
+                    start, stop = ranges.popleft()
+                    in_flight.append(
+                        asyncio.ensure_future(
+                            self.run(
+                                load_and_split_pdf_pages,
+                                path,
+                                start,
+                                stop,
+                                chunk_size,
+                                chunk_overlap,
+                            )
+                        )
+                    )
+                for document in await in_flight.popleft():
+                    yield document
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _iter_in_process(
+        self, loader_class, path: str, chunk_size: int, chunk_overlap: int
+    ) -> AsyncIterator[Document]:
+        """Without parsing processes, PDFs are streamed page by page from a thread."""
+        if loader_class is not PyMuPDFLoader:
+            for document in await run_in_threadpool(
+                load_and_split, loader_class, path, chunk_size, chunk_overlap
+            ):
+                yield document
+            return
+
+        documents = iter_pdf_documents(path, chunk_size, chunk_overlap)
+        try:
+            while True:
+                document = await run_in_threadpool(next, documents, None)
+                if document is None:
+                    break
+                yield document
+        finally:
+            # Still executing in its thread when the consumer was cancelled, it is closed when collected
+            with suppress(ValueError):
+                documents.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, max_pending = self._pending, self._max_pending
+        return {
+            "workers": self.settings.parsing_workers,
+            "pending": pending,
+            "queued": max(0, pending - self.settings.parsing_workers),
+            "max_pending": max_pending,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_parsing_pool: Optional[ParsingPool] = None
+_parsing_pool_lock = threading.Lock()
+
+
+def get_parsing_pool() -> ParsingPool:
+    global _parsing_pool
+
+    if _parsing_pool is None:
+        with _parsing_pool_lock:
+            if _parsing_pool is None:
+                _parsing_pool = ParsingPool()
+                metrics.register_collector("parsing_pool", _parsing_pool.stats)
+
+    return _parsing_pool
@@ -12,6 +12,7 @@ from parsers.odt import process_odt
 from parsers.pdf import process_pdf
 from parsers.powerpoint import process_powerpoint
 from parsers.txt import process_txt
+from starlette.concurrency import run_in_threadpool
 
 from logger import get_logger
 
@@ -53,8 +54,12 @@ async def filter_file(
     await file.compute_file_sha1()
 
     logger.info(f"Computing documents from file {file.file_name}")
-    file_exists = file.file_already_exists()
-    file_exists_in_brain = file.file_already_exists_in_brain(brain_id)
+    # Whether the file is stored and linked to the brain, in a single query
+    existing_files = await run_in_threadpool(
+        Brain(id=brain_id).get_existing_files, [file.file_sha1]
+    )
+    file_exists = file.file_sha1 in existing_files
+    file_exists_in_brain = existing_files.get(file.file_sha1, False)
 
     if file_exists_in_brain:
         return create_response(
@@ -67,7 +72,7 @@ async def filter_file(
             "error",  # pyright: ignore reportPrivateUsage=none
         )
     elif file_exists:
-        file.link_file_to_brain(brain=Brain(id=brain_id))
+        await run_in_threadpool(file.link_file_to_brain, brain=Brain(id=brain_id))
         return create_response(
             f"✅ {file.file.filename} has been uploaded to brain {brain_id}.",  # pyright: ignore reportPrivateUsage=none
             "success",
@@ -0,0 +1,171 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from crawl.crawler import CrawlWebsite
+from crawl.ingestion import crawl_into_brain
+from logger import get_logger
+from models.brain_source import BrainSource, BrainSourceRunStatus, BrainSourceType
+from models.settings import SourceSyncSettings, common_dependencies
+from parsers.github import process_github
+from repository.brain_source.claim_due_brain_sources import aclaim_due_brain_sources
+from repository.brain_source.create_source_run import acreate_source_run
+from repository.brain_source.update_brain_source import aupdate_brain_source
+from repository.brain_source.update_source_run import aupdate_source_run
+from utils.cron import CronSchedule
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+def next_run_time(schedule: str, jitter: float, after: Optional[datetime] = None) -> datetime:
+    """
+    Next time of the schedule after the given time (UTC now by default), delayed by a
+    random part of the jitter so that the sources on the same schedule are spread out.
+    """
+    after = after or datetime.utcnow()
+    return CronSchedule(schedule).next_after(after) + timedelta(
+        seconds=random.uniform(0, jitter)
+    )
+
+
+class SourceScheduler:
+    """
+    Re-syncs the websites and GitHub repositories recorded in brain_sources on their
+    cron schedule. Every `source_sync_poll_interval` seconds, the process claims as
+    many due sources as it has idle workers (so several API processes can share the
+    table), and runs them with at most one sync per brain at a time. Each sync is
+    recorded in brain_source_runs with its duration and outcome.
+    """
+
+    def __init__(self, settings: Optional[SourceSyncSettings] = None):
+        self.settings = settings or SourceSyncSettings()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._brain_locks: Dict[str, asyncio.Lock] = {}
+        self._running = 0
+
+    async def start(self) -> None:
+        if self._tasks or not self.settings.source_sync_enabled:
+            return
+
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.settings.source_sync_workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._poll()))
+        logger.info(f"Started {self.settings.source_sync_workers} source sync workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _idle_workers(self) -> int:
+        queued = self._queue.qsize() if self._queue else 0
+        return self.settings.source_sync_workers - self._running - queued
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                idle_workers = self._idle_workers()
+                if idle_workers > 0:
+                    sources = await aclaim_due_brain_sources(
+                        idle_workers, self.settings.source_sync_lease
+                    )
+                    for source in sources:
+                        await self._queue.put(source)  # pyright: ignore reportPrivateUsage=none
+                    metrics.increment("source_sync.claimed", len(sources))
+            except Exception as e:
+                logger.error(f"Error claiming the due brain sources: {e}")
+            await asyncio.sleep(self.settings.source_sync_poll_interval)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            source = await self._queue.get()  # pyright: ignore reportPrivateUsage=none
+            self._running += 1
+            try:
+                lock = self._brain_locks.setdefault(str(source.brain_id), asyncio.Lock())
+                async with lock:
+                    await self._run(source)
+            except Exception as e:
+                logger.error(f"Source sync worker {index} failed on source {source.source_id}: {e}")
+            finally:
+                self._running -= 1
+                self._queue.task_done()  # pyright: ignore reportPrivateUsage=none
+
+    async def _sync(self, source: BrainSource) -> dict:
+        commons = common_dependencies()
+        if source.source_type == BrainSourceType.Github.value:
+            return await process_github(
+                commons, source.url, False, source.brain_id, user_openai_api_key=None
+            )
+        return await crawl_into_brain(
+            commons,
+            CrawlWebsite(url=source.url, **source.config),
+            source.brain_id,
+            enable_summarization=False,
+        )
+
+    async def _run(self, source: BrainSource) -> None:
+        run = await acreate_source_run(source)
+        start_time = time.perf_counter()
+
+        try:
+            response = await self._sync(source)
+        except Exception as e:
+            logger.error(f"Error syncing source {source.source_id} ({source.url}): {e}")
+            response = {"message": f"⚠️ An error occurred while syncing {source.url}.", "type": "error"}
+
+        elapsed_time = time.perf_counter() - start_time
+        status = (
+            BrainSourceRunStatus.Failed
+            if response["type"] == "error"
+            else BrainSourceRunStatus.Done
+        )
+        await aupdate_source_run(
+            run.run_id,
+            {
+                "status": status.value,
+                "message": response["message"],
+                "end_time": datetime.utcnow().isoformat(),
+                "duration_seconds": elapsed_time,
+            },
+        )
+        await aupdate_brain_source(
+            source.source_id,
+            {
+                "last_run_time": datetime.utcnow().isoformat(),
+                "next_run_time": next_run_time(
+                    source.schedule, self.settings.source_sync_jitter
+                ).isoformat(),
+            },
+        )
+
+        metrics.observe("source_sync.seconds", elapsed_time)
+        metrics.increment(f"source_sync.{status.value}")
+        logger.info(f"Source {source.source_id} ({source.url}) {status.value} in {elapsed_time:.3f} seconds")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.settings.source_sync_workers if self._tasks else 0,
+            "running": self._running,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+
+_source_scheduler: Optional[SourceScheduler] = None
+
+
+def get_source_scheduler() -> SourceScheduler:
+    global _source_scheduler
+
+    if _source_scheduler is None:
+        _source_scheduler = SourceScheduler()
+        metrics.register_collector("source_sync", _source_scheduler.stats)
+
+    return _source_scheduler
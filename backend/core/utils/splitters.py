@@ -0,0 +1,133 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+import tiktoken
+from langchain.text_splitter import RecursiveCharacterTextSplitter, _split_text_with_regex
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Encoding of RecursiveCharacterTextSplitter.from_tiktoken_encoder, which sized the existing chunks
+DEFAULT_ENCODING = "gpt2"
+
+# Segments longer than this are too unlikely to repeat to be worth remembering
+MAX_MEMOIZED_LENGTH = 1000
+MAX_MEMOIZED_SEGMENTS = 10000
+
+# Below this many unknown segments, a batch is not worth the thread pool of tiktoken
+MIN_BATCH_SIZE = 16
+
+
+class TokenLengthFunction:
+    """
+    Token length of a text in a tiktoken encoding. The lengths of the short segments
+    the splitter measures over and over (separators, repeated headers and lines) are
+    memoized, and the segments of a split are encoded in one encode_ordinary_batch call.
+    """
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING):
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self._lengths: Dict[str, int] = {}
+
+    def __call__(self, text: str) -> int:
+        length = self._lengths.get(text)
+        if length is None:
+            length = len(self.encoding.encode_ordinary(text))
+            self._remember(text, length)
+        return length
+
+    def prime(self, texts: Iterable[str]) -> None:
+        """Measure the texts not measured yet in one batch."""
+        missing = [
+            text
+            for text in dict.fromkeys(texts)
+            if len(text) <= MAX_MEMOIZED_LENGTH and text not in self._lengths
+        ]
+        if len(missing) < MIN_BATCH_SIZE:
+            return
+
+        for text, tokens in zip(missing, self.encoding.encode_ordinary_batch(missing)):
+            self._remember(text, len(tokens))
+
+    def _remember(self, text: str, length: int) -> None:
+        if len(text) > MAX_MEMOIZED_LENGTH:
+            return
+        if len(self._lengths) >= MAX_MEMOIZED_SEGMENTS:
+            self._lengths.clear()
+        self._lengths[text] = length
+
+
+class TokenTextSplitter(RecursiveCharacterTextSplitter):
+    """
+    RecursiveCharacterTextSplitter measuring the segments of each split with a
+    TokenLengthFunction, primed with all the segments before they are merged.
+    """
+
+    def __init__(self, length_function: TokenLengthFunction, **kwargs):
+        super().__init__(length_function=length_function, **kwargs)
+        self._token_length = length_function
+
+    def _split_text(self, text: str, separators: List[str]) -> List[str]:
+        """Same algorithm as RecursiveCharacterTextSplitter, with the lengths measured in batch."""
+        final_chunks = []
+        separator = separators[-1]
+        new_separators = []
+        for index, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if re.search(candidate, text):
+                separator = candidate
+                new_separators = separators[index + 1:]
+                break
+
+        splits = _split_text_with_regex(text, separator, self._keep_separator)
+        self._token_length.prime(splits)
+
+        good_splits = []
+        merge_separator = "" if self._keep_separator else separator
+        for split in splits:
+            if self._length_function(split) < self._chunk_size:
+                good_splits.append(split)
+                continue
+
+            if good_splits:
+                final_chunks.extend(self._merge_splits(good_splits, merge_separator))
+                good_splits = []
+            if not new_separators:
+                final_chunks.append(split)
+            else:
+                final_chunks.extend(self._split_text(split, new_separators))
+
+        if good_splits:
+            final_chunks.extend(self._merge_splits(good_splits, merge_separator))
+        return final_chunks
+
+
+@lru_cache(maxsize=None)
+def get_token_length_function(encoding_name: str = DEFAULT_ENCODING) -> TokenLengthFunction:
+    return TokenLengthFunction(encoding_name)
+
+
+@lru_cache(maxsize=32)
+def get_text_splitter(
+    chunk_size: int, chunk_overlap: int, encoding_name: str = DEFAULT_ENCODING
+) -> TokenTextSplitter:
+    """
+    Shared splitter for the given chunking: splitters hold no state between calls,
+    so the encoding is loaded once per process instead of once per file.
+    """
+    return TokenTextSplitter(
+        get_token_length_function(encoding_name),
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+
+
+def warm_up(encoding_name: str = DEFAULT_ENCODING) -> None:
+    """Load the encoding ahead of the first file, in the API and in the parsing processes."""
+    try:
+        get_token_length_function(encoding_name)
+    except Exception as e:
+        logger.error(f"Error loading the {encoding_name} encoding: {e}")
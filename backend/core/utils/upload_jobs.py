@@ -0,0 +1,287 @@
+import asyncio
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import UploadFile
+from logger import get_logger
+from models.files import File
+from models.settings import UploadJobSettings, common_dependencies
+from models.upload_job import UploadJob, UploadJobStatus
+from repository.upload_job.fail_unfinished_upload_jobs import (
+    afail_unfinished_upload_jobs,
+)
+from repository.upload_job.touch_upload_jobs import atouch_upload_jobs
+from repository.upload_job.update_upload_job import aupdate_upload_job
+from starlette.concurrency import run_in_threadpool
+from utils.ingestion import IngestionStats, ingestion_progress
+from utils.metrics import metrics
+from utils.processors import filter_file
+
+logger = get_logger(__name__)
+
+# Minimum delay between two progress writes of the same job
+PROGRESS_UPDATE_INTERVAL = 1.0
+
+INTERRUPTED_MESSAGE = "⚠️ The upload was interrupted, please upload the file again."
+
+
+@dataclass
+class UploadTask:
+    job: UploadJob
+    path: str
+    enable_summarization: bool
+    openai_api_key: Optional[str]
+
+
+class UploadJobQueue:
+    """
+    Local pool of asyncio workers processing the uploaded files in the background.
+    The uploads are spooled to disk so that the request can return immediately,
+    each job then goes through filter_file and reports its progress in upload_jobs.
+    The queue only lives in memory and several API processes may share the host:
+    each one spools into its own subdirectory and keeps the update time of its
+    unfinished jobs fresh. On stop, the jobs still held are failed and the spooled
+    files deleted. On startup, the unfinished jobs not updated for
+    `upload_job_stale_after` seconds, whose process is gone, are failed and the
+    subdirectories left untouched as long are deleted.
+    """
+
+    def __init__(self, settings: Optional[UploadJobSettings] = None):
+        self.settings = settings or UploadJobSettings()
+        self.spool_dir = os.path.join(self.settings.upload_spool_dir, uuid4().hex)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._jobs: Dict[str, UploadJob] = {}
+        self._running = 0
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self._workers:
+                return
+
+            os.makedirs(self.spool_dir, exist_ok=True)
+            await self._fail_abandoned_jobs()
+            self._queue = asyncio.Queue()
+            self._workers = [
+                asyncio.create_task(self._worker(index))
+                for index in range(self.settings.upload_workers)
+            ]
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+            logger.info(f"Started {len(self._workers)} upload workers")
+
+    async def _fail_abandoned_jobs(self) -> None:
+        stale_before = datetime.utcnow() - timedelta(
+            seconds=self.settings.upload_job_stale_after
+        )
+
+        failed: List[str] = []
+        try:
+            failed = await afail_unfinished_upload_jobs(
+                INTERRUPTED_MESSAGE, updated_before=stale_before
+            )
+        except Exception as e:
+            logger.error(f"Error failing the abandoned upload jobs: {e}")
+
+        removed = await run_in_threadpool(self._remove_abandoned_spool_files, stale_before)
+
+        if failed or removed:
+            metrics.increment("upload_jobs.interrupted", len(failed))
+            logger.info(
+                f"Failed {len(failed)} abandoned upload jobs, removed {removed} spool entries"
+            )
+
+    def _remove_abandoned_spool_files(self, stale_before: datetime) -> int:
+        """Delete the spool entries of the other processes not touched since the given time."""
+        removed = 0
+        for entry in os.scandir(self.settings.upload_spool_dir):
+            if (
+                entry.path == self.spool_dir
+                or datetime.utcfromtimestamp(entry.stat().st_mtime) >= stale_before
+            ):
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        return removed
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.upload_job_heartbeat_interval)
+            try:
+                await run_in_threadpool(os.utime, self.spool_dir)
+                if self._jobs:
+                    await atouch_upload_jobs(list(self._jobs))
+            except Exception as e:
+                logger.error(f"Error refreshing the upload jobs of {self.spool_dir}: {e}")
+
+    async def stop(self) -> None:
+        tasks = self._workers + ([self._heartbeat_task] if self._heartbeat_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._heartbeat_task = None
+
+        if self._jobs:
+            try:
+                failed = await afail_unfinished_upload_jobs(
+                    INTERRUPTED_MESSAGE, job_ids=list(self._jobs)
+                )
+                metrics.increment("upload_jobs.interrupted", len(failed))
+            except Exception as e:
+                logger.error(f"Error failing the interrupted upload jobs: {e}")
+            self._jobs = {}
+        await run_in_threadpool(shutil.rmtree, self.spool_dir, True)
+
+    async def submit(
+        self,
+        job: UploadJob,
+        upload_file: UploadFile,
+        enable_summarization: bool,
+        openai_api_key: Optional[str],
+    ) -> None:
+        if not self._workers:
+            await self.start()
+
+        path = os.path.join(
+            self.spool_dir,
+            f"{job.job_id}{os.path.splitext(job.file_name)[-1].lower()}",
+        )
+        await run_in_threadpool(self._spool, upload_file, path)
+        self._jobs[str(job.job_id)] = job
+
+        await self._queue.put(  # pyright: ignore reportPrivateUsage=none
+            UploadTask(job, path, enable_summarization, openai_api_key)
+        )
+        metrics.increment("upload_jobs.submitted")
+
+    @staticmethod
+    def _spool(upload_file: UploadFile, path: str) -> None:
+        upload_file.file.seek(0)
+        with open(path, "wb") as spool_file:
+            shutil.copyfileobj(upload_file.file, spool_file)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            task = await self._queue.get()  # pyright: ignore reportPrivateUsage=none
+            self._running += 1
+            try:
+                await self._run(task)
+            except Exception as e:
+                logger.error(f"Upload worker {index} failed on job {task.job.job_id}: {e}")
+                await self._fail(task.job)
+            else:
+                self._release(task.job)
+            finally:
+                self._running -= 1
+                self._queue.task_done()  # pyright: ignore reportPrivateUsage=none
+                if os.path.exists(task.path):
+                    os.remove(task.path)
+
+    async def _fail(self, job: UploadJob) -> None:
+        """Fail a job its worker could not run, so that it does not stay pending."""
+        try:
+            await afail_unfinished_upload_jobs(
+                f"⚠️ An error occurred while processing {job.file_name}.",
+                job_ids=[job.job_id],
+            )
+        except Exception as e:
+            logger.error(f"Error failing upload job {job.job_id}: {e}")
+        self._release(job)
+
+    def _release(self, job: UploadJob) -> None:
+        # A cancelled worker keeps its job, stop() fails it
+        self._jobs.pop(str(job.job_id), None)
+
+    async def _run(self, task: UploadTask) -> None:
+        job = task.job
+        start_time = time.perf_counter()
+        last_update = 0.0
+        last_stats: List[IngestionStats] = []
+
+        async def report_progress(stats: IngestionStats) -> None:
+            nonlocal last_update
+            last_stats[:] = [stats]
+            if time.monotonic() - last_update < PROGRESS_UPDATE_INTERVAL:
+                return
+            last_update = time.monotonic()
+            await aupdate_upload_job(job.job_id, _progress_fields(stats))
+
+        await aupdate_upload_job(job.job_id, {"status": UploadJobStatus.Running.value})
+        progress_token = ingestion_progress.set(report_progress)
+
+        try:
+            with open(task.path, "rb") as spool_file:
+                file = File(file=UploadFile(filename=job.file_name, file=spool_file))
+                response = await filter_file(
+                    common_dependencies(),
+                    file,
+                    task.enable_summarization,
+                    brain_id=job.brain_id,
+                    openai_api_key=task.openai_api_key,
+                )
+        except Exception as e:
+            logger.error(f"Error processing upload job {job.job_id}: {e}")
+            response = {
+                "message": f"⚠️ An error occurred while processing {job.file_name}.",
+                "type": "error",
+            }
+        finally:
+            ingestion_progress.reset(progress_token)
+
+        status = (
+            UploadJobStatus.Failed
+            if response["type"] == "error"
+            else UploadJobStatus.Done
+        )
+        await aupdate_upload_job(
+            job.job_id,
+            {
+                **(_progress_fields(last_stats[0]) if last_stats else {}),
+                "status": status.value,
+                "message": response["message"],
+                "type": response["type"],
+            },
+        )
+
+        elapsed_time = time.perf_counter() - start_time
+        metrics.observe("upload_jobs.seconds", elapsed_time)
+        metrics.increment(f"upload_jobs.{status.value}")
+        logger.info(f"Upload job {job.job_id} {status.value} in {elapsed_time:.3f} seconds")
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "running": self._running,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+
+def _progress_fields(stats: IngestionStats) -> dict:
+    return {
+        "chunks_parsed": stats.chunks,
+        "chunks_embedded": stats.embedded,
+        "chunks_stored": stats.stored,
+    }
+
+
+_upload_job_queue: Optional[UploadJobQueue] = None
+
+
+def get_upload_job_queue() -> UploadJobQueue:
+    global _upload_job_queue
+
+    if _upload_job_queue is None:
+        _upload_job_queue = UploadJobQueue()
+        metrics.register_collector("upload_jobs", _upload_job_queue.stats)
+
+    return _upload_job_queue
@@ -1,12 +1,10 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import List
-
-from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.schema import Document
 from llm.utils.summarization import llm_summerize
 from logger import get_logger
-from models.settings import BrainSettings, CommonsDep, common_dependencies
+from models.settings import BrainSettings, CommonsDep
 from pydantic import BaseModel
+from vectorstore.embedding_cache import get_embeddings
+from vectorstore.supabase import SupabaseVectorStore
 
 logger = get_logger(__name__)
 
@@ -15,14 +13,24 @@ class Neurons(BaseModel):
     commons: CommonsDep
     settings = BrainSettings()  # pyright: ignore reportPrivateUsage=none
 
+    def _documents_vector_store(self, user_openai_api_key=None) -> SupabaseVectorStore:
+        """
+        The shared vector store, or a store bound to the user's key that still
+        reuses the pooled Supabase client. The shared store is never mutated.
+        """
+        if not user_openai_api_key:
+            return self.commons["documents_vector_store"]
+
+        return SupabaseVectorStore(
+            self.commons["supabase"],
+            get_embeddings(user_openai_api_key),
+            table_name="vectors",
+        )
+
     def create_vector(self, doc, user_openai_api_key=None):
         logger.info("adding new vector for document")
-        if user_openai_api_key:
-            self.commons["documents_vector_store"]._embedding = OpenAIEmbeddings(
-                openai_api_key=user_openai_api_key
-            )  # pyright: ignore reportPrivateUsage=none
         try:
-            sids = self.commons["documents_vector_store"].add_documents([doc])
+            sids = self._documents_vector_store(user_openai_api_key).add_documents([doc])
             if sids and len(sids) > 0:
                 return sids
 
@@ -31,12 +39,8 @@ class Neurons(BaseModel):
 
     def create_vectors(self, doc_array, user_openai_api_key=None):
         logger.info("adding new vector for document")
-        if user_openai_api_key:
-            self.commons["documents_vector_store"]._embedding = OpenAIEmbeddings(
-                openai_api_key=user_openai_api_key
-            )  # pyright: ignore reportPrivateUsage=none
         try:
-            sids = self.commons["documents_vector_store"].add_documents(doc_array)
+            sids = self._documents_vector_store(user_openai_api_key).add_documents(doc_array)
             if sids and len(sids) > 0:
                 return sids
 
@@ -74,59 +78,3 @@ def create_summary(commons: CommonsDep, document_id, content, metadata):
         commons["supabase"].table("summaries").update(
             {"document_id": document_id}
         ).match({"id": sids[0]}).execute()
-
-
-def error_callback(exception):
-    print("An exception occurred:", exception)
-
-
-def process_batch(batch_ids: List[str]):
-    commons = common_dependencies()
-    supabase = commons["supabase"]
-    try:
-        if len(batch_ids) == 1:
-            return (
-                supabase.table("vectors")
-                .select(
-                    "name:metadata->>file_name, size:metadata->>file_size",
-                    count="exact",
-                )
-                .eq("id", batch_ids[0])  # Use parameter binding for single ID
-                .execute()
-            ).data
-        else:
-            return (
-                supabase.table("vectors")
-                .select(
-                    "name:metadata->>file_name, size:metadata->>file_size",
-                    count="exact",
-                )
-                .in_("id", batch_ids)  # Use parameter binding for multiple IDs
-                .execute()
-            ).data
-    except Exception as e:
-        logger.error("Error retrieving batched vectors", e)
-
-
-def get_unique_files_from_vector_ids(vectors_ids: List[str]):
-    # Move into Vectors class
-    """
-    Retrieve unique user data vectors.
-    """
-
-    # constants
-    BATCH_SIZE = 5
-
-    with ThreadPoolExecutor() as executor:
-        futures = []
-        for i in range(0, len(vectors_ids), BATCH_SIZE):
-            batch_ids = vectors_ids[i : i + BATCH_SIZE]
-            future = executor.submit(process_batch, batch_ids)
-            futures.append(future)
-
-        # Retrieve the results
-        vectors_responses = [future.result() for future in futures]
-
-    documents = [item for sublist in vectors_responses for item in sublist]
-    unique_files = [dict(t) for t in set(tuple(d.items()) for d in documents)]
-    return unique_files
@@ -0,0 +1,403 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from logger import get_logger
+from models.chats import SearchFilters
+from models.settings import AnnIndexSettings
+from supabase.client import Client
+from utils.metrics import metrics
+from vectorstore.supabase import CustomSupabaseVectorStore, with_threshold
+
+logger = get_logger(__name__)
+
+# Rows fetched per request when loading a brain from the vectors table
+LOAD_PAGE_SIZE = 1000
+
+
+def _parse_embedding(embedding: Any) -> np.ndarray:
+    # pgvector columns come back from PostgREST as "[0.1,0.2,...]"
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class BrainVectorIndex:
+    """
+    Inverted file (IVF) index over the normalized embeddings of one brain.
+    Rows are assigned to the nearest of ~sqrt(n) k-means centroids and a query
+    only scans the `nprobe` closest lists, so the inner product equals the
+    cosine similarity used by match_vectors. Small brains are scanned exhaustively.
+    """
+
+    def __init__(self, settings: AnnIndexSettings):
+        self.settings = settings
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._documents: List[Document] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._trained_size = 0
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids) - int(self._deleted.sum())
+
+    def add(self, rows: List[Tuple[str, np.ndarray, Document]]) -> None:
+        with self._lock:
+            # Rows already in the index (removed then linked again, or relinked
+            # with new metadata) are overwritten in place and revived
+            known = [row for row in rows if row[0] in self._positions]
+            if known:
+                self._overwrite(known)
+
+            new_rows: Dict[str, Tuple[str, np.ndarray, Document]] = {}
+            for row in rows:
+                if row[0] not in self._positions:
+                    new_rows[row[0]] = row
+            rows = list(new_rows.values())
+            if not rows:
+                return
+
+            vectors = _normalize(np.stack([vector for _, vector, _ in rows]))
+            if self._matrix.size == 0:
+                self._matrix = vectors
+            else:
+                self._matrix = np.vstack([self._matrix, vectors])
+
+            for vector_id, _, document in rows:
+                self._positions[vector_id] = len(self._ids)
+                self._ids.append(vector_id)
+                self._documents.append(document)
+            self._deleted = np.concatenate(
+                [self._deleted, np.zeros(len(rows), dtype=bool)]
+            )
+
+            if self._centroids is not None:
+                self._assignments = np.concatenate(
+                    [self._assignments, self._assign(vectors)]
+                )
+
+            # Train once the brain is big enough, retrain when it has doubled
+            if len(self) >= self.settings.ann_min_ivf_size and (
+                self._centroids is None or len(self) > 2 * self._trained_size
+            ):
+                self._train()
+
+    def _overwrite(self, rows: List[Tuple[str, np.ndarray, Document]]) -> None:
+        positions = np.array([self._positions[vector_id] for vector_id, _, _ in rows])
+        vectors = _normalize(np.stack([vector for _, vector, _ in rows]))
+        self._matrix[positions] = vectors
+        self._deleted[positions] = False
+        for position, (_, _, document) in zip(positions, rows):
+            self._documents[position] = document
+        if self._centroids is not None:
+            self._assignments[positions] = self._assign(vectors)
+
+    def remove(self, vector_ids: List[str]) -> None:
+        with self._lock:
+            for vector_id in vector_ids:
+                position = self._positions.get(str(vector_id))
+                if position is not None:
+                    self._deleted[position] = True
+
+            # Compact once a fifth of the rows are tombstones
+            if self._deleted.sum() > len(self._ids) / 5:
+                self._compact()
+
+    def search(
+        self, query: np.ndarray, k: int, filters: Optional[SearchFilters] = None
+    ) -> List[Tuple[Document, float]]:
+        query = _normalize(query.astype(np.float32))
+
+        with self._lock:
+            if len(self) == 0:
+                return []
+
+            if filters is not None:
+                # Filtered searches scan all the matching rows: a narrow filter
+                # would leave too few of them in the probed lists
+                candidates = np.flatnonzero(
+                    ~self._deleted
+                    & np.fromiter(
+                        (filters.matches(document.metadata) for document in self._documents),
+                        dtype=bool,
+                        count=len(self._documents),
+                    )
+                )
+            elif self._centroids is None:
+                candidates = np.flatnonzero(~self._deleted)
+            else:
+                nprobe = min(self.settings.ann_nprobe, len(self._centroids))
+                closest_lists = np.argsort(-(self._centroids @ query))[:nprobe]
+                candidates = np.flatnonzero(
+                    np.isin(self._assignments, closest_lists) & ~self._deleted
+                )
+
+            scores = self._matrix[candidates] @ query
+            top = np.argsort(-scores)[:k]
+            if filters is not None and filters.min_similarity is not None:
+                top = top[scores[top] >= filters.min_similarity]
+
+            return [
+                (self._documents[candidates[index]], float(scores[index]))
+                for index in top
+            ]
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(
+            vectors @ self._centroids.T, axis=1  # pyright: ignore reportPrivateUsage=none
+        ).astype(np.int32)
+
+    def _train(self) -> None:
+        start_time = time.perf_counter()
+        live = self._matrix[~self._deleted]
+        n_lists = max(1, int(np.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+
+        # Spherical k-means on a sample, enough to get balanced lists
+        sample = live[rng.choice(len(live), min(len(live), 256 * n_lists), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(self.settings.ann_train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for list_index in range(n_lists):
+                members = sample[labels == list_index]
+                if len(members):
+                    centroids[list_index] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        self._centroids = centroids
+        self._assignments = self._assign(self._matrix)
+        self._trained_size = len(live)
+        metrics.observe("ann_index.train_seconds", time.perf_counter() - start_time)
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(~self._deleted)
+        self._ids = [self._ids[index] for index in keep]
+        self._documents = [self._documents[index] for index in keep]
+        self._positions = {vector_id: index for index, vector_id in enumerate(self._ids)}
+        self._matrix = self._matrix[keep]
+        self._deleted = np.zeros(len(keep), dtype=bool)
+        if self._centroids is not None:
+            self._assignments = self._assignments[keep]
+
+
+class AnnIndexRegistry:
+    """
+    Per-brain indexes of the process, built from the vectors table on first use
+    and kept up to date by Brain.create_brain_vectors and Brain.delete_file_from_brain.
+    Indexes are evicted in LRU order and rebuilt after `ann_index_ttl` seconds to pick up
+    the changes made by other processes.
+    """
+
+    def __init__(self, settings: Optional[AnnIndexSettings] = None):
+        self.settings = settings or AnnIndexSettings()
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[str, BrainVectorIndex]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def get(self, client: Client, brain_id: str) -> BrainVectorIndex:
+        brain_id = str(brain_id)
+
+        with self._lock:
+            index = self._indexes.get(brain_id)
+            if index is not None and not self._expired(index):
+                self._indexes.move_to_end(brain_id)
+                return index
+            loading_lock = self._loading.setdefault(brain_id, threading.Lock())
+
+        # Only one thread loads a given brain, the others wait for it
+        with loading_lock:
+            with self._lock:
+                index = self._indexes.get(brain_id)
+                if index is not None and not self._expired(index):
+                    return index
+
+            index = self._load(client, brain_id)
+
+            with self._lock:
+                self._indexes[brain_id] = index
+                self._indexes.move_to_end(brain_id)
+                while len(self._indexes) > self.settings.ann_index_max_brains:
+                    self._indexes.popitem(last=False)
+
+        return index
+
+    def add_vectors(self, client: Client, brain_id: str, vector_ids: List[str]) -> None:
+        """Add vectors linked to a brain, if the index of that brain is loaded."""
+        index = self._loaded(brain_id)
+        if index is None or not vector_ids:
+            return
+
+        response = (
+            client.table("vectors")
+            .select("id, content, metadata, embedding")
+            .in_("id", [str(vector_id) for vector_id in vector_ids])
+            .execute()
+        )
+        index.add([self._row(item) for item in response.data])
+
+    def remove_vectors(self, brain_id: str, vector_ids: List[str]) -> None:
+        """Remove vectors unlinked from a brain, if the index of that brain is loaded."""
+        index = self._loaded(brain_id)
+        if index is not None:
+            index.remove([str(vector_id) for vector_id in vector_ids])
+
+    def drop(self, brain_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(str(brain_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            indexes = dict(self._indexes)
+        return {
+            "brains": len(indexes),
+            "vectors": sum(len(index) for index in indexes.values()),
+        }
+
+    def _loaded(self, brain_id: str) -> Optional[BrainVectorIndex]:
+        with self._lock:
+            return self._indexes.get(str(brain_id))
+
+    def _expired(self, index: BrainVectorIndex) -> bool:
+        return time.monotonic() - index.loaded_at > self.settings.ann_index_ttl
+
+    @staticmethod
+    def _row(item: dict) -> Tuple[str, np.ndarray, Document]:
+        return (
+            str(item["id"]),
+            _parse_embedding(item["embedding"]),
+            Document(page_content=item.get("content") or "", metadata=item.get("metadata") or {}),
+        )
+
+    def _load(self, client: Client, brain_id: str) -> BrainVectorIndex:
+        start_time = time.perf_counter()
+        index = BrainVectorIndex(self.settings)
+        rows = []
+        offset = 0
+
+        while True:
+            response = (
+                client.from_("brains_vectors")
+                .select("vector_id, vectors(id, content, metadata, embedding)")
+                .filter("brain_id", "eq", brain_id)
+                # A stable order, served by the primary key, so the pages neither skip nor repeat rows
+                .order("vector_id")
+                .range(offset, offset + LOAD_PAGE_SIZE - 1)
+                .execute()
+            )
+            rows.extend(self._row(item["vectors"]) for item in response.data if item.get("vectors"))
+            if len(response.data) < LOAD_PAGE_SIZE:
+                break
+            offset += LOAD_PAGE_SIZE
+
+        if rows:
+            index.add(rows)
+
+        elapsed_time = time.perf_counter() - start_time
+        metrics.observe("ann_index.load_seconds", elapsed_time)
+        logger.info(f"Loaded ANN index of brain {brain_id} with {len(rows)} vectors in {elapsed_time:.3f} seconds")
+        return index
+
+
+_ann_index_registry: Optional[AnnIndexRegistry] = None
+_ann_index_registry_lock = threading.Lock()
+
+
+def get_ann_index_registry() -> AnnIndexRegistry:
+    global _ann_index_registry
+
+    if _ann_index_registry is None:
+        with _ann_index_registry_lock:
+            if _ann_index_registry is None:
+                _ann_index_registry = AnnIndexRegistry()
+                metrics.register_collector("ann_index", _ann_index_registry.stats)
+
+    return _ann_index_registry
+
+
+class AnnVectorStore(CustomSupabaseVectorStore):
+    """A vector store answering similarity searches from the in-process index of the brain."""
+
+    def __init__(
+        self,
+        client: Client,
+        embedding: Embeddings,
+        table_name: str,
+        brain_id: str = "none",
+        registry: Optional[AnnIndexRegistry] = None,
+    ):
+        super().__init__(client, embedding, table_name, brain_id)
+        self.registry = registry or get_ann_index_registry()
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 6,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k=k, filters=filters
+        )
+
+    def similarity_search_by_vector_with_score(
+        self,
+        query_embedding: List[float],
+        k: int = 6,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        index = self.registry.get(self._client, self.brain_id)
+
+        with metrics.timer("ann_index.search_seconds"):
+            return index.search(
+                np.asarray(query_embedding, dtype=np.float32), k, filters=filters
+            )
+
+    def similarity_search(
+        self,
+        query: str,
+        table: str = "match_vectors",
+        k: int = 6,
+        threshold: Optional[float] = None,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score(
+                query, k=k, filters=with_threshold(filters, threshold)
+            )
+        ]
+
+    def similarity_search_by_vector(
+        self,
+        query_embedding: List[float],
+        table: str = "match_vectors",
+        k: int = 6,
+        threshold: Optional[float] = None,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_by_vector_with_score(
+                query_embedding, k=k, filters=with_threshold(filters, threshold)
+            )
+        ]
@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain.embeddings.base import Embeddings
+from langchain.embeddings.openai import OpenAIEmbeddings
+from logger import get_logger
+from models.settings import EmbeddingCacheSettings
+from utils.file import compute_sha1_from_content
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+CacheKey = Tuple[str, str]  # (model, sha1 of the text)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store with two tiers:
+    - an in-process LRU holding the most recently used vectors
+    - an optional SQLite file shared by the workers of the host
+    """
+
+    def __init__(self, max_size: int = 10000, path: Optional[str] = None):
+        self.max_size = max_size
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[CacheKey, List[float]]" = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+
+        if path:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_sha1 TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    PRIMARY KEY (model, text_sha1)
+                )
+                """
+            )
+            self._connection.commit()
+
+    def get_many(self, keys: List[CacheKey]) -> Dict[CacheKey, List[float]]:
+        found: Dict[CacheKey, List[float]] = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+        metrics.increment("embedding_cache.memory_hits", len(found))
+
+        missing = [key for key in keys if key not in found]
+        if missing and self._connection is not None:
+            from_disk = self._read(missing)
+            metrics.increment("embedding_cache.disk_hits", len(from_disk))
+            self._remember(from_disk)
+            found.update(from_disk)
+
+        metrics.increment("embedding_cache.misses", len(set(keys) - set(found)))
+        return found
+
+    def set_many(self, items: Dict[CacheKey, List[float]]) -> None:
+        self._remember(items)
+        if items and self._connection is not None:
+            self._write(items)
+
+    def _remember(self, items: Dict[CacheKey, List[float]]) -> None:
+        with self._lock:
+            for key, embedding in items.items():
+                self._memory[key] = embedding
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _read(self, keys: List[CacheKey]) -> Dict[CacheKey, List[float]]:
+        found = {}
+        try:
+            with self._lock:
+                for model, text_sha1 in keys:
+                    row = self._connection.execute(  # pyright: ignore reportPrivateUsage=none
+                        "SELECT embedding FROM embeddings WHERE model = ? AND text_sha1 = ?",
+                        (model, text_sha1),
+                    ).fetchone()
+                    if row is not None:
+                        found[(model, text_sha1)] = array("f", row[0]).tolist()
+        except sqlite3.Error as e:
+            # Treat an unreadable cache as a miss, the texts are embedded again
+            logger.error(f"Error reading embeddings from cache {self.path}: {e}")
+        return found
+
+    def _write(self, items: Dict[CacheKey, List[float]]) -> None:
+        try:
+            with self._lock:
+                self._connection.executemany(  # pyright: ignore reportPrivateUsage=none
+                    "INSERT OR REPLACE INTO embeddings (model, text_sha1, embedding) VALUES (?, ?, ?)",
+                    [
+                        (model, text_sha1, array("f", embedding).tobytes())
+                        for (model, text_sha1), embedding in items.items()
+                    ],
+                )
+                self._connection.commit()  # pyright: ignore reportPrivateUsage=none
+        except sqlite3.Error as e:
+            # The cache is an optimisation, never fail an embedding because of it
+            logger.error(f"Error writing embeddings to cache {self.path}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            memory_size = len(self._memory)
+        hits = metrics.get_counter("embedding_cache.memory_hits") + metrics.get_counter(
+            "embedding_cache.disk_hits"
+        )
+        misses = metrics.get_counter("embedding_cache.misses")
+
+        return {
+            "memory_size": memory_size,
+            "memory_max_size": self.max_size,
+            "persistent": self.path,
+            "memory_hits": metrics.get_counter("embedding_cache.memory_hits"),
+            "disk_hits": metrics.get_counter("embedding_cache.disk_hits"),
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper only sending the texts that were never embedded
+    with the same model to the underlying embeddings.
+    """
+
+    def __init__(self, embeddings: OpenAIEmbeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    @property
+    def model(self) -> str:
+        return self.embeddings.model
+
+    def _key(self, text: str) -> CacheKey:
+        return (self.model, compute_sha1_from_content(text.encode("utf-8")))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Embed each missing text only once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), embedded))
+            self.cache.set_many(new_items)
+            found.update(new_items)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+
+        embedding = self.embeddings.embed_query(text)
+        self.cache.set_many({key: embedding})
+        return embedding
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                settings = EmbeddingCacheSettings()
+                _embedding_cache = EmbeddingCache(
+                    max_size=settings.embedding_cache_size,
+                    path=settings.embedding_cache_path or None,
+                )
+                metrics.register_collector("embedding_cache", _embedding_cache.stats)
+
+    return _embedding_cache
+
+
+def get_embeddings(openai_api_key: str) -> Embeddings:
+    """
+    OpenAI embeddings for the given key, behind the shared cache unless it is disabled.
+    """
+    embeddings = OpenAIEmbeddings(
+        openai_api_key=openai_api_key
+    )  # pyright: ignore reportPrivateUsage=none
+
+    if not EmbeddingCacheSettings().embedding_cache_enabled:
+        return embeddings
+
+    return CachedEmbeddings(embeddings, get_embedding_cache())
@@ -0,0 +1,28 @@
+from langchain.embeddings.base import Embeddings
+from supabase.client import Client
+from vectorstore.ann_index import AnnVectorStore
+from vectorstore.hybrid import HybridVectorStore
+from vectorstore.supabase import CustomSupabaseVectorStore
+
+RETRIEVAL_BACKENDS = {
+    "supabase": CustomSupabaseVectorStore,
+    "ann": AnnVectorStore,
+    "hybrid": HybridVectorStore,
+}
+
+
+def get_brain_vector_store(
+    client: Client,
+    embeddings: Embeddings,
+    brain_id: str,
+    backend: str = "supabase",
+) -> CustomSupabaseVectorStore:
+    """
+    Vector store searching the vectors of a brain with the given retrieval backend.
+    """
+    if backend not in RETRIEVAL_BACKENDS:
+        raise ValueError(f"Unknown retrieval backend {backend}")
+
+    return RETRIEVAL_BACKENDS[backend](
+        client, embeddings, table_name="vectors", brain_id=brain_id
+    )
@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from logger import get_logger
+from models.chats import SearchFilters
+from models.settings import HybridSearchSettings
+from supabase.client import Client
+from utils.metrics import metrics
+from vectorstore.supabase import CustomSupabaseVectorStore, with_threshold
+
+logger = get_logger(__name__)
+
+# The lexical and vector searches of a query run side by side
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Tuple[str, Document]]], k: int = 60
+) -> List[Tuple[Document, float]]:
+    """
+    Merge rankings of (id, document) with reciprocal rank fusion: each document scores
+    the sum of 1 / (k + rank) over the rankings it appears in.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+
+    for ranking in rankings:
+        for rank, (document_id, document) in enumerate(ranking, start=1):
+            scores[document_id] = scores.get(document_id, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(document_id, document)
+
+    return [
+        (documents[document_id], score)
+        for document_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+class HybridVectorStore(CustomSupabaseVectorStore):
+    """
+    Vector store fusing the cosine similarity search of match_vectors with the
+    full-text search of match_vectors_lexical, so that exact citations such as
+    "42 U.S.C. § 7401" are found even when their embedding is not the closest.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        embedding: Embeddings,
+        table_name: str,
+        brain_id: str = "none",
+        settings: Optional[HybridSearchSettings] = None,
+    ):
+        super().__init__(client, embedding, table_name, brain_id)
+        self.settings = settings or HybridSearchSettings()
+
+    def similarity_search(
+        self,
+        query: str,
+        table: str = "match_vectors",
+        k: int = 6,
+        threshold: Optional[float] = None,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        query_embedding = self._embedding.embed_documents([query])[0]
+        return [
+            doc
+            for doc, _ in self.similarity_search_by_vector_with_score(
+                query_embedding,
+                table=table,
+                k=k,
+                query=query,
+                filters=with_threshold(filters, threshold),
+            )
+        ]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        query_embedding: List[float],
+        table: str = "match_vectors",
+        k: int = 6,
+        query: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """
+        Without the text of the query only the vector side can run.
+        The scores of the fused results are their reciprocal rank fusion scores,
+        and the minimum similarity of the filters only applies to the vector side.
+        """
+        if not query:
+            return super().similarity_search_by_vector_with_score(
+                query_embedding, table=table, k=k, filters=filters
+            )
+
+        filter_params = filters.to_rpc_params() if filters else {}
+        lexical_filter_params = {
+            name: value for name, value in filter_params.items() if name != "p_min_similarity"
+        }
+
+        candidates = max(k, self.settings.hybrid_candidates)
+        with metrics.timer("hybrid_search.search_seconds"):
+            vector_future = _search_executor.submit(
+                self._ranking,
+                table,
+                {"query_embedding": query_embedding, **filter_params},
+                candidates,
+            )
+            lexical_future = _search_executor.submit(
+                self._ranking,
+                "match_vectors_lexical",
+                {"query_text": query, **lexical_filter_params},
+                candidates,
+            )
+            vector_ranking = vector_future.result()
+            lexical_ranking = lexical_future.result()
+
+        metrics.increment("hybrid_search.lexical_results", len(lexical_ranking))
+        return reciprocal_rank_fusion(
+            [vector_ranking, lexical_ranking], k=self.settings.hybrid_rrf_k
+        )[:k]
+
+    def _ranking(self, function: str, params: dict, k: int) -> List[Tuple[str, Document]]:
+        res = self._client.rpc(
+            function,
+            {**params, "match_count": k, "p_brain_id": str(self.brain_id)},
+        ).execute()
+
+        return [
+            (
+                str(search["id"]),
+                Document(
+                    metadata=search.get("metadata", {}),  # type: ignore
+                    page_content=search.get("content", ""),
+                ),
+            )
+            for search in res.data
+            if search.get("content")
+        ]
@@ -1,11 +1,24 @@
-from typing import Any, List
+from typing import Any, List, Optional, Tuple
 
 from langchain.docstore.document import Document
-from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
 from langchain.vectorstores import SupabaseVectorStore
+from models.chats import SearchFilters
 from supabase.client import Client
 
 
+def with_threshold(
+    filters: Optional[SearchFilters], threshold: Optional[float]
+) -> Optional[SearchFilters]:
+    """
+    The filters with the threshold of the similarity_search interface as their minimum
+    similarity, unless the filters already set one.
+    """
+    if threshold is None or (filters is not None and filters.min_similarity is not None):
+        return filters
+    return (filters or SearchFilters()).copy(update={"min_similarity": threshold})
+
+
 class CustomSupabaseVectorStore(SupabaseVectorStore):
     """A custom vector store that uses the match_vectors table instead of the vectors table."""
 
@@ -14,7 +27,7 @@ class CustomSupabaseVectorStore(SupabaseVectorStore):
     def __init__(
         self,
         client: Client,
-        embedding: OpenAIEmbeddings,
+        embedding: Embeddings,
         table_name: str,
         brain_id: str = "none",
     ):
@@ -26,21 +39,54 @@ class CustomSupabaseVectorStore(SupabaseVectorStore):
         query: str,
         table: str = "match_vectors",
         k: int = 6,
-        threshold: float = 0.5,
+        threshold: Optional[float] = None,
+        filters: Optional[SearchFilters] = None,
         **kwargs: Any
     ) -> List[Document]:
         vectors = self._embedding.embed_documents([query])
-        query_embedding = vectors[0]
+        return self.similarity_search_by_vector(
+            vectors[0], table=table, k=k, threshold=threshold, filters=filters
+        )
+
+    def similarity_search_by_vector(
+        self,
+        query_embedding: List[float],
+        table: str = "match_vectors",
+        k: int = 6,
+        threshold: Optional[float] = None,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        match_result = self.similarity_search_by_vector_with_score(
+            query_embedding,
+            table=table,
+            k=k,
+            filters=with_threshold(filters, threshold),
+        )
+
+        documents = [doc for doc, _ in match_result]
+
+        return documents
+
+    def similarity_search_by_vector_with_score(
+        self,
+        query_embedding: List[float],
+        table: str = "match_vectors",
+        k: int = 6,
+        filters: Optional[SearchFilters] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
         res = self._client.rpc(
             table,
             {
                 "query_embedding": query_embedding,
                 "match_count": k,
                 "p_brain_id": str(self.brain_id),
+                **(filters.to_rpc_params() if filters else {}),
             },
         ).execute()
 
-        match_result = [
+        return [
             (
                 Document(
                     metadata=search.get("metadata", {}),  # type: ignore
@@ -51,7 +97,3 @@ class CustomSupabaseVectorStore(SupabaseVectorStore):
             for search in res.data
             if search.get("content")
         ]
-
-        documents = [doc for doc, _ in match_result]
-
-        return documents
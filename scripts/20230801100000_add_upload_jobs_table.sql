@@ -0,0 +1,28 @@
+BEGIN;
+
+-- Create upload jobs table
+CREATE TABLE IF NOT EXISTS upload_jobs (
+  job_id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  user_id UUID REFERENCES auth.users (id),
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  file_name TEXT,
+  status VARCHAR(32) DEFAULT 'pending',
+  chunks_parsed INT DEFAULT 0,
+  chunks_embedded INT DEFAULT 0,
+  chunks_stored INT DEFAULT 0,
+  message TEXT,
+  type VARCHAR(32),
+  creation_time TIMESTAMP DEFAULT current_timestamp,
+  update_time TIMESTAMP DEFAULT current_timestamp
+);
+
+CREATE INDEX IF NOT EXISTS upload_jobs_user_id_idx ON upload_jobs (user_id);
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801100000_add_upload_jobs_table'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801100000_add_upload_jobs_table'
+);
+
+COMMIT;
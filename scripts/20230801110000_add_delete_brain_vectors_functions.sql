@@ -0,0 +1,53 @@
+BEGIN;
+
+-- Indexes used to find the vectors of a file and the brains still referencing a vector
+CREATE INDEX IF NOT EXISTS vectors_file_name_idx ON vectors ((metadata->>'file_name'));
+CREATE INDEX IF NOT EXISTS brains_vectors_vector_id_idx ON brains_vectors (vector_id);
+
+-- Unlink vectors from a brain and delete the ones no other brain references
+CREATE OR REPLACE FUNCTION delete_brain_vectors(p_brain_id UUID, p_vector_ids UUID[])
+RETURNS TABLE(unlinked_count INT, deleted_vectors_count INT) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_unlinked_count INT;
+    v_deleted_vectors_count INT;
+BEGIN
+    DELETE FROM brains_vectors
+    WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.vector_id = ANY(p_vector_ids);
+    GET DIAGNOSTICS v_unlinked_count = ROW_COUNT;
+
+    DELETE FROM vectors
+    WHERE vectors.id = ANY(p_vector_ids)
+      AND NOT EXISTS (SELECT 1 FROM brains_vectors WHERE brains_vectors.vector_id = vectors.id);
+    GET DIAGNOSTICS v_deleted_vectors_count = ROW_COUNT;
+
+    RETURN QUERY SELECT v_unlinked_count, v_deleted_vectors_count;
+END;
+$$;
+
+-- Remove all the vectors of a file from a brain
+CREATE OR REPLACE FUNCTION delete_file_from_brain(p_brain_id UUID, p_file_name TEXT)
+RETURNS TABLE(vector_ids UUID[], unlinked_count INT, deleted_vectors_count INT) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_vector_ids UUID[];
+BEGIN
+    SELECT COALESCE(array_agg(brains_vectors.vector_id), '{}') INTO v_vector_ids
+    FROM brains_vectors
+    INNER JOIN vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id AND vectors.metadata->>'file_name' = p_file_name;
+
+    RETURN QUERY
+    SELECT v_vector_ids, deleted.unlinked_count, deleted.deleted_vectors_count
+    FROM delete_brain_vectors(p_brain_id, v_vector_ids) AS deleted;
+END;
+$$;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801110000_add_delete_brain_vectors_functions'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801110000_add_delete_brain_vectors_functions'
+);
+
+COMMIT;
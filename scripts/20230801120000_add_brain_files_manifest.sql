@@ -0,0 +1,89 @@
+BEGIN;
+
+-- No links may be added or removed while the manifest is backfilled
+LOCK TABLE brains_vectors IN SHARE ROW EXCLUSIVE MODE;
+
+-- Create brain files manifest, maintained from brains_vectors by triggers
+CREATE TABLE IF NOT EXISTS brain_files (
+  brain_id UUID,
+  file_sha1 TEXT,
+  file_name TEXT,
+  size BIGINT DEFAULT 0,
+  chunk_count INT DEFAULT 0,
+  PRIMARY KEY (brain_id, file_sha1),
+  FOREIGN KEY (brain_id) REFERENCES brains (brain_id) ON DELETE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION brain_files_after_insert()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO brain_files (brain_id, file_sha1, file_name, size, chunk_count)
+    SELECT
+        new_rows.brain_id,
+        COALESCE(new_rows.file_sha1, ''),
+        MAX(vectors.metadata->>'file_name'),
+        MAX((vectors.metadata->>'file_size')::NUMERIC)::BIGINT,
+        COUNT(*)
+    FROM new_rows
+    INNER JOIN vectors ON vectors.id = new_rows.vector_id
+    GROUP BY new_rows.brain_id, COALESCE(new_rows.file_sha1, '')
+    ON CONFLICT (brain_id, file_sha1)
+    DO UPDATE SET chunk_count = brain_files.chunk_count + EXCLUDED.chunk_count;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION brain_files_after_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE brain_files
+    SET chunk_count = brain_files.chunk_count - removed.chunk_count
+    FROM (
+        SELECT brain_id, COALESCE(file_sha1, '') AS file_sha1, COUNT(*) AS chunk_count
+        FROM old_rows
+        GROUP BY brain_id, COALESCE(file_sha1, '')
+    ) AS removed
+    WHERE brain_files.brain_id = removed.brain_id AND brain_files.file_sha1 = removed.file_sha1;
+
+    DELETE FROM brain_files
+    WHERE brain_files.chunk_count <= 0
+      AND (brain_files.brain_id, brain_files.file_sha1) IN (
+          SELECT brain_id, COALESCE(file_sha1, '') FROM old_rows
+      );
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS brain_files_insert ON brains_vectors;
+CREATE TRIGGER brain_files_insert
+AFTER INSERT ON brains_vectors
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION brain_files_after_insert();
+
+DROP TRIGGER IF EXISTS brain_files_delete ON brains_vectors;
+CREATE TRIGGER brain_files_delete
+AFTER DELETE ON brains_vectors
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION brain_files_after_delete();
+
+-- Backfill the manifest from the existing links
+INSERT INTO brain_files (brain_id, file_sha1, file_name, size, chunk_count)
+SELECT
+    brains_vectors.brain_id,
+    COALESCE(brains_vectors.file_sha1, ''),
+    MAX(vectors.metadata->>'file_name'),
+    MAX((vectors.metadata->>'file_size')::NUMERIC)::BIGINT,
+    COUNT(*)
+FROM brains_vectors
+INNER JOIN vectors ON vectors.id = brains_vectors.vector_id
+GROUP BY brains_vectors.brain_id, COALESCE(brains_vectors.file_sha1, '')
+ON CONFLICT (brain_id, file_sha1) DO NOTHING;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801120000_add_brain_files_manifest'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801120000_add_brain_files_manifest'
+);
+
+COMMIT;
@@ -0,0 +1,17 @@
+BEGIN;
+
+-- Rolling summary of the messages older than the history window
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS history_summary TEXT;
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS summarized_until TIMESTAMP;
+
+-- Index used to fetch the most recent messages of a chat
+CREATE INDEX IF NOT EXISTS chat_history_chat_id_message_time_idx ON chat_history (chat_id, message_time DESC);
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801130000_add_chat_history_summary'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801130000_add_chat_history_summary'
+);
+
+COMMIT;
@@ -0,0 +1,53 @@
+BEGIN;
+
+-- Full-text search over the chunks, for the lexical side of the hybrid retrieval
+ALTER TABLE vectors ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS vectors_content_tsv_idx ON vectors USING GIN (content_tsv);
+
+CREATE OR REPLACE FUNCTION match_vectors_lexical(query_text TEXT, match_count INT, p_brain_id UUID)
+RETURNS TABLE(
+    id UUID,
+    brain_id UUID,
+    content TEXT,
+    metadata JSONB,
+    rank FLOAT
+) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    lexical_query TSQUERY;
+BEGIN
+    -- Any of the words of the query: the cover density ranking favours the chunks matching most of them, close together
+    lexical_query := replace(plainto_tsquery('english', query_text)::TEXT, ' & ', ' | ')::TSQUERY;
+    IF numnode(lexical_query) = 0 THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        vectors.id,
+        brains_vectors.brain_id,
+        vectors.content,
+        vectors.metadata,
+        ts_rank_cd(vectors.content_tsv, lexical_query)::FLOAT AS rank
+    FROM
+        vectors
+    INNER JOIN
+        brains_vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id
+        AND vectors.content_tsv @@ lexical_query
+    ORDER BY
+        rank DESC
+    LIMIT match_count;
+END;
+$$;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801140000_add_vectors_full_text_search'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801140000_add_vectors_full_text_search'
+);
+
+COMMIT;
@@ -0,0 +1,116 @@
+BEGIN;
+
+-- Filters are new parameters: drop the previous signatures so that PostgREST does not see overloads
+DROP FUNCTION IF EXISTS match_vectors(VECTOR(1536), INT, UUID);
+DROP FUNCTION IF EXISTS match_vectors_lexical(TEXT, INT, UUID);
+
+CREATE OR REPLACE FUNCTION match_vectors(
+    query_embedding VECTOR(1536),
+    match_count INT,
+    p_brain_id UUID,
+    p_file_sha1s TEXT[] DEFAULT NULL,
+    p_date_from TEXT DEFAULT NULL,
+    p_date_to TEXT DEFAULT NULL,
+    p_file_name_prefix TEXT DEFAULT NULL,
+    p_file_extensions TEXT[] DEFAULT NULL,
+    p_min_similarity FLOAT DEFAULT NULL
+)
+RETURNS TABLE(
+    id UUID,
+    brain_id UUID,
+    content TEXT,
+    metadata JSONB,
+    embedding VECTOR(1536),
+    similarity FLOAT
+) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    SELECT
+        vectors.id,
+        brains_vectors.brain_id,
+        vectors.content,
+        vectors.metadata,
+        vectors.embedding,
+        1 - (vectors.embedding <=> query_embedding) AS similarity
+    FROM
+        vectors
+    INNER JOIN
+        brains_vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id
+        -- Optional filters, dates are the YYYYMMDD ingestion dates of the metadata
+        AND (p_file_sha1s IS NULL OR brains_vectors.file_sha1 = ANY(p_file_sha1s))
+        AND (p_date_from IS NULL OR vectors.metadata->>'date' >= p_date_from)
+        AND (p_date_to IS NULL OR vectors.metadata->>'date' <= p_date_to)
+        AND (p_file_name_prefix IS NULL OR starts_with(vectors.metadata->>'file_name', p_file_name_prefix))
+        AND (p_file_extensions IS NULL OR lower(substring(vectors.metadata->>'file_name' FROM '\.[^.]*$')) = ANY(p_file_extensions))
+        AND (p_min_similarity IS NULL OR 1 - (vectors.embedding <=> query_embedding) >= p_min_similarity)
+    ORDER BY
+        vectors.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION match_vectors_lexical(
+    query_text TEXT,
+    match_count INT,
+    p_brain_id UUID,
+    p_file_sha1s TEXT[] DEFAULT NULL,
+    p_date_from TEXT DEFAULT NULL,
+    p_date_to TEXT DEFAULT NULL,
+    p_file_name_prefix TEXT DEFAULT NULL,
+    p_file_extensions TEXT[] DEFAULT NULL
+)
+RETURNS TABLE(
+    id UUID,
+    brain_id UUID,
+    content TEXT,
+    metadata JSONB,
+    rank FLOAT
+) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    lexical_query TSQUERY;
+BEGIN
+    -- Any of the words of the query: the cover density ranking favours the chunks matching most of them, close together
+    lexical_query := replace(plainto_tsquery('english', query_text)::TEXT, ' & ', ' | ')::TSQUERY;
+    IF numnode(lexical_query) = 0 THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        vectors.id,
+        brains_vectors.brain_id,
+        vectors.content,
+        vectors.metadata,
+        ts_rank_cd(vectors.content_tsv, lexical_query)::FLOAT AS rank
+    FROM
+        vectors
+    INNER JOIN
+        brains_vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id
+        AND vectors.content_tsv @@ lexical_query
+        -- Same optional filters as match_vectors
+        AND (p_file_sha1s IS NULL OR brains_vectors.file_sha1 = ANY(p_file_sha1s))
+        AND (p_date_from IS NULL OR vectors.metadata->>'date' >= p_date_from)
+        AND (p_date_to IS NULL OR vectors.metadata->>'date' <= p_date_to)
+        AND (p_file_name_prefix IS NULL OR starts_with(vectors.metadata->>'file_name', p_file_name_prefix))
+        AND (p_file_extensions IS NULL OR lower(substring(vectors.metadata->>'file_name' FROM '\.[^.]*$')) = ANY(p_file_extensions))
+    ORDER BY
+        rank DESC
+    LIMIT match_count;
+END;
+$$;
+
+-- Narrow the searches of a brain to some of its files
+CREATE INDEX IF NOT EXISTS brains_vectors_brain_id_file_sha1_idx ON brains_vectors (brain_id, file_sha1);
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801150000_add_search_filters'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801150000_add_search_filters'
+);
+
+COMMIT;
@@ -0,0 +1,61 @@
+BEGIN;
+
+-- Chunks of a file in a brain, diffed by content hash against a new version of the file
+CREATE OR REPLACE FUNCTION get_brain_file_chunks(p_brain_id UUID, p_file_name TEXT)
+RETURNS TABLE(vector_id UUID, file_sha1 TEXT, chunk_sha1 TEXT) LANGUAGE sql STABLE AS $$
+    SELECT brains_vectors.vector_id, brains_vectors.file_sha1, vectors.metadata->>'chunk_sha1'
+    FROM brains_vectors
+    INNER JOIN vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id AND vectors.metadata->>'file_name' = p_file_name;
+$$;
+
+-- Move unchanged chunks of a file to its new version without embedding them again:
+-- the vectors only linked to this brain get the new metadata, the ones shared with
+-- other brains are copied with their embedding so the other brains keep the old version
+CREATE OR REPLACE FUNCTION relink_file_vectors(
+    p_brain_id UUID,
+    p_file_sha1 TEXT,
+    p_vector_ids UUID[],
+    p_metadata JSONB[]
+)
+RETURNS TABLE(old_vector_id UUID, vector_id UUID) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_vector_ids UUID[] := '{}';
+    v_vector_id UUID;
+BEGIN
+    FOR i IN 1 .. COALESCE(array_length(p_vector_ids, 1), 0) LOOP
+        IF EXISTS (
+            SELECT 1 FROM brains_vectors
+            WHERE brains_vectors.vector_id = p_vector_ids[i] AND brains_vectors.brain_id <> p_brain_id
+        ) THEN
+            INSERT INTO vectors (content, metadata, embedding)
+            SELECT vectors.content, p_metadata[i], vectors.embedding
+            FROM vectors
+            WHERE vectors.id = p_vector_ids[i]
+            RETURNING vectors.id INTO v_vector_id;
+        ELSE
+            UPDATE vectors SET metadata = p_metadata[i] WHERE vectors.id = p_vector_ids[i];
+            v_vector_id := p_vector_ids[i];
+        END IF;
+        v_vector_ids := v_vector_ids || v_vector_id;
+    END LOOP;
+
+    -- Delete and insert the links so that the brain_files triggers move them to the new version
+    DELETE FROM brains_vectors
+    WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.vector_id = ANY(p_vector_ids);
+    INSERT INTO brains_vectors (brain_id, vector_id, file_sha1)
+    SELECT p_brain_id, unnest(v_vector_ids), p_file_sha1;
+
+    RETURN QUERY SELECT unnest(p_vector_ids), unnest(v_vector_ids);
+END;
+$$;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801160000_add_incremental_reingestion'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801160000_add_incremental_reingestion'
+);
+
+COMMIT;
@@ -0,0 +1,23 @@
+BEGIN;
+
+-- State of the pages crawled into each brain, to re-crawl them with conditional requests
+CREATE TABLE IF NOT EXISTS crawl_state (
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  url TEXT,
+  etag TEXT,
+  last_modified TEXT,
+  content_sha1 TEXT,
+  links TEXT[] DEFAULT '{}',
+  vector_ids UUID[] DEFAULT '{}',
+  crawl_time TIMESTAMP DEFAULT current_timestamp,
+  PRIMARY KEY (brain_id, url)
+);
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801170000_add_crawl_state'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801170000_add_crawl_state'
+);
+
+COMMIT;
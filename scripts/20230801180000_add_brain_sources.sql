@@ -0,0 +1,60 @@
+BEGIN;
+
+-- Websites and GitHub repositories re-synced into a brain on a schedule
+CREATE TABLE IF NOT EXISTS brain_sources (
+  source_id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  user_id UUID REFERENCES auth.users (id),
+  source_type VARCHAR(32) NOT NULL,
+  url TEXT NOT NULL,
+  config JSONB DEFAULT '{}',
+  schedule TEXT NOT NULL,
+  enabled BOOLEAN DEFAULT true,
+  next_run_time TIMESTAMP,
+  last_run_time TIMESTAMP,
+  creation_time TIMESTAMP DEFAULT current_timestamp,
+  UNIQUE (brain_id, source_type, url)
+);
+
+CREATE INDEX IF NOT EXISTS brain_sources_next_run_time_idx ON brain_sources (next_run_time) WHERE enabled;
+
+CREATE TABLE IF NOT EXISTS brain_source_runs (
+  run_id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  source_id UUID REFERENCES brain_sources (source_id) ON DELETE CASCADE,
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  status VARCHAR(32) DEFAULT 'running',
+  message TEXT,
+  start_time TIMESTAMP DEFAULT current_timestamp,
+  end_time TIMESTAMP,
+  duration_seconds FLOAT
+);
+
+CREATE INDEX IF NOT EXISTS brain_source_runs_brain_id_start_time_idx ON brain_source_runs (brain_id, start_time DESC);
+
+-- Claim the sources due for a sync: their next run is pushed back by the lease so
+-- that no other API process picks them, and set for real once the sync is over
+CREATE OR REPLACE FUNCTION claim_due_brain_sources(p_limit INT, p_lease_seconds INT)
+RETURNS SETOF brain_sources LANGUAGE plpgsql AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE brain_sources
+    SET next_run_time = now() AT TIME ZONE 'utc' + make_interval(secs => p_lease_seconds)
+    WHERE brain_sources.source_id IN (
+        SELECT due.source_id FROM brain_sources AS due
+        WHERE due.enabled AND due.next_run_time <= now() AT TIME ZONE 'utc'
+        ORDER BY due.next_run_time
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING brain_sources.*;
+END;
+$$;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801180000_add_brain_sources'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801180000_add_brain_sources'
+);
+
+COMMIT;
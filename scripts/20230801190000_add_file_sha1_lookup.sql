@@ -0,0 +1,39 @@
+BEGIN;
+
+-- Sha1 of the file of each vector, indexed for the deduplication of the uploads
+ALTER TABLE vectors ADD COLUMN IF NOT EXISTS file_sha1 TEXT GENERATED ALWAYS AS (metadata->>'file_sha1') STORED;
+CREATE INDEX IF NOT EXISTS vectors_file_sha1_idx ON vectors (file_sha1);
+
+-- Which of the files are already stored, and whether they are linked to the brain
+CREATE OR REPLACE FUNCTION get_existing_file_sha1s(p_brain_id UUID, p_file_sha1s TEXT[])
+RETURNS TABLE(file_sha1 TEXT, in_brain BOOLEAN) LANGUAGE sql STABLE AS $$
+    SELECT requested.file_sha1, EXISTS (
+        SELECT 1 FROM brains_vectors
+        WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.file_sha1 = requested.file_sha1
+    )
+    FROM unnest(p_file_sha1s) AS requested(file_sha1)
+    WHERE EXISTS (SELECT 1 FROM vectors WHERE vectors.file_sha1 = requested.file_sha1);
+$$;
+
+-- Link the vectors of files stored for other brains to the brain
+CREATE OR REPLACE FUNCTION link_files_to_brain(p_brain_id UUID, p_file_sha1s TEXT[])
+RETURNS TABLE(vector_id UUID) LANGUAGE sql AS $$
+    INSERT INTO brains_vectors (brain_id, vector_id, file_sha1)
+    SELECT p_brain_id, vectors.id, vectors.file_sha1
+    FROM vectors
+    WHERE vectors.file_sha1 = ANY(p_file_sha1s)
+      AND NOT EXISTS (
+          SELECT 1 FROM brains_vectors
+          WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.vector_id = vectors.id
+      )
+    RETURNING brains_vectors.vector_id;
+$$;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801190000_add_file_sha1_lookup'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801190000_add_file_sha1_lookup'
+);
+
+COMMIT;
@@ -0,0 +1,15 @@
+BEGIN;
+
+-- Delete the upload jobs of a brain with the brain
+ALTER TABLE upload_jobs DROP CONSTRAINT IF EXISTS upload_jobs_brain_id_fkey;
+ALTER TABLE upload_jobs ADD CONSTRAINT upload_jobs_brain_id_fkey
+  FOREIGN KEY (brain_id) REFERENCES brains (brain_id) ON DELETE CASCADE;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801200000_cascade_upload_jobs_brain_delete'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801200000_cascade_upload_jobs_brain_delete'
+);
+
+COMMIT;
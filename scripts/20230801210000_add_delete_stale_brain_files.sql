@@ -0,0 +1,35 @@
+BEGIN;
+
+-- Remove from a brain the files under a name prefix (the files of a repository) whose
+-- sha1 is not among the given ones: the previous versions of modified files and the deleted files
+CREATE OR REPLACE FUNCTION delete_stale_brain_files(
+    p_brain_id UUID,
+    p_file_name_prefix TEXT,
+    p_file_sha1s TEXT[]
+)
+RETURNS TABLE(vector_ids UUID[], unlinked_count INT, deleted_vectors_count INT) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_vector_ids UUID[];
+BEGIN
+    SELECT COALESCE(array_agg(brains_vectors.vector_id), '{}') INTO v_vector_ids
+    FROM brains_vectors
+    INNER JOIN vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id
+      AND starts_with(vectors.metadata->>'file_name', p_file_name_prefix)
+      AND NOT (COALESCE(brains_vectors.file_sha1, '') = ANY(p_file_sha1s));
+
+    RETURN QUERY
+    SELECT v_vector_ids, deleted.unlinked_count, deleted.deleted_vectors_count
+    FROM delete_brain_vectors(p_brain_id, v_vector_ids) AS deleted;
+END;
+$$;
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801210000_add_delete_stale_brain_files'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801210000_add_delete_stale_brain_files'
+);
+
+COMMIT;
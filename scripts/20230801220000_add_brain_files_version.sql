@@ -0,0 +1,36 @@
+BEGIN;
+
+-- Bumped each time files are added to or removed from a brain, so that every API
+-- process can tell its cached answers of the brain are outdated
+ALTER TABLE brains ADD COLUMN IF NOT EXISTS files_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION bump_brain_files_version()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE brains
+    SET files_version = brains.files_version + 1
+    WHERE brains.brain_id IN (SELECT DISTINCT brain_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS brain_files_version_insert ON brains_vectors;
+CREATE TRIGGER brain_files_version_insert
+AFTER INSERT ON brains_vectors
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_brain_files_version();
+
+DROP TRIGGER IF EXISTS brain_files_version_delete ON brains_vectors;
+CREATE TRIGGER brain_files_version_delete
+AFTER DELETE ON brains_vectors
+REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_brain_files_version();
+
+-- Update migrations table
+INSERT INTO migrations (name) 
+SELECT '20230801220000_add_brain_files_version'
+WHERE NOT EXISTS (
+    SELECT 1 FROM migrations WHERE name = '20230801220000_add_brain_files_version'
+);
+
+COMMIT;
@@ -13,7 +13,9 @@ CREATE TABLE IF NOT EXISTS chats(
     user_id UUID REFERENCES auth.users (id),
     creation_time TIMESTAMP DEFAULT current_timestamp,
     history JSONB,
-    chat_name TEXT
+    chat_name TEXT,
+    history_summary TEXT,
+    summarized_until TIMESTAMP
 );
 
 -- Create chat_history table
@@ -38,7 +40,17 @@ CREATE TABLE IF NOT EXISTS vectors (
 );
 
 -- Create function to match vectors
-CREATE OR REPLACE FUNCTION match_vectors(query_embedding VECTOR(1536), match_count INT, p_brain_id UUID)
+CREATE OR REPLACE FUNCTION match_vectors(
+    query_embedding VECTOR(1536),
+    match_count INT,
+    p_brain_id UUID,
+    p_file_sha1s TEXT[] DEFAULT NULL,
+    p_date_from TEXT DEFAULT NULL,
+    p_date_to TEXT DEFAULT NULL,
+    p_file_name_prefix TEXT DEFAULT NULL,
+    p_file_extensions TEXT[] DEFAULT NULL,
+    p_min_similarity FLOAT DEFAULT NULL
+)
 RETURNS TABLE(
     id UUID,
     brain_id UUID,
@@ -62,6 +74,13 @@ BEGIN
     INNER JOIN
         brains_vectors ON vectors.id = brains_vectors.vector_id
     WHERE brains_vectors.brain_id = p_brain_id
+        -- Optional filters, dates are the YYYYMMDD ingestion dates of the metadata
+        AND (p_file_sha1s IS NULL OR brains_vectors.file_sha1 = ANY(p_file_sha1s))
+        AND (p_date_from IS NULL OR vectors.metadata->>'date' >= p_date_from)
+        AND (p_date_to IS NULL OR vectors.metadata->>'date' <= p_date_to)
+        AND (p_file_name_prefix IS NULL OR starts_with(vectors.metadata->>'file_name', p_file_name_prefix))
+        AND (p_file_extensions IS NULL OR lower(substring(vectors.metadata->>'file_name' FROM '\.[^.]*$')) = ANY(p_file_extensions))
+        AND (p_min_similarity IS NULL OR 1 - (vectors.embedding <=> query_embedding) >= p_min_similarity)
     ORDER BY
         vectors.embedding <=> query_embedding
     LIMIT match_count;
@@ -188,13 +207,395 @@ $$ LANGUAGE plpgsql;
 
 
 
+-- Create upload jobs table
+CREATE TABLE IF NOT EXISTS upload_jobs (
+  job_id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  user_id UUID REFERENCES auth.users (id),
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  file_name TEXT,
+  status VARCHAR(32) DEFAULT 'pending',
+  chunks_parsed INT DEFAULT 0,
+  chunks_embedded INT DEFAULT 0,
+  chunks_stored INT DEFAULT 0,
+  message TEXT,
+  type VARCHAR(32),
+  creation_time TIMESTAMP DEFAULT current_timestamp,
+  update_time TIMESTAMP DEFAULT current_timestamp
+);
+
+CREATE INDEX IF NOT EXISTS upload_jobs_user_id_idx ON upload_jobs (user_id);
+
+-- Indexes used to find the vectors of a file and the brains still referencing a vector
+CREATE INDEX IF NOT EXISTS vectors_file_name_idx ON vectors ((metadata->>'file_name'));
+CREATE INDEX IF NOT EXISTS brains_vectors_vector_id_idx ON brains_vectors (vector_id);
+
+-- Unlink vectors from a brain and delete the ones no other brain references
+CREATE OR REPLACE FUNCTION delete_brain_vectors(p_brain_id UUID, p_vector_ids UUID[])
+RETURNS TABLE(unlinked_count INT, deleted_vectors_count INT) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_unlinked_count INT;
+    v_deleted_vectors_count INT;
+BEGIN
+    DELETE FROM brains_vectors
+    WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.vector_id = ANY(p_vector_ids);
+    GET DIAGNOSTICS v_unlinked_count = ROW_COUNT;
+
+    DELETE FROM vectors
+    WHERE vectors.id = ANY(p_vector_ids)
+      AND NOT EXISTS (SELECT 1 FROM brains_vectors WHERE brains_vectors.vector_id = vectors.id);
+    GET DIAGNOSTICS v_deleted_vectors_count = ROW_COUNT;
+
+    RETURN QUERY SELECT v_unlinked_count, v_deleted_vectors_count;
+END;
+$$;
+
+-- Remove all the vectors of a file from a brain
+CREATE OR REPLACE FUNCTION delete_file_from_brain(p_brain_id UUID, p_file_name TEXT)
+RETURNS TABLE(vector_ids UUID[], unlinked_count INT, deleted_vectors_count INT) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_vector_ids UUID[];
+BEGIN
+    SELECT COALESCE(array_agg(brains_vectors.vector_id), '{}') INTO v_vector_ids
+    FROM brains_vectors
+    INNER JOIN vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id AND vectors.metadata->>'file_name' = p_file_name;
+
+    RETURN QUERY
+    SELECT v_vector_ids, deleted.unlinked_count, deleted.deleted_vectors_count
+    FROM delete_brain_vectors(p_brain_id, v_vector_ids) AS deleted;
+END;
+$$;
+
+-- Create brain files manifest, maintained from brains_vectors by triggers
+CREATE TABLE IF NOT EXISTS brain_files (
+  brain_id UUID,
+  file_sha1 TEXT,
+  file_name TEXT,
+  size BIGINT DEFAULT 0,
+  chunk_count INT DEFAULT 0,
+  PRIMARY KEY (brain_id, file_sha1),
+  FOREIGN KEY (brain_id) REFERENCES brains (brain_id) ON DELETE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION brain_files_after_insert()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO brain_files (brain_id, file_sha1, file_name, size, chunk_count)
+    SELECT
+        new_rows.brain_id,
+        COALESCE(new_rows.file_sha1, ''),
+        MAX(vectors.metadata->>'file_name'),
+        MAX((vectors.metadata->>'file_size')::NUMERIC)::BIGINT,
+        COUNT(*)
+    FROM new_rows
+    INNER JOIN vectors ON vectors.id = new_rows.vector_id
+    GROUP BY new_rows.brain_id, COALESCE(new_rows.file_sha1, '')
+    ON CONFLICT (brain_id, file_sha1)
+    DO UPDATE SET chunk_count = brain_files.chunk_count + EXCLUDED.chunk_count;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION brain_files_after_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE brain_files
+    SET chunk_count = brain_files.chunk_count - removed.chunk_count
+    FROM (
+        SELECT brain_id, COALESCE(file_sha1, '') AS file_sha1, COUNT(*) AS chunk_count
+        FROM old_rows
+        GROUP BY brain_id, COALESCE(file_sha1, '')
+    ) AS removed
+    WHERE brain_files.brain_id = removed.brain_id AND brain_files.file_sha1 = removed.file_sha1;
+
+    DELETE FROM brain_files
+    WHERE brain_files.chunk_count <= 0
+      AND (brain_files.brain_id, brain_files.file_sha1) IN (
+          SELECT brain_id, COALESCE(file_sha1, '') FROM old_rows
+      );
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS brain_files_insert ON brains_vectors;
+CREATE TRIGGER brain_files_insert
+AFTER INSERT ON brains_vectors
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION brain_files_after_insert();
+
+DROP TRIGGER IF EXISTS brain_files_delete ON brains_vectors;
+CREATE TRIGGER brain_files_delete
+AFTER DELETE ON brains_vectors
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION brain_files_after_delete();
+
+-- Index used to fetch the most recent messages of a chat
+CREATE INDEX IF NOT EXISTS chat_history_chat_id_message_time_idx ON chat_history (chat_id, message_time DESC);
+
+-- Full-text search over the chunks, for the lexical side of the hybrid retrieval
+ALTER TABLE vectors ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS vectors_content_tsv_idx ON vectors USING GIN (content_tsv);
+
+CREATE OR REPLACE FUNCTION match_vectors_lexical(
+    query_text TEXT,
+    match_count INT,
+    p_brain_id UUID,
+    p_file_sha1s TEXT[] DEFAULT NULL,
+    p_date_from TEXT DEFAULT NULL,
+    p_date_to TEXT DEFAULT NULL,
+    p_file_name_prefix TEXT DEFAULT NULL,
+    p_file_extensions TEXT[] DEFAULT NULL
+)
+RETURNS TABLE(
+    id UUID,
+    brain_id UUID,
+    content TEXT,
+    metadata JSONB,
+    rank FLOAT
+) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    lexical_query TSQUERY;
+BEGIN
+    -- Any of the words of the query: the cover density ranking favours the chunks matching most of them, close together
+    lexical_query := replace(plainto_tsquery('english', query_text)::TEXT, ' & ', ' | ')::TSQUERY;
+    IF numnode(lexical_query) = 0 THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        vectors.id,
+        brains_vectors.brain_id,
+        vectors.content,
+        vectors.metadata,
+        ts_rank_cd(vectors.content_tsv, lexical_query)::FLOAT AS rank
+    FROM
+        vectors
+    INNER JOIN
+        brains_vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id
+        AND vectors.content_tsv @@ lexical_query
+        -- Same optional filters as match_vectors
+        AND (p_file_sha1s IS NULL OR brains_vectors.file_sha1 = ANY(p_file_sha1s))
+        AND (p_date_from IS NULL OR vectors.metadata->>'date' >= p_date_from)
+        AND (p_date_to IS NULL OR vectors.metadata->>'date' <= p_date_to)
+        AND (p_file_name_prefix IS NULL OR starts_with(vectors.metadata->>'file_name', p_file_name_prefix))
+        AND (p_file_extensions IS NULL OR lower(substring(vectors.metadata->>'file_name' FROM '\.[^.]*$')) = ANY(p_file_extensions))
+    ORDER BY
+        rank DESC
+    LIMIT match_count;
+END;
+$$;
+
+-- Narrow the searches of a brain to some of its files
+CREATE INDEX IF NOT EXISTS brains_vectors_brain_id_file_sha1_idx ON brains_vectors (brain_id, file_sha1);
+
+-- Chunks of a file in a brain, diffed by content hash against a new version of the file
+CREATE OR REPLACE FUNCTION get_brain_file_chunks(p_brain_id UUID, p_file_name TEXT)
+RETURNS TABLE(vector_id UUID, file_sha1 TEXT, chunk_sha1 TEXT) LANGUAGE sql STABLE AS $$
+    SELECT brains_vectors.vector_id, brains_vectors.file_sha1, vectors.metadata->>'chunk_sha1'
+    FROM brains_vectors
+    INNER JOIN vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id AND vectors.metadata->>'file_name' = p_file_name;
+$$;
+
+-- Move unchanged chunks of a file to its new version without embedding them again:
+-- the vectors only linked to this brain get the new metadata, the ones shared with
+-- other brains are copied with their embedding so the other brains keep the old version
+CREATE OR REPLACE FUNCTION relink_file_vectors(
+    p_brain_id UUID,
+    p_file_sha1 TEXT,
+    p_vector_ids UUID[],
+    p_metadata JSONB[]
+)
+RETURNS TABLE(old_vector_id UUID, vector_id UUID) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_vector_ids UUID[] := '{}';
+    v_vector_id UUID;
+BEGIN
+    FOR i IN 1 .. COALESCE(array_length(p_vector_ids, 1), 0) LOOP
+        IF EXISTS (
+            SELECT 1 FROM brains_vectors
+            WHERE brains_vectors.vector_id = p_vector_ids[i] AND brains_vectors.brain_id <> p_brain_id
+        ) THEN
+            INSERT INTO vectors (content, metadata, embedding)
+            SELECT vectors.content, p_metadata[i], vectors.embedding
+            FROM vectors
+            WHERE vectors.id = p_vector_ids[i]
+            RETURNING vectors.id INTO v_vector_id;
+        ELSE
+            UPDATE vectors SET metadata = p_metadata[i] WHERE vectors.id = p_vector_ids[i];
+            v_vector_id := p_vector_ids[i];
+        END IF;
+        v_vector_ids := v_vector_ids || v_vector_id;
+    END LOOP;
+
+    -- Delete and insert the links so that the brain_files triggers move them to the new version
+    DELETE FROM brains_vectors
+    WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.vector_id = ANY(p_vector_ids);
+    INSERT INTO brains_vectors (brain_id, vector_id, file_sha1)
+    SELECT p_brain_id, unnest(v_vector_ids), p_file_sha1;
+
+    RETURN QUERY SELECT unnest(p_vector_ids), unnest(v_vector_ids);
+END;
+$$;
+
+-- State of the pages crawled into each brain, to re-crawl them with conditional requests
+CREATE TABLE IF NOT EXISTS crawl_state (
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  url TEXT,
+  etag TEXT,
+  last_modified TEXT,
+  content_sha1 TEXT,
+  links TEXT[] DEFAULT '{}',
+  vector_ids UUID[] DEFAULT '{}',
+  crawl_time TIMESTAMP DEFAULT current_timestamp,
+  PRIMARY KEY (brain_id, url)
+);
+
+-- Websites and GitHub repositories re-synced into a brain on a schedule
+CREATE TABLE IF NOT EXISTS brain_sources (
+  source_id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  user_id UUID REFERENCES auth.users (id),
+  source_type VARCHAR(32) NOT NULL,
+  url TEXT NOT NULL,
+  config JSONB DEFAULT '{}',
+  schedule TEXT NOT NULL,
+  enabled BOOLEAN DEFAULT true,
+  next_run_time TIMESTAMP,
+  last_run_time TIMESTAMP,
+  creation_time TIMESTAMP DEFAULT current_timestamp,
+  UNIQUE (brain_id, source_type, url)
+);
+
+CREATE INDEX IF NOT EXISTS brain_sources_next_run_time_idx ON brain_sources (next_run_time) WHERE enabled;
+
+CREATE TABLE IF NOT EXISTS brain_source_runs (
+  run_id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  source_id UUID REFERENCES brain_sources (source_id) ON DELETE CASCADE,
+  brain_id UUID REFERENCES brains (brain_id) ON DELETE CASCADE,
+  status VARCHAR(32) DEFAULT 'running',
+  message TEXT,
+  start_time TIMESTAMP DEFAULT current_timestamp,
+  end_time TIMESTAMP,
+  duration_seconds FLOAT
+);
+
+CREATE INDEX IF NOT EXISTS brain_source_runs_brain_id_start_time_idx ON brain_source_runs (brain_id, start_time DESC);
+
+-- Claim the sources due for a sync: their next run is pushed back by the lease so
+-- that no other API process picks them, and set for real once the sync is over
+CREATE OR REPLACE FUNCTION claim_due_brain_sources(p_limit INT, p_lease_seconds INT)
+RETURNS SETOF brain_sources LANGUAGE plpgsql AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE brain_sources
+    SET next_run_time = now() AT TIME ZONE 'utc' + make_interval(secs => p_lease_seconds)
+    WHERE brain_sources.source_id IN (
+        SELECT due.source_id FROM brain_sources AS due
+        WHERE due.enabled AND due.next_run_time <= now() AT TIME ZONE 'utc'
+        ORDER BY due.next_run_time
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING brain_sources.*;
+END;
+$$;
+
+-- Sha1 of the file of each vector, indexed for the deduplication of the uploads
+ALTER TABLE vectors ADD COLUMN IF NOT EXISTS file_sha1 TEXT GENERATED ALWAYS AS (metadata->>'file_sha1') STORED;
+CREATE INDEX IF NOT EXISTS vectors_file_sha1_idx ON vectors (file_sha1);
+
+-- Which of the files are already stored, and whether they are linked to the brain
+CREATE OR REPLACE FUNCTION get_existing_file_sha1s(p_brain_id UUID, p_file_sha1s TEXT[])
+RETURNS TABLE(file_sha1 TEXT, in_brain BOOLEAN) LANGUAGE sql STABLE AS $$
+    SELECT requested.file_sha1, EXISTS (
+        SELECT 1 FROM brains_vectors
+        WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.file_sha1 = requested.file_sha1
+    )
+    FROM unnest(p_file_sha1s) AS requested(file_sha1)
+    WHERE EXISTS (SELECT 1 FROM vectors WHERE vectors.file_sha1 = requested.file_sha1);
+$$;
+
+-- Link the vectors of files stored for other brains to the brain
+CREATE OR REPLACE FUNCTION link_files_to_brain(p_brain_id UUID, p_file_sha1s TEXT[])
+RETURNS TABLE(vector_id UUID) LANGUAGE sql AS $$
+    INSERT INTO brains_vectors (brain_id, vector_id, file_sha1)
+    SELECT p_brain_id, vectors.id, vectors.file_sha1
+    FROM vectors
+    WHERE vectors.file_sha1 = ANY(p_file_sha1s)
+      AND NOT EXISTS (
+          SELECT 1 FROM brains_vectors
+          WHERE brains_vectors.brain_id = p_brain_id AND brains_vectors.vector_id = vectors.id
+      )
+    RETURNING brains_vectors.vector_id;
+$$;
+
+-- Remove from a brain the files under a name prefix (the files of a repository) whose
+-- sha1 is not among the given ones: the previous versions of modified files and the deleted files
+CREATE OR REPLACE FUNCTION delete_stale_brain_files(
+    p_brain_id UUID,
+    p_file_name_prefix TEXT,
+    p_file_sha1s TEXT[]
+)
+RETURNS TABLE(vector_ids UUID[], unlinked_count INT, deleted_vectors_count INT) LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_vector_ids UUID[];
+BEGIN
+    SELECT COALESCE(array_agg(brains_vectors.vector_id), '{}') INTO v_vector_ids
+    FROM brains_vectors
+    INNER JOIN vectors ON vectors.id = brains_vectors.vector_id
+    WHERE brains_vectors.brain_id = p_brain_id
+      AND starts_with(vectors.metadata->>'file_name', p_file_name_prefix)
+      AND NOT (COALESCE(brains_vectors.file_sha1, '') = ANY(p_file_sha1s));
+
+    RETURN QUERY
+    SELECT v_vector_ids, deleted.unlinked_count, deleted.deleted_vectors_count
+    FROM delete_brain_vectors(p_brain_id, v_vector_ids) AS deleted;
+END;
+$$;
+
+-- Bumped each time files are added to or removed from a brain, so that every API
+-- process can tell its cached answers of the brain are outdated
+ALTER TABLE brains ADD COLUMN IF NOT EXISTS files_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION bump_brain_files_version()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE brains
+    SET files_version = brains.files_version + 1
+    WHERE brains.brain_id IN (SELECT DISTINCT brain_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS brain_files_version_insert ON brains_vectors;
+CREATE TRIGGER brain_files_version_insert
+AFTER INSERT ON brains_vectors
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_brain_files_version();
+
+DROP TRIGGER IF EXISTS brain_files_version_delete ON brains_vectors;
+CREATE TRIGGER brain_files_version_delete
+AFTER DELETE ON brains_vectors
+REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION bump_brain_files_version();
+
 CREATE TABLE IF NOT EXISTS migrations (
   name VARCHAR(255)  PRIMARY KEY,
   executed_at TIMESTAMPTZ DEFAULT current_timestamp
 );
 
 INSERT INTO migrations (name) 
-SELECT '202307241530031_add_fields_to_brain'
+SELECT '20230801220000_add_brain_files_version'
 WHERE NOT EXISTS (
-    SELECT 1 FROM migrations WHERE name = '202307241530031_add_fields_to_brain'
+    SELECT 1 FROM migrations WHERE name = '20230801220000_add_brain_files_version'
 );